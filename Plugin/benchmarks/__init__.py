@@ -0,0 +1,5 @@
+"""
+Benchmarks for the GB language tooling.
+
+Run from the Plugin directory, e.g. ``python -m benchmarks.lexer_throughput``.
+"""
@@ -0,0 +1,52 @@
+"""
+Loading a serialized AST from a memory-mapped file against parsing the
+source again. The loaded AST is compared with the parsed one first; the
+format itself is tested in test_gb_serialize.py.
+
+Usage: python -m benchmarks.ast_load [--size N] [--repeat N]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from gb_parser import parse_gb_code
+from gb_samples import make_source, same_tree
+from gb_serialize import dump_ast, dumps_ast, load_ast, load_ast_file
+
+def best_time(run, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--size', type=int, default=500, help='number of generated blocks')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='timing repetitions (best is kept)')
+    args = arg_parser.parse_args(argv)
+    
+    source = make_source(args.size)
+    if not same_tree(parse_gb_code(source), load_ast(dumps_ast(parse_gb_code(source)))):
+        raise SystemExit("Round-trip through the binary format changed the AST")
+    
+    fd, path = tempfile.mkstemp(suffix='.gbast')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            dump_ast(parse_gb_code(source), f)
+        size = os.path.getsize(path)
+        
+        parse = best_time(lambda: parse_gb_code(source), args.repeat)
+        load = best_time(lambda: load_ast_file(path), args.repeat)
+    finally:
+        os.remove(path)
+    
+    print(f"Source: {len(source)} chars, serialized AST: {size} bytes")
+    print(f"       Parse: {parse * 1000:9.2f} ms")
+    print(f"        Load: {load * 1000:9.2f} ms")
+    print(f"     Speedup: {parse / load:.1f}x")
+
+if __name__ == "__main__":
+    main()
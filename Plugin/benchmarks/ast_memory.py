@@ -0,0 +1,74 @@
+"""
+Memory used by the AST of a large, GUI-heavy GB program.
+
+Reports the growth in peak RSS while parsing and the bytes retained by the
+AST, measured with tracemalloc in a second pass.
+
+Usage: python -m benchmarks.ast_memory [--size N]
+"""
+import argparse
+import gc
+import resource
+import tracemalloc
+
+from gb_parser import parse_gb_code, walk
+
+SAMPLE = '''window "Settings %(i)d" 640 480
+    text "Preferences for profile %(i)d"
+    container
+        input "username" ""
+        input "password" ""
+        button "Save" onSave
+            var saved = true
+            var count = count + 1
+            ts.windows(title'Saved', text'Profile %(i)d saved')
+        end
+        button "Cancel" onCancel
+            var saved = false
+        end
+    end
+    container
+        text "Theme"
+        button "Light" onLight
+            var theme = "light"
+        end
+        button "Dark" onDark
+            var theme = "dark"
+        end
+    end
+end
+'''
+
+def make_source(blocks: int) -> str:
+    return ''.join(SAMPLE % {'i': i} for i in range(blocks))
+
+def peak_rss_kb() -> int:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--size', type=int, default=5000, help='number of generated windows')
+    args = arg_parser.parse_args(argv)
+    
+    source = make_source(args.size)
+    gc.collect()
+    before = peak_rss_kb()
+    ast = parse_gb_code(source)
+    peak = peak_rss_kb() - before
+    nodes = sum(1 for _ in walk(ast))
+    del ast
+    gc.collect()
+    
+    tracemalloc.start()
+    ast = parse_gb_code(source)
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    print(f"Source: {len(source)} chars, {nodes} AST nodes")
+    print(f"Peak RSS growth while parsing: {peak / 1024:8.1f} MB")
+    print(f"Retained by the AST:           {retained / (1024 * 1024):8.1f} MB ({retained / nodes:.0f} bytes/node)")
+
+if __name__ == "__main__":
+    main()
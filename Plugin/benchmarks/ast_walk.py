@@ -0,0 +1,151 @@
+"""
+Whole-tree traversals: NodeVisitor and NodeTransformer against
+hand-written recursive isinstance chains.
+
+Each way counts identifiers (or rebuilds the tree with every number
+negated) over a corpus program and must get the same answer. A tree
+nested far beyond the recursion limit is then visited to show the
+iterative visitors cope where the recursive ones cannot.
+
+Usage: python -m benchmarks.ast_walk [--size CHARS] [--depth N] [--repeat N]
+"""
+import argparse
+import sys
+import time
+
+from gb_parser import (
+    BinaryOperation, Button, Container, DefDeclaration, FunctionCall, FunctionDef, Identifier,
+    IfStatement, LoopStatement, Number, ReturnStatement, TextElement, TSDLLCall, UnaryOperation,
+    VarDeclaration, Window, parse_gb_code, walk,
+)
+from gb_samples import same_tree
+from gb_visitor import NodeTransformer, NodeVisitor, iter_tree
+
+from benchmarks.corpus import CorpusConfig, generate_program
+
+def best_time(run, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def count_recursive(node) -> int:
+    # The isinstance chain every consumer used to write
+    if isinstance(node, list):
+        return sum(count_recursive(child) for child in node)
+    if isinstance(node, Identifier):
+        return 1
+    if isinstance(node, (VarDeclaration, DefDeclaration, ReturnStatement)):
+        return count_recursive(node.value)
+    if isinstance(node, (FunctionDef, Button)):
+        return count_recursive(node.body if isinstance(node, FunctionDef) else node.event_handler)
+    if isinstance(node, IfStatement):
+        return (count_recursive(node.condition) + count_recursive(node.body) + count_recursive(node.else_body)
+                + sum(count_recursive(condition) + count_recursive(body) for condition, body in node.elif_clauses))
+    if isinstance(node, LoopStatement):
+        return count_recursive(node.times if node.is_times_loop else node.condition) + count_recursive(node.body)
+    if isinstance(node, BinaryOperation):
+        return count_recursive(node.left) + count_recursive(node.right)
+    if isinstance(node, UnaryOperation):
+        return count_recursive(node.expr)
+    if isinstance(node, (FunctionCall, TSDLLCall)):
+        return count_recursive(node.args)
+    if isinstance(node, Window):
+        return count_recursive(node.width) + count_recursive(node.height) + count_recursive(node.children)
+    if isinstance(node, Container):
+        return count_recursive(node.children)
+    return 0
+
+class CountIdentifiers(NodeVisitor):
+    def __init__(self):
+        self.count = 0
+    
+    def visit_Identifier(self, node):
+        self.count += 1
+
+def count_visitor(ast) -> int:
+    visitor = CountIdentifiers()
+    visitor.visit(ast)
+    return visitor.count
+
+class Negate(NodeTransformer):
+    def visit_Number(self, node):
+        return Number(-node.value, node.offset)
+
+def negate_recursive(node):
+    if isinstance(node, list):
+        return [negate_recursive(child) for child in node]
+    if isinstance(node, Number):
+        return Number(-node.value, node.offset)
+    if isinstance(node, (VarDeclaration, DefDeclaration)):
+        return type(node)(node.name, negate_recursive(node.value), node.offset)
+    if isinstance(node, ReturnStatement):
+        return ReturnStatement(negate_recursive(node.value), node.offset)
+    if isinstance(node, FunctionDef):
+        return FunctionDef(node.name, node.params, negate_recursive(node.body), node.offset)
+    if isinstance(node, IfStatement):
+        return IfStatement(negate_recursive(node.condition), negate_recursive(node.body),
+                           [(negate_recursive(c), negate_recursive(b)) for c, b in node.elif_clauses],
+                           negate_recursive(node.else_body), node.offset)
+    if isinstance(node, LoopStatement):
+        return LoopStatement(negate_recursive(node.condition) if node.condition else None, negate_recursive(node.body),
+                             node.is_times_loop, negate_recursive(node.times) if node.times else None, node.offset)
+    if isinstance(node, BinaryOperation):
+        return BinaryOperation(negate_recursive(node.left), node.op, negate_recursive(node.right), node.offset)
+    if isinstance(node, UnaryOperation):
+        return UnaryOperation(node.op, negate_recursive(node.expr), node.offset)
+    if isinstance(node, FunctionCall):
+        return FunctionCall(node.name, negate_recursive(node.args), node.offset)
+    if isinstance(node, TSDLLCall):
+        return TSDLLCall(node.dll_name, node.function_name, negate_recursive(node.args), node.offset)
+    if isinstance(node, Window):
+        return Window(node.title, negate_recursive(node.width), negate_recursive(node.height),
+                      negate_recursive(node.children), node.offset)
+    if isinstance(node, Button):
+        return Button(node.text, negate_recursive(node.event_handler), node.offset)
+    if isinstance(node, Container):
+        return Container(negate_recursive(node.children), node.offset)
+    return node
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--size', type=int, default=1024 * 1024, help='approximate program size in characters')
+    arg_parser.add_argument('--depth', type=int, default=100000, help='nesting of the deep tree')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='timing repetitions (best is kept)')
+    args = arg_parser.parse_args(argv)
+    
+    ast = parse_gb_code(generate_program(CorpusConfig(size=args.size)))
+    expected = count_recursive(ast)
+    if count_visitor(ast) != expected or sum(isinstance(node, Identifier) for node in walk(ast)) != expected:
+        raise SystemExit("Visitors disagree on the identifier count")
+    if not same_tree(Negate().transform(ast), negate_recursive(ast)):
+        raise SystemExit("Transformers built different trees")
+    print(f"{sum(1 for _ in walk(ast))} nodes, {expected} identifiers")
+    
+    print("  Counting identifiers:")
+    print(f"     Recursive isinstance: {best_time(lambda: count_recursive(ast), args.repeat) * 1000:9.2f} ms")
+    print(f"              NodeVisitor: {best_time(lambda: count_visitor(ast), args.repeat) * 1000:9.2f} ms")
+    print(f"         walk (any order): {best_time(lambda: sum(type(node) is Identifier for node in walk(ast)), args.repeat) * 1000:9.2f} ms")
+    print(f"     iter_tree (in order): {best_time(lambda: sum(type(node) is Identifier for node, _ in iter_tree(ast)), args.repeat) * 1000:9.2f} ms")
+    print("  Negating every number:")
+    print(f"     Recursive isinstance: {best_time(lambda: negate_recursive(ast), args.repeat) * 1000:9.2f} ms")
+    print(f"          NodeTransformer: {best_time(lambda: Negate().transform(ast), args.repeat) * 1000:9.2f} ms")
+    
+    deep = TextElement('leaf')
+    for _ in range(args.depth):
+        deep = Container([deep])
+    print(f"  Nested {args.depth} deep (recursion limit {sys.getrecursionlimit()}):")
+    try:
+        count_recursive(deep)
+        print("     Recursive isinstance: ok")
+    except RecursionError:
+        print("     Recursive isinstance: RecursionError")
+    visitor = CountIdentifiers()
+    visitor.visit(deep)
+    Negate().transform_node(deep)
+    print("  NodeVisitor, NodeTransformer: ok")
+
+if __name__ == "__main__":
+    main()
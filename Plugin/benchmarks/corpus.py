@@ -0,0 +1,218 @@
+"""
+Seeded generator of valid GB programs for benchmarking.
+
+The same seed and settings always produce the same program, so results
+are comparable across runs and commits.
+
+Usage: python -m benchmarks.corpus [--seed N] [--size CHARS] [--depth N] ...
+"""
+import argparse
+import random
+from typing import List
+
+WORDS = (
+    'alpha', 'beta', 'count', 'total', 'index', 'value', 'width', 'height', 'label', 'name',
+    'offset', 'limit', 'step', 'score', 'level', 'speed', 'color', 'size', 'item', 'result',
+)
+
+DLLS = (
+    ('user32.dll', 'MessageBoxA'), ('kernel32.dll', 'GetTickCount'), ('kernel32.dll', 'Sleep'),
+    ('user32.dll', 'GetSystemMetrics'), ('gdi32.dll', 'SetPixel'),
+)
+
+class CorpusConfig:
+    """
+    Generator settings.
+    
+    size: approximate length of the program, in characters
+    depth: maximum nesting of blocks and of GUI containers
+    expression_length: maximum number of operands in an expression
+    gui_width: maximum number of children of a window or container
+    tsdll_density: chance that a simple statement is a tsdll call
+    """
+    def __init__(self, seed: int = 0, size: int = 64 * 1024, depth: int = 4, expression_length: int = 6,
+                 gui_width: int = 4, tsdll_density: float = 0.1):
+        self.seed = seed
+        self.size = size
+        self.depth = depth
+        self.expression_length = expression_length
+        self.gui_width = gui_width
+        self.tsdll_density = tsdll_density
+    
+    def as_dict(self):
+        return dict(vars(self))
+
+class Generator:
+    def __init__(self, config: CorpusConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.lines = []
+        self.names = ['count']
+        self.functions = []
+        self.serial = 0
+    
+    def emit(self, indent: int, line: str):
+        self.lines.append('    ' * indent + line)
+    
+    def new_name(self) -> str:
+        self.serial += 1
+        name = f"{self.random.choice(WORDS)}{self.serial}"
+        self.names.append(name)
+        return name
+    
+    # Expressions
+    
+    def operand(self, budget: int) -> str:
+        r = self.random.random()
+        if r < 0.3:
+            return str(self.random.randint(0, 1000))
+        if r < 0.4:
+            return f"{self.random.randint(0, 99)}.{self.random.randint(0, 99)}"
+        if r < 0.75:
+            return self.random.choice(self.names)
+        if r < 0.85 and self.functions:
+            name, arity = self.random.choice(self.functions)
+            return f"{name}({', '.join(self.expression(1) for _ in range(arity))})"
+        if r < 0.95 and budget > 1:
+            return f"({self.expression(budget - 1)})"
+        return f"-{self.random.choice(self.names)}"
+    
+    def expression(self, limit: int = None) -> str:
+        limit = self.config.expression_length if limit is None else limit
+        count = self.random.randint(1, max(limit, 1))
+        parts = [self.operand(limit // 2)]
+        for _ in range(count - 1):
+            parts.append(self.random.choice('+-*/'))
+            parts.append(self.operand(limit // 2))
+        return ' '.join(parts)
+    
+    def string(self) -> str:
+        text = f"{self.random.choice(WORDS)} {self.random.randint(0, 9999)}"
+        if self.random.random() < 0.1:
+            text = f'\\"{text}\\"'
+        return f'"{text}"'
+    
+    # Statements
+    
+    def simple_statement(self, indent: int):
+        r = self.random.random()
+        if r < self.config.tsdll_density:
+            dll, function = self.random.choice(DLLS)
+            args = ''.join(f", {self.expression(2)}" for _ in range(self.random.randint(0, 3)))
+            self.emit(indent, f'tsdll("{dll}", "{function}"{args})')
+        elif r < self.config.tsdll_density + 0.05:
+            self.emit(indent, f"ts.windows(title'{self.random.choice(WORDS)}', text'{self.random.choice(WORDS)} ready')")
+        elif r < 0.3:
+            self.emit(indent, f"def {self.new_name()} = {self.expression()}")
+        else:
+            name = self.random.choice(self.names) if self.random.random() < 0.5 else self.new_name()
+            self.emit(indent, f"var {name} = {self.expression()}")
+    
+    def statement(self, indent: int, depth: int):
+        r = self.random.random()
+        if depth <= 0 or r < 0.6:
+            self.simple_statement(indent)
+        elif r < 0.75:
+            self.if_statement(indent, depth)
+        elif r < 0.9:
+            self.loop_statement(indent, depth)
+        else:
+            self.window(indent, depth)
+    
+    def block(self, indent: int, depth: int):
+        for _ in range(self.random.randint(1, 3)):
+            self.statement(indent, depth - 1)
+    
+    def if_statement(self, indent: int, depth: int):
+        self.emit(indent, f"if {self.expression()} then")
+        self.block(indent + 1, depth)
+        for _ in range(self.random.randint(0, 2)):
+            self.emit(indent, f"elif {self.expression()} then")
+            self.block(indent + 1, depth)
+        if self.random.random() < 0.5:
+            self.emit(indent, "else")
+            self.block(indent + 1, depth)
+        self.emit(indent, "end")
+    
+    def loop_statement(self, indent: int, depth: int):
+        if self.random.random() < 0.5:
+            self.emit(indent, f"loop times {self.random.randint(1, 10)} then")
+        else:
+            self.emit(indent, f"loop {self.random.choice(self.names)} then")
+        self.block(indent + 1, depth)
+        self.emit(indent, "end")
+    
+    def function(self, indent: int):
+        name = self.new_name()
+        params = [f"p{i}" for i in range(self.random.randint(0, 3))]
+        self.emit(indent, f"def {name}({', '.join(params)})")
+        outer, self.names = self.names, self.names + params
+        self.block(indent + 1, self.config.depth)
+        self.emit(indent + 1, f"return {self.expression()}")
+        self.names = outer
+        self.functions.append((name, len(params)))
+        self.emit(indent, "end")
+    
+    # GUI
+    
+    def window(self, indent: int, depth: int):
+        self.emit(indent, f"window {self.string()} {self.random.randint(100, 1920)} {self.random.randint(100, 1080)}")
+        self.gui_children(indent + 1, depth)
+        self.emit(indent, "end")
+    
+    def gui_children(self, indent: int, depth: int):
+        for _ in range(self.random.randint(1, max(self.config.gui_width, 1))):
+            r = self.random.random()
+            if r < 0.3 and depth > 1:
+                self.emit(indent, "container")
+                self.gui_children(indent + 1, depth - 1)
+                self.emit(indent, "end")
+            elif r < 0.55:
+                self.emit(indent, f"button {self.string()} on{self.random.choice(WORDS).title()}")
+                self.block(indent + 1, min(depth, 2))
+                self.emit(indent, "end")
+            elif r < 0.8:
+                self.emit(indent, f"input {self.string()} {self.string()}")
+            else:
+                self.emit(indent, f"text {self.string()}")
+    
+    def program(self) -> str:
+        size = 0
+        while size < self.config.size:
+            start = len(self.lines)
+            r = self.random.random()
+            if r < 0.1:
+                self.function(0)
+            elif r < 0.25:
+                self.window(0, self.config.depth)
+            else:
+                self.statement(0, self.config.depth)
+            size += sum(len(line) + 1 for line in self.lines[start:])
+        return '\n'.join(self.lines) + '\n'
+
+def generate_program(config: CorpusConfig = None, **settings) -> str:
+    """
+    Generate a valid GB program. Settings are CorpusConfig fields and may
+    be given as keywords instead of a config.
+    """
+    if config is None:
+        config = CorpusConfig(**settings)
+    return Generator(config).program()
+
+def main(argv: List[str] = None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    defaults = CorpusConfig()
+    arg_parser.add_argument('--seed', type=int, default=defaults.seed)
+    arg_parser.add_argument('--size', type=int, default=defaults.size, help='approximate size in characters')
+    arg_parser.add_argument('--depth', type=int, default=defaults.depth, help='maximum block nesting')
+    arg_parser.add_argument('--expression-length', type=int, default=defaults.expression_length,
+                            help='maximum operands per expression')
+    arg_parser.add_argument('--gui-width', type=int, default=defaults.gui_width,
+                            help='maximum children per window or container')
+    arg_parser.add_argument('--tsdll-density', type=float, default=defaults.tsdll_density,
+                            help='fraction of simple statements that are tsdll calls')
+    args = arg_parser.parse_args(argv)
+    print(generate_program(**vars(args)), end='')
+
+if __name__ == "__main__":
+    main()
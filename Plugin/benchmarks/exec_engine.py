@@ -0,0 +1,123 @@
+"""
+Execution speed of the closure-compiling engine against a naive
+tree-walking interpreter, on a tight numeric loop.
+
+Usage: python -m benchmarks.exec_engine [--iterations N] [--repeat N]
+"""
+import argparse
+import time
+
+from gb_parser import (
+    BinaryOperation, FunctionCall, FunctionDef, Identifier, LoopStatement, Number,
+    ReturnStatement, VarDeclaration, parse_gb_code,
+)
+from gb_runtime import compile_program
+
+PROGRAM = '''
+def scale(x)
+    return x * 2
+end
+var total = 0
+var i = 0
+loop times %(iterations)d then
+    var i = i + 1
+    var total = total + scale(i) - i / 4
+end
+return total
+'''
+
+class Return(Exception):
+    def __init__(self, value):
+        self.value = value
+
+class TreeWalker:
+    """
+    Baseline interpreter: dispatches on node type and looks every name up
+    in a dict on each evaluation.
+    """
+    def __init__(self, ast):
+        self.ast = ast
+    
+    def run(self):
+        # Top-level names are the globals seen from inside functions
+        env = self.globals = {}
+        try:
+            self.block(self.ast, env)
+        except Return as r:
+            return r.value
+    
+    def block(self, body, env):
+        for node in body:
+            self.statement(node, env)
+    
+    def statement(self, node, env):
+        if isinstance(node, VarDeclaration):
+            env[node.name] = self.evaluate(node.value, env)
+        elif isinstance(node, FunctionDef):
+            env[node.name] = node
+        elif isinstance(node, ReturnStatement):
+            raise Return(self.evaluate(node.value, env))
+        elif isinstance(node, LoopStatement):
+            for _ in range(int(self.evaluate(node.times, env))):
+                self.block(node.body, env)
+        else:
+            self.evaluate(node, env)
+    
+    def evaluate(self, node, env):
+        if isinstance(node, Number):
+            return node.value
+        if isinstance(node, Identifier):
+            return env[node.name] if node.name in env else self.globals[node.name]
+        if isinstance(node, BinaryOperation):
+            left = self.evaluate(node.left, env)
+            right = self.evaluate(node.right, env)
+            if node.op == 'PLUS':
+                return left + right
+            if node.op == 'MINUS':
+                return left - right
+            if node.op == 'MULTIPLY':
+                return left * right
+            return left / right
+        if isinstance(node, FunctionCall):
+            function = env.get(node.name) or self.globals[node.name]
+            local = dict(zip(function.params, (self.evaluate(arg, env) for arg in node.args)))
+            try:
+                self.block(function.body, local)
+            except Return as r:
+                return r.value
+            return None
+        raise TypeError(f"Unsupported node {type(node).__name__}")
+
+def best_time(run, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--iterations', type=int, default=100000, help='loop iterations')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='timing repetitions (best is kept)')
+    args = arg_parser.parse_args(argv)
+    
+    ast = parse_gb_code(PROGRAM % {'iterations': args.iterations})
+    walker = TreeWalker(ast)
+    program = compile_program(ast)
+    
+    expected = walker.run()
+    actual = program.run()
+    if expected != actual:
+        raise SystemExit(f"Compiled result {actual} differs from tree-walker result {expected}")
+    
+    print(f"Loop of {args.iterations} iterations, result {actual}")
+    results = {}
+    for name, run in (('TreeWalker', walker.run), ('Compiled', program.run)):
+        elapsed = best_time(run, args.repeat)
+        results[name] = elapsed
+        print(f"{name:>12}: {elapsed * 1000:9.2f} ms  {args.iterations / elapsed:12.0f} iterations/s")
+    print(f"     Speedup: {results['TreeWalker'] / results['Compiled']:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+The table-driven expression parser against the recursive-descent
+expr/term/factor it replaced.
+
+Both parsers must build the same AST for arithmetic-only programs, which
+the old grammar accepts. Deeply nested parentheses are parsed by the new
+parser only; the old one runs out of stack. The old parser also predates
+ParseLimits: it counts no nodes and no call depth, which the new one does
+for every operand.
+
+Usage: python -m benchmarks.expr_parser [--size CHARS] [--operands N] [--repeat N] [--nesting N]
+"""
+import argparse
+import time
+
+from gb_parser import (
+    FALSE, SMALL_NUMBERS, TOKEN_BOOLEAN, TOKEN_COMMA, TOKEN_DIVIDE, TOKEN_IDENTIFIER, TOKEN_LPAREN,
+    TOKEN_MINUS, TOKEN_MULTIPLY, TOKEN_NUMBER, TOKEN_PLUS, TOKEN_RPAREN, TOKEN_STRING, TOKEN_TYPES, TRUE,
+    BinaryOperation, FunctionCall, Identifier, Number, Parser, RegexLexer, String, UnaryOperation,
+)
+from gb_samples import same_tree
+
+from benchmarks.corpus import CorpusConfig, generate_program
+
+ADDITIVE = frozenset((TOKEN_PLUS, TOKEN_MINUS))
+MULTIPLICATIVE = frozenset((TOKEN_MULTIPLY, TOKEN_DIVIDE))
+
+class RecursiveParser(Parser):
+    # The previous expression grammar, copied as it was, one method per
+    # precedence level, but comparing token kinds by identity as Parser does
+    def expr(self):
+        node = self.term()
+        
+        while self.current_token.type in ADDITIVE:
+            token = self.current_token
+            self.eat(token.type)
+            node = BinaryOperation(node, TOKEN_TYPES[token.type], self.term(), token.offset)
+        
+        return node
+    
+    def term(self):
+        node = self.factor()
+        
+        while self.current_token.type in MULTIPLICATIVE:
+            token = self.current_token
+            self.eat(token.type)
+            node = BinaryOperation(node, TOKEN_TYPES[token.type], self.factor(), token.offset)
+        
+        return node
+    
+    def factor(self):
+        token = self.current_token
+        
+        if token.type is TOKEN_NUMBER:
+            self.eat(TOKEN_NUMBER)
+            value = token.value
+            if type(value) is int and 0 <= value < len(SMALL_NUMBERS):
+                return SMALL_NUMBERS[value]
+            return Number(value, token.offset)
+        
+        if token.type is TOKEN_STRING:
+            self.eat(TOKEN_STRING)
+            return String(token.value, token.offset)
+        
+        if token.type is TOKEN_BOOLEAN:
+            self.eat(TOKEN_BOOLEAN)
+            return TRUE if token.value == 'true' else FALSE
+        
+        if token.type is TOKEN_IDENTIFIER:
+            self.eat(TOKEN_IDENTIFIER)
+            if self.current_token.type is TOKEN_LPAREN:
+                self.eat(TOKEN_LPAREN)
+                args = []
+                if self.current_token.type is not TOKEN_RPAREN:
+                    args.append(self.expr())
+                    while self.current_token.type is TOKEN_COMMA:
+                        self.eat(TOKEN_COMMA)
+                        args.append(self.expr())
+                self.eat(TOKEN_RPAREN)
+                return FunctionCall(token.value, args, token.offset)
+            return Identifier(token.value, token.offset)
+        
+        if token.type is TOKEN_LPAREN:
+            self.eat(TOKEN_LPAREN)
+            node = self.expr()
+            self.eat(TOKEN_RPAREN)
+            return node
+        
+        if token.type is TOKEN_PLUS or token.type is TOKEN_MINUS:
+            self.eat(token.type)
+            return UnaryOperation(TOKEN_TYPES[token.type], self.factor(), token.offset)
+        
+        self.error()
+
+def parse(parser_class, source: str):
+    return parser_class(RegexLexer(source)).parse()
+
+def best_time(run, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def nesting_result(parser_class, source: str) -> str:
+    try:
+        parse(parser_class, source)
+    except RecursionError:
+        return 'RecursionError'
+    return 'ok'
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--size', type=int, default=256 * 1024, help='approximate program size in characters')
+    arg_parser.add_argument('--operands', type=int, default=24, help='maximum operands per expression')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='timing repetitions (best is kept)')
+    arg_parser.add_argument('--nesting', type=int, default=2000, help='depth of the nested parentheses test')
+    args = arg_parser.parse_args(argv)
+    
+    source = generate_program(CorpusConfig(size=args.size, depth=2, expression_length=args.operands))
+    if not same_tree(parse(RecursiveParser, source), parse(Parser, source)):
+        raise SystemExit("Table-driven parser built a different AST")
+    
+    print(f"Source: {len(source)} chars, up to {args.operands} operands per expression")
+    # Repetitions alternate between the parsers, so a slow spell on the
+    # machine does not favour either
+    results = {'RecursiveParser': float('inf'), 'Parser': float('inf')}
+    for _ in range(args.repeat):
+        for parser_class in (RecursiveParser, Parser):
+            elapsed = best_time(lambda: parse(parser_class, source), 1)
+            results[parser_class.__name__] = min(results[parser_class.__name__], elapsed)
+    for name, elapsed in results.items():
+        print(f"{name:>16}: {elapsed * 1000:9.2f} ms")
+    print(f"         Speedup: {results['RecursiveParser'] / results['Parser']:.2f}x")
+    
+    nested = f"var x = {'(' * args.nesting}1{')' * args.nesting}\n"
+    print(f"\n{args.nesting} nested parentheses:")
+    for parser_class in (RecursiveParser, Parser):
+        print(f"{parser_class.__name__:>16}: {nesting_result(parser_class, nested)}")
+
+if __name__ == "__main__":
+    main()
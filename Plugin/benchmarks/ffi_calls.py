@@ -0,0 +1,81 @@
+"""
+Per-call overhead of tsdll foreign calls, bound once against resolved on
+every call.
+
+Runs `loop times N` around a single tsdll call to a C function in three
+ways: with a hook that opens the library and looks the symbol up on every
+call, as a naive runtime would; with gb_ffi's hook called by name, which
+finds the cached binding on every call; and with the program loaded
+through gb_ffi, where each call site was bound when it was compiled. The
+same loop around a plain assignment is subtracted, and a direct ctypes
+call from Python is timed for reference.
+
+Usage: python -m benchmarks.ffi_calls [--library NAME] [--function NAME] [--calls N] [--repeat N]
+"""
+import argparse
+import ctypes
+import time
+
+from gb_ffi import ForeignFunctions, find_signature, load_program, open_library
+from gb_parser import parse_gb_code
+from gb_runtime import compile_program
+
+def best_time(run, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--library', default='libm.so.6', help='shared library to call into')
+    arg_parser.add_argument('--function', default='fabs', help='function taking and returning one double')
+    arg_parser.add_argument('--calls', type=int, default=200000, help='calls per run')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='timing repetitions (best is kept)')
+    args = arg_parser.parse_args(argv)
+    
+    library = open_library(args.library)._name  # As found, for ctypes.CDLL below
+    
+    def naive_tsdll(dll_name, function_name, *call_args):
+        function = getattr(ctypes.CDLL(library), function_name)
+        function.restype = ctypes.c_double
+        function.argtypes = [ctypes.c_double]
+        return function(*call_args)
+    
+    ast = parse_gb_code(f'loop times {args.calls} then\n    tsdll("{args.library}", "{args.function}", -1.5)\nend\n')
+    baseline_ast = parse_gb_code(f'loop times {args.calls} then\n    var x = -1.5\nend\n')
+    foreign = ForeignFunctions({})
+    programs = [
+        ('Resolved per call', compile_program(ast, {'tsdll': naive_tsdll})),
+        ('Binding found by name', compile_program(ast, {'tsdll': lambda *call_args: foreign(*call_args)})),
+        ('Bound at load', load_program(ast)),
+    ]
+    
+    if (find_signature(args.library, args.function) or (None, None))[1] != ('double',):
+        print(f"Note: {args.function} is not declared as taking one double; arguments are converted by value")
+    baseline = best_time(compile_program(baseline_ast).run, args.repeat)
+    print(f"{args.calls} calls to {args.library}:{args.function}, loop overhead subtracted:")
+    for label, program in programs:
+        elapsed = best_time(program.run, args.repeat) - baseline
+        print(f"  {label:>22}: {elapsed * 1e9 / args.calls:8.0f} ns/call")
+    
+    function = getattr(ctypes.CDLL(library), args.function)
+    function.restype = ctypes.c_double
+    function.argtypes = [ctypes.c_double]
+    calls = range(args.calls)
+    
+    def direct():
+        for _ in calls:
+            function(-1.5)
+    
+    def empty():
+        for _ in calls:
+            pass
+    
+    elapsed = best_time(direct, args.repeat) - best_time(empty, args.repeat)
+    print(f"  {'Direct ctypes call':>22}: {elapsed * 1e9 / args.calls:8.0f} ns/call")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Streaming HTML/JavaScript generation for programs of growing size.
+
+For each size, a corpus program is parsed and then generated into a sink
+that only counts characters. Time per character of output shows whether
+generation stays linear. The peak memory allocated while generating
+(the parsed AST excluded) should grow only with the number of distinct
+names and handlers, well below the size of the output.
+
+Usage: python -m benchmarks.gui_codegen [--sizes CHARS,...] [--chunk CHARS] [--repeat N]
+"""
+import argparse
+import time
+import tracemalloc
+
+from gb_codegen import CHUNK_SIZE, generate_html
+from gb_parser import parse_gb_code
+
+from benchmarks.corpus import CorpusConfig, generate_program
+
+class CountingSink:
+    def __init__(self):
+        self.size = 0
+        self.writes = 0
+    
+    def write(self, text: str):
+        self.size += len(text)
+        self.writes += 1
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--sizes', default='262144,1048576,4194304',
+                            help='comma-separated program sizes in characters')
+    arg_parser.add_argument('--chunk', type=int, default=CHUNK_SIZE, help='output chunk size in characters')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='timing repetitions (best is kept)')
+    args = arg_parser.parse_args(argv)
+    
+    print(f"{'program':>10} {'output':>10} {'writes':>7} {'buttons':>8} {'handlers':>9} {'time':>10} {'ns/char':>8} {'peak':>9}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        ast = parse_gb_code(generate_program(CorpusConfig(size=size)))
+        
+        best = float('inf')
+        for _ in range(args.repeat):
+            sink = CountingSink()
+            start = time.perf_counter()
+            stats = generate_html(ast, sink, args.chunk)
+            best = min(best, time.perf_counter() - start)
+        
+        tracemalloc.start()
+        generate_html(ast, CountingSink(), args.chunk)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        
+        print(f"{size:>10} {sink.size:>10} {sink.writes:>7} {stats.buttons:>8} {stats.handlers:>9} "
+              f"{best * 1000:>7.1f} ms {best * 1e9 / sink.size:>8.0f} {peak / 1024:>6.0f} KB")
+
+if __name__ == "__main__":
+    main()
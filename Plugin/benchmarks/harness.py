@@ -0,0 +1,167 @@
+"""
+Benchmark harness for the lexers, the parser and validate_gb_code.
+
+Programs from benchmarks.corpus are run through each stage while the file
+size, then the nesting depth, is varied. For every stage it reports
+tokens/s, AST nodes/s and peak traced memory, and saves everything as
+JSON so runs can be compared across commits.
+
+Usage: python -m benchmarks.harness [--quick] [--output FILE] [--compare FILE]
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from gb_parser import Lexer, Parser, RegexLexer, TOKEN_EOF, validate_gb_code, walk
+
+from benchmarks.corpus import CorpusConfig, generate_program
+
+SIZES = (16 * 1024, 64 * 1024, 256 * 1024)
+DEPTHS = (1, 2, 4, 8, 16)
+DEPTH_SWEEP_SIZE = 64 * 1024
+QUICK_SIZES = (4 * 1024, 16 * 1024)
+QUICK_DEPTHS = (1, 4, 8)
+
+def count_tokens(lexer) -> int:
+    count = 0
+    while lexer.get_next_token().type is not TOKEN_EOF:
+        count += 1
+    return count
+
+def parse(source: str):
+    return Parser(RegexLexer(source)).parse()
+
+# Stage name -> function run on the source
+STAGES = {
+    'Lexer': lambda source: count_tokens(Lexer(source)),
+    'RegexLexer': lambda source: count_tokens(RegexLexer(source)),
+    'Parser': parse,
+    'validate_gb_code': validate_gb_code,
+}
+
+# Stages that build an AST, for which nodes/s is reported
+AST_STAGES = ('Parser', 'validate_gb_code')
+
+def best_time(run: Callable, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def peak_memory(run: Callable) -> int:
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def measure(sweep: str, config: CorpusConfig, repeat: int) -> Dict:
+    source = generate_program(config)
+    tokens = count_tokens(RegexLexer(source))
+    nodes = sum(1 for _ in walk(parse(source)))
+    case = {
+        'sweep': sweep,
+        'config': config.as_dict(),
+        'chars': len(source),
+        'tokens': tokens,
+        'nodes': nodes,
+        'stages': {},
+    }
+    for name, stage in STAGES.items():
+        seconds = best_time(lambda: stage(source), repeat)
+        result = {
+            'seconds': seconds,
+            'tokens_per_second': tokens / seconds,
+            'peak_memory_bytes': peak_memory(lambda: stage(source)),
+        }
+        if name in AST_STAGES:
+            result['nodes_per_second'] = nodes / seconds
+        case['stages'][name] = result
+    return case
+
+def commit_hash() -> Optional[str]:
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+def case_label(case: Dict) -> str:
+    config = case['config']
+    return f"{case['sweep']:>5} size={case['chars']:>7} depth={config['depth']:>2}"
+
+def format_case(case: Dict) -> str:
+    lines = [f"{case_label(case)}  ({case['tokens']} tokens, {case['nodes']} nodes)"]
+    for name, result in case['stages'].items():
+        nodes = f"{result['nodes_per_second']:>10.0f} nodes/s" if 'nodes_per_second' in result else ' ' * 18
+        lines.append(f"    {name:>16}: {result['seconds'] * 1000:9.2f} ms {result['tokens_per_second']:>10.0f} tokens/s "
+                     f"{nodes} {result['peak_memory_bytes'] / (1024 * 1024):7.1f} MB peak")
+    return '\n'.join(lines)
+
+def compare(previous: Dict, current: Dict) -> List[str]:
+    # Speedup of each stage against a saved run, for the cases both share
+    def key(case):
+        config = case['config']
+        return case['sweep'], config['seed'], config['size'], config['depth']
+    
+    old_cases = {key(case): case for case in previous['cases']}
+    lines = [f"Compared with {previous['meta'].get('commit') or 'previous run'}:"]
+    for case in current['cases']:
+        old = old_cases.get(key(case))
+        if old is None:
+            continue
+        ratios = []
+        for name, result in case['stages'].items():
+            if name in old['stages']:
+                ratios.append(f"{name} {old['stages'][name]['seconds'] / result['seconds']:.2f}x")
+        lines.append(f"    {case_label(case)}: {', '.join(ratios)}")
+    return lines
+
+def main(argv: List[str] = None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--quick', action='store_true', help='small sizes and fewer depths')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='timing repetitions (best is kept)')
+    arg_parser.add_argument('--seed', type=int, default=0, help='corpus seed')
+    arg_parser.add_argument('--output', help='write the results to this JSON file')
+    arg_parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    args = arg_parser.parse_args(argv)
+    
+    sizes = QUICK_SIZES if args.quick else SIZES
+    depths = QUICK_DEPTHS if args.quick else DEPTHS
+    depth_size = sizes[-1] if args.quick else DEPTH_SWEEP_SIZE
+    configs = [('size', CorpusConfig(seed=args.seed, size=size)) for size in sizes]
+    configs += [('depth', CorpusConfig(seed=args.seed, size=depth_size, depth=depth)) for depth in depths]
+    
+    results = {
+        'meta': {
+            'commit': commit_hash(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'repeat': args.repeat,
+        },
+        'cases': [],
+    }
+    for sweep, config in configs:
+        case = measure(sweep, config, args.repeat)
+        results['cases'].append(case)
+        print(format_case(case), flush=True)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            print('\n'.join(compare(json.load(f), results)))
+
+if __name__ == "__main__":
+    main()
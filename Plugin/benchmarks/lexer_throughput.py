@@ -0,0 +1,50 @@
+"""
+Throughput comparison between the character-by-character Lexer and the
+compiled-pattern RegexLexer.
+
+Usage: python -m benchmarks.lexer_throughput [--size N] [--repeat N]
+"""
+import argparse
+import time
+
+from gb_parser import Lexer, RegexLexer, TOKEN_EOF
+from gb_samples import make_source
+
+def token_stream(lexer):
+    tokens = []
+    while True:
+        token = lexer.get_next_token()
+        tokens.append((token.type, token.value))
+        if token.type is TOKEN_EOF:
+            return tokens
+
+def best_time(lexer_class, source: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        token_stream(lexer_class(source))
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--size', type=int, default=500, help='number of generated blocks')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='timing repetitions (best is kept)')
+    args = arg_parser.parse_args(argv)
+    
+    source = make_source(args.size)
+    expected = token_stream(Lexer(source))
+    actual = token_stream(RegexLexer(source))
+    if expected != actual:
+        raise SystemExit("RegexLexer token stream differs from Lexer")
+    
+    print(f"Source: {len(source)} chars, {len(expected)} tokens")
+    results = {}
+    for lexer_class in (Lexer, RegexLexer):
+        elapsed = best_time(lexer_class, source, args.repeat)
+        results[lexer_class.__name__] = elapsed
+        print(f"{lexer_class.__name__:>12}: {elapsed * 1000:9.2f} ms  {len(expected) / elapsed:12.0f} tokens/s")
+    print(f"     Speedup: {results['Lexer'] / results['RegexLexer']:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Parsing one large program on a process pool against a serial parse.
+
+The parallel path is timed even where worth_splitting() would pick the
+serial one, and both must build the same AST. The pre-scan is timed on its
+own, as it runs in this process before any worker starts.
+
+Usage: python -m benchmarks.parallel_parse [--size CHARS] [--workers N] [--repeat N]
+"""
+import argparse
+import os
+import time
+
+from gb_parallel import CHUNKS_PER_WORKER, MIN_CHUNK_SIZE, parse_in_chunks, split_points, worth_splitting
+from gb_parser import parse_gb_code
+from gb_samples import same_tree
+
+from benchmarks.corpus import CorpusConfig, generate_program
+
+def best_time(run, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--size', type=int, default=4 * 1024 * 1024, help='approximate program size in characters')
+    arg_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='timing repetitions (best is kept)')
+    args = arg_parser.parse_args(argv)
+    
+    source = generate_program(CorpusConfig(size=args.size))
+    if not same_tree(parse_gb_code(source), parse_in_chunks(source, args.workers)):
+        raise SystemExit("Parallel parse built a different AST")
+    
+    chunk_size = max(len(source) // (args.workers * CHUNKS_PER_WORKER), MIN_CHUNK_SIZE)
+    chunks = len(split_points(source, chunk_size)) + 1
+    print(f"Source: {len(source)} chars, {chunks} chunks on {args.workers} workers "
+          f"(on {os.cpu_count()} CPUs)")
+    
+    scan = best_time(lambda: split_points(source, chunk_size), args.repeat)
+    serial = best_time(lambda: parse_gb_code(source), args.repeat)
+    parallel = best_time(lambda: parse_in_chunks(source, args.workers), args.repeat)
+    print(f"    Pre-scan: {scan * 1000:9.2f} ms")
+    print(f"      Serial: {serial * 1000:9.2f} ms")
+    print(f"    Parallel: {parallel * 1000:9.2f} ms")
+    print(f"     Speedup: {serial / parallel:.2f}x")
+    print(f"worth_splitting() picks the {'parallel' if worth_splitting(len(source), args.workers) else 'serial'} path")
+
+if __name__ == "__main__":
+    main()
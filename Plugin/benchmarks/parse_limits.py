@@ -0,0 +1,77 @@
+"""
+Cost of parsing under ParseLimits, and how soon hostile input is stopped.
+
+A corpus program is parsed with no limits and with limits it stays just
+under, which must give the same AST; the difference is the cost of
+checking them. Hostile programs (deep nesting, a huge string literal, a
+flood of tokens) are then parsed with the limits a service might set,
+showing how long each takes to be rejected and with which error, against
+parsing it unlimited.
+
+Usage: python -m benchmarks.parse_limits [--size CHARS] [--repeat N]
+"""
+import argparse
+import time
+
+from gb_parser import ParseLimitError, ParseLimits, parse_gb_code, tokenize, walk
+from gb_samples import same_tree
+
+from benchmarks.corpus import CorpusConfig, generate_program
+
+def best_time(run, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def outcome(code: str, limits: ParseLimits = None) -> str:
+    try:
+        parse_gb_code(code, limits)
+        return "parsed"
+    except ParseLimitError as e:
+        return f"ParseLimitError ({e.limit})"
+    except RecursionError:
+        return "RecursionError"
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--size', type=int, default=1024 * 1024, help='approximate program size in characters')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='timing repetitions (best is kept)')
+    args = arg_parser.parse_args(argv)
+    
+    code = generate_program(CorpusConfig(size=args.size))
+    ast = parse_gb_code(code)
+    exact = ParseLimits(max_source_bytes=len(code.encode('utf-8')), max_tokens=len(tokenize(code)) - 1,
+                        max_depth=64, max_string_length=1024, max_nodes=sum(1 for _ in walk(ast)))
+    if not same_tree(parse_gb_code(code, exact), ast):
+        raise SystemExit("Limits changed the AST")
+    
+    unlimited = best_time(lambda: parse_gb_code(code), args.repeat)
+    limited = best_time(lambda: parse_gb_code(code, exact), args.repeat)
+    print(f"{len(code)} characters, {exact.max_tokens} tokens, {exact.max_nodes} nodes:")
+    print(f"  {'No limits':>20}: {unlimited * 1000:8.1f} ms")
+    print(f"  {'Limits just met':>20}: {limited * 1000:8.1f} ms ({(limited / unlimited - 1) * 100:+.1f}%)")
+    
+    service = ParseLimits(max_source_bytes=args.size, max_tokens=args.size // 4, max_depth=64,
+                          max_string_length=4096, max_nodes=args.size // 8)
+    hostile = [
+        ('Nested ifs', 'if x then\n' * 5000 + 'end\n' * 5000),
+        ('Nested calls', 'f(' * 5000 + ')' * 5000),
+        ('Huge string', 'var s = "' + 'a' * (args.size // 2) + '"\n'),
+        ('Nested parentheses', '(' * (args.size // 2 - 1) + '1' + ')' * (args.size // 2 - 1)),
+        ('Statement flood', 'x\n' * (args.size // 2)),
+        ('Oversized source', 'var x = 1\n' * (args.size // 5)),
+    ]
+    print(f"Hostile input, service limits {service.as_dict()}:")
+    for label, source in hostile:
+        unlimited_outcome = outcome(source)
+        unlimited = best_time(lambda: outcome(source), args.repeat)
+        limited_outcome = outcome(source, service)
+        limited = best_time(lambda: outcome(source, service), args.repeat)
+        print(f"  {label:>20}: {unlimited_outcome:>28} in {unlimited * 1000:7.1f} ms, "
+              f"limited {limited_outcome:>30} in {limited * 1000:7.2f} ms")
+
+if __name__ == "__main__":
+    main()
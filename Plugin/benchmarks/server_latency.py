@@ -0,0 +1,99 @@
+"""
+Round-trip latency of the resident validation server.
+
+Starts `python -m gb_parser serve`, opens a corpus program, then times
+single-character edits from sending the change until its diagnostics
+arrive, then how many diagnostics notifications a burst of edits sent
+back to back produces.
+
+Usage: python -m benchmarks.server_latency [--size CHARS] [--edits N] [--burst N]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from gb_server import read_message, write_message
+
+from benchmarks.corpus import CorpusConfig, generate_program
+
+class Client:
+    def __init__(self, debounce: float):
+        plugin = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gb_parser', 'serve', '--debounce', str(debounce)],
+            cwd=plugin, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    
+    def send(self, method: str, params: dict):
+        write_message(self.process.stdin, {'jsonrpc': '2.0', 'method': method, 'params': params})
+    
+    def receive(self) -> dict:
+        body = read_message(self.process.stdout)
+        if body is None:
+            raise SystemExit("Server exited")
+        return json.loads(body)
+    
+    def close(self):
+        self.send('exit', {})
+        self.process.stdin.close()
+        self.process.wait(timeout=10)
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--size', type=int, default=64 * 1024, help='approximate document size in characters')
+    arg_parser.add_argument('--edits', type=int, default=200, help='single edits to time')
+    arg_parser.add_argument('--burst', type=int, default=50, help='edits in the coalescing test')
+    arg_parser.add_argument('--debounce', type=float, default=2.0, help='server debounce in milliseconds')
+    args = arg_parser.parse_args(argv)
+    
+    source = generate_program(CorpusConfig(size=args.size))
+    client = Client(args.debounce)
+    try:
+        start = time.perf_counter()
+        client.send('open', {'uri': 'bench.gb', 'text': source, 'version': 0})
+        message = client.receive()
+        print(f"Document: {len(source)} chars, first validation {(time.perf_counter() - start) * 1000:.2f} ms "
+              f"(valid: {message['params']['valid']})")
+        
+        # Insert and then remove a space just after the first `=`: the
+        # document stays valid and changes length each time
+        offset = source.index('=') + 1
+        latencies = []
+        for version in range(1, args.edits + 1):
+            edit = [offset, 0, ' '] if version % 2 else [offset, 1, '']
+            start = time.perf_counter()
+            client.send('change', {'uri': 'bench.gb', 'version': version, 'edits': [edit]})
+            message = client.receive()
+            latencies.append(time.perf_counter() - start)
+            if message['params']['version'] != version:
+                raise SystemExit(f"Diagnostics for version {message['params']['version']}, expected {version}")
+        print(f"Single edits: median {percentile(latencies, 0.5) * 1000:.2f} ms, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.2f} ms, max {max(latencies) * 1000:.2f} ms")
+        
+        # A burst sent back to back, then a validate request to mark its end
+        first = args.edits + 1
+        last = first + args.burst
+        for version in range(first, last):
+            client.send('change', {'uri': 'bench.gb', 'version': version, 'edits': [[offset, 0, ' ']]})
+        client.send('change', {'uri': 'bench.gb', 'version': last, 'text': source + 'var = \n'})
+        write_message(client.process.stdin, {'jsonrpc': '2.0', 'id': 1, 'method': 'validate',
+                                             'params': {'uri': 'bench.gb'}})
+        notifications = []
+        while True:
+            message = client.receive()
+            if message.get('id') == 1:
+                break
+            notifications.append(message['params']['version'])
+        print(f"Burst of {last - first + 1} changes: {len(notifications)} notification(s), for versions {notifications}; "
+              f"{len(message['result']['diagnostics'])} diagnostics")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    main()
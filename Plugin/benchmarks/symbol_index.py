@@ -0,0 +1,67 @@
+"""
+Symbol index lookups against walking the AST for each query.
+
+Generates a set of corpus programs as separate files, indexes them, then
+times finding a name's references by walking every tree against asking
+the index, and re-indexing one file against rebuilding the whole index.
+
+Usage: python -m benchmarks.symbol_index [--files N] [--size CHARS] [--queries N] [--repeat N]
+"""
+import argparse
+import time
+
+from gb_parser import FunctionCall, Identifier, parse_gb_code, walk
+from gb_symbols import SymbolIndex
+
+from benchmarks.corpus import CorpusConfig, generate_program
+
+def best_time(run, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def walk_references(files, names):
+    for name in names:
+        [node for ast in files.values() for node in walk(ast)
+         if type(node) in (Identifier, FunctionCall) and node.name == name]
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--files', type=int, default=16, help='number of files')
+    arg_parser.add_argument('--size', type=int, default=32 * 1024, help='approximate size of each file in characters')
+    arg_parser.add_argument('--queries', type=int, default=20, help='names looked up')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='timing repetitions (best is kept)')
+    args = arg_parser.parse_args(argv)
+    
+    sources = {f'file{i}.gb': generate_program(CorpusConfig(seed=i, size=args.size)) for i in range(args.files)}
+    files = {uri: parse_gb_code(source) for uri, source in sources.items()}
+    
+    def build():
+        index = SymbolIndex()
+        for uri, ast in files.items():
+            index.update(uri, ast, sources[uri])
+        return index
+    
+    index = build()
+    names = sorted(index.global_references)[:args.queries]
+    print(f"{args.files} files, {sum(map(len, sources.values()))} chars, {len(index.global_definitions)} global names")
+    
+    uri = next(iter(files))
+    walked = best_time(lambda: walk_references(files, names), args.repeat)
+    looked_up = best_time(lambda: [index.references(name) for name in names], args.repeat)
+    rebuilt = best_time(build, args.repeat)
+    updated = best_time(lambda: index.update(uri, files[uri], sources[uri]), args.repeat)
+    unused = best_time(index.unused, args.repeat)
+    print(f"  {len(names)} reference queries:")
+    print(f"    Walking the ASTs: {walked * 1000:9.3f} ms")
+    print(f"           Via index: {looked_up * 1000:9.3f} ms ({walked / looked_up:.0f}x)")
+    print(f"  Re-indexing one file:")
+    print(f"       Whole rebuild: {rebuilt * 1000:9.3f} ms")
+    print(f"            One file: {updated * 1000:9.3f} ms ({rebuilt / updated:.1f}x)")
+    print(f"  Unused symbols ({len(index.unused())}): {unused * 1000:.3f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Parsing GB code from asyncio without blocking the event loop.
+
+parse_gb_code_async() and validate_gb_code_async() parse on a thread of
+their own, which keeps the parser's recursion, but only while the event
+loop waits on it: the loop hands it a slice of a few milliseconds at a
+time and gets control back at the next statement, GUI element or run of
+CHECK_OPERANDS operands, however deeply nested, so concurrent requests
+share the loop fairly whatever the size of one statement. A wall-clock
+budget and an optional cancel event are checked at the same points;
+running out of either gives a ParseTimeout instead of the result.
+Cancelling the task itself raises CancelledError as usual the next time
+the loop is handed back, and the thread stops at its next check.
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from gb_parser import AST, TOKEN_EOF, ParseLimits, Parser, RegexLexer
+
+# How long one slice of parsing may hold the event loop
+SLICE_MS = 5.0
+
+# Operands parsed between checks of the budget within an expression
+CHECK_OPERANDS = 256
+
+class ParseTimeout:
+    """
+    Result of a parse that was stopped early.
+    
+    reason: 'budget' or 'cancelled'
+    elapsed_ms: wall-clock time from the call until it stopped
+    ast: the top-level statements completed by then
+    offset, line, column: where in the source parsing had got to
+    """
+    def __init__(self, reason: str, elapsed_ms: float, ast: List[AST], offset: int, line: int, column: int):
+        self.reason = reason
+        self.elapsed_ms = elapsed_ms
+        self.ast = ast
+        self.offset = offset
+        self.line = line
+        self.column = column
+    
+    def as_dict(self) -> Dict:
+        result = dict(vars(self))
+        result['ast'] = len(self.ast)  # Statements completed
+        return result
+
+class Interrupted(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class BudgetedParser(Parser):
+    """
+    Parser that runs on a thread of its own, a slice at a time. Before
+    every statement and GUI element, nested ones included, and every
+    CHECK_OPERANDS operands it stops if past its deadline or once `stop` is
+    set, and pauses if its slice is over until resume() is called from the
+    event loop.
+    """
+    def __init__(self, lexer, deadline: Optional[float], stop: threading.Event, slice_ms: float,
+                 recover: bool = False, limits: Optional[ParseLimits] = None):
+        super().__init__(lexer, recover, limits)
+        self.deadline = deadline
+        self.stop = stop
+        self.slice = slice_ms / 1000
+        self.slice_end = 0.0
+        self.operands = 0
+        self.resumed = threading.Event()
+        self.paused = threading.Event()
+    
+    def check(self):
+        if self.stop.is_set():
+            raise Interrupted('cancelled')
+        now = time.perf_counter()
+        if self.deadline is not None and now > self.deadline:
+            raise Interrupted('budget')
+        if now >= self.slice_end:
+            self.pause()
+            if self.stop.is_set():
+                raise Interrupted('cancelled')
+    
+    def pause(self):
+        self.paused.set()
+        self.resumed.wait()
+        self.resumed.clear()
+        self.slice_end = time.perf_counter() + self.slice
+    
+    def resume(self):
+        # Called from the event loop, which waits out the slice
+        self.resumed.set()
+        self.paused.wait()
+        self.paused.clear()
+    
+    def statement(self):
+        self.check()
+        return super().statement()
+    
+    def gui_element(self):
+        self.check()
+        return super().gui_element()
+    
+    def primary(self):
+        self.operands += 1
+        if self.operands % CHECK_OPERANDS == 0:
+            self.check()
+        return super().primary()
+
+def parse_statements(parser: BudgetedParser, ast: List[AST], outcome: List[Optional[BaseException]]):
+    # Top-level statements are added to `ast` as they are completed, so an
+    # interrupted parse still has them. `outcome` gets what was raised, or
+    # None, once the parse is over.
+    try:
+        parser.pause()
+        while parser.current_token.type is not TOKEN_EOF:
+            # One top-level statement, recovering from errors as Parser.block does
+            depth, consumed = parser.depth, parser.consumed
+            try:
+                ast.append(parser.statement())
+            except SyntaxError:
+                if not parser.recover:
+                    raise
+                parser.synchronize(depth, consumed)
+    except BaseException as e:
+        outcome.append(e)
+    else:
+        outcome.append(None)
+    finally:
+        parser.paused.set()
+
+async def run_budgeted(code: str, recover: bool, budget_ms: Optional[float], cancel: Optional[asyncio.Event],
+                       slice_ms: float, limits: Optional[ParseLimits]) -> Tuple[BudgetedParser, Union[List[AST], ParseTimeout]]:
+    start = time.perf_counter()
+    deadline = None if budget_ms is None else start + budget_ms / 1000
+    stop = threading.Event()
+    parser = BudgetedParser(RegexLexer(code, limits=limits), deadline, stop, slice_ms, recover, limits)
+    ast, outcome = [], []
+    worker = threading.Thread(target=parse_statements, args=(parser, ast, outcome), daemon=True)
+    worker.start()
+    parser.paused.wait()
+    parser.paused.clear()
+    try:
+        while not outcome:
+            if cancel is not None and cancel.is_set():
+                stop.set()
+            parser.resume()
+            if not outcome:
+                await asyncio.sleep(0)
+    finally:
+        if not outcome:
+            # The task was cancelled: let the worker run to its next check and end
+            stop.set()
+            parser.resumed.set()
+    
+    error = outcome[0]
+    if isinstance(error, Interrupted):
+        token = parser.current_token
+        line, column = token.lines.position(token.offset)
+        return parser, ParseTimeout(error.reason, (time.perf_counter() - start) * 1000, ast, token.offset, line, column)
+    if error is not None:
+        raise error
+    return parser, ast
+
+async def parse_gb_code_async(code: str, budget_ms: Optional[float] = None, cancel: Optional[asyncio.Event] = None,
+                              slice_ms: float = SLICE_MS, limits: Optional[ParseLimits] = None) -> Union[List[AST], ParseTimeout]:
+    """
+    Parse GB language code into an AST, giving the event loop back every
+    `slice_ms`. Raises SyntaxError and ParseLimitError like parse_gb_code;
+    returns a ParseTimeout once `budget_ms` has passed or `cancel` is set.
+    """
+    _, result = await run_budgeted(code, False, budget_ms, cancel, slice_ms, limits)
+    return result
+
+async def validate_gb_code_async(code: str, budget_ms: Optional[float] = None, cancel: Optional[asyncio.Event] = None,
+                                 slice_ms: float = SLICE_MS, limits: Optional[ParseLimits] = None) -> Union[Tuple[bool, List[str]], ParseTimeout]:
+    """
+    validate_gb_code for asyncio, sliced and budgeted like
+    parse_gb_code_async().
+    """
+    parser, result = await run_budgeted(code, True, budget_ms, cancel, slice_ms, limits)
+    if isinstance(result, ParseTimeout):
+        return result
+    parser.diagnostics.sort(key=lambda diagnostic: (diagnostic.line, diagnostic.column))
+    errors = [str(diagnostic) for diagnostic in parser.diagnostics]
+    return not errors, errors
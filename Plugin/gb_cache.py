@@ -0,0 +1,266 @@
+"""
+Content-addressed cache in front of parse_gb_code and validate_gb_code.
+
+Sources are keyed by a hash of their text. Results live in a bounded
+in-memory LRU and, optionally, in an on-disk tier that survives process
+restarts. The on-disk tier is partitioned by parser version, so entries
+written by an older parser are never served. Its entries hold the errors
+as JSON and the AST in the binary format of gb_serialize, neither of
+which can run code when read back.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import gb_parser
+import gb_serialize
+from gb_parser import AST, Diagnostic, GBSyntaxError, parse_gb_code, parse_gb_code_with_diagnostics
+from gb_serialize import dumps_ast, load_ast
+
+# Rough in-memory size of a parsed AST per source character, used when the
+# cache is bounded by bytes
+AST_BYTES_PER_CHAR = 12
+
+# The on-disk tier lives in this subdirectory of the one it is given, one
+# subdirectory per parser version, each marked by a file of this name
+DISK_NAMESPACE = 'gb_parse_cache'
+VERSION_MARKER = 'GB_PARSE_CACHE'
+VERSION_NAME = re.compile(r'[0-9a-f]{16}')
+
+# An on-disk entry: the length of a JSON header holding the errors, the
+# header, then the AST as dumps_ast() writes it
+ENTRY_HEADER = struct.Struct('<I')
+
+def parser_version() -> str:
+    """
+    Fingerprint of everything a cached result depends on: the parser, the
+    AST format and the entry layout of this module. Changes whenever one of
+    their files does.
+    """
+    digest = hashlib.sha256()
+    for module in (gb_parser, gb_serialize, sys.modules[__name__]):
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def source_key(code: str) -> str:
+    return hashlib.sha256(code.encode('utf-8', 'surrogatepass')).hexdigest()
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+        self.disk_writes = 0
+    
+    def as_dict(self) -> Dict[str, int]:
+        return dict(vars(self))
+    
+    def __str__(self):
+        return ', '.join(f'{name}={value}' for name, value in vars(self).items())
+
+class ParseCache:
+    """
+    LRU cache of parse results, bounded by entry count and/or approximate
+    bytes, with an optional on-disk tier under `directory`.
+    
+    Cached ASTs are shared between callers and must be treated as read-only.
+    Syntax errors are cached too, so invalid sources are not re-parsed.
+    Sources are parsed with error recovery, so one entry answers both
+    parse() and validate(); for an invalid source the entry also keeps the
+    error parse_gb_code raises, so parse() fails the same way.
+    
+    The on-disk tier only ever writes to, and prunes, `<directory>/gb_parse_cache`.
+    """
+    def __init__(self, max_entries: Optional[int] = 256, max_bytes: Optional[int] = None,
+                 directory: Optional[str] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (ast, errors, syntax error, size)
+        self.size = 0
+        self.stats = CacheStats()
+        self.lock = threading.Lock()
+        self.directory = None
+        if directory is not None:
+            self.open_directory(directory)
+    
+    def open_directory(self, directory: str):
+        # Entries live under a per-version subdirectory of our own namespace;
+        # other versions' entries there are stale and get removed. Nothing
+        # outside the namespace is touched, nor anything in it that is not a
+        # marked version directory.
+        version = parser_version()
+        namespace = os.path.join(directory, DISK_NAMESPACE)
+        os.makedirs(namespace, exist_ok=True)
+        for name in os.listdir(namespace):
+            path = os.path.join(namespace, name)
+            if (name != version and VERSION_NAME.fullmatch(name)
+                    and os.path.isfile(os.path.join(path, VERSION_MARKER))):
+                shutil.rmtree(path, ignore_errors=True)
+        self.directory = os.path.join(namespace, version)
+        os.makedirs(self.directory, exist_ok=True)
+        marker = os.path.join(self.directory, VERSION_MARKER)
+        if not os.path.exists(marker):
+            with open(marker, 'w') as f:
+                f.write(version + '\n')
+    
+    def parse(self, code: str) -> List[AST]:
+        """
+        Cached equivalent of parse_gb_code.
+        """
+        ast, _, syntax_error = self.lookup(code)
+        if syntax_error is not None:
+            raise GBSyntaxError(syntax_error.message, syntax_error.line, syntax_error.column)
+        return ast
+    
+    def validate(self, code: str) -> Tuple[bool, List[str]]:
+        """
+        Cached equivalent of validate_gb_code.
+        """
+        _, errors, _ = self.lookup(code)
+        return not errors, list(errors)
+    
+    def lookup(self, code: str) -> Tuple[List[AST], List[str], Optional[Diagnostic]]:
+        key = source_key(code)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.stats.hits += 1
+                return entry[:3]
+            self.stats.misses += 1
+        
+        result = self.load(key)
+        if result is None:
+            result = parse_result(code)
+            self.store(key, result)
+        
+        self.insert(key, result, len(code) * AST_BYTES_PER_CHAR)
+        return result
+    
+    def insert(self, key: str, result: Tuple[Any, Any, Any], size: int):
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = (*result, size)
+            self.size += size
+            while self.entries and self.over_budget():
+                _, (_, _, _, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                self.stats.evictions += 1
+    
+    def over_budget(self) -> bool:
+        if self.max_entries is not None and len(self.entries) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self.size > self.max_bytes
+    
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + '.gbcache')
+    
+    def load(self, key: str) -> Optional[Tuple[Any, Any]]:
+        if self.directory is None:
+            return None
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                result = decode_entry(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Unreadable or truncated entry: drop it and parse again
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        with self.lock:
+            self.stats.disk_hits += 1
+        return result
+    
+    def store(self, key: str, result: Tuple[Any, Any, Any]):
+        if self.directory is None:
+            return
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so readers never see partial entries
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(encode_entry(result))
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        with self.lock:
+            self.stats.disk_writes += 1
+    
+    def clear(self):
+        """
+        Drop the in-memory entries. The on-disk tier is left as it is.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+def encode_entry(result: Tuple[List[AST], List[str], Optional[Diagnostic]]) -> bytes:
+    ast, errors, syntax_error = result
+    if syntax_error is not None:
+        syntax_error = [syntax_error.message, syntax_error.line, syntax_error.column]
+    header = json.dumps({'errors': errors, 'syntax_error': syntax_error}).encode('utf-8')
+    return ENTRY_HEADER.pack(len(header)) + header + dumps_ast(ast)
+
+def decode_entry(data: bytes) -> Tuple[List[AST], List[str], Optional[Diagnostic]]:
+    # Raises ValueError (ASTFormatError for the AST) on anything malformed
+    if len(data) < ENTRY_HEADER.size:
+        raise ValueError("Truncated cache entry")
+    length, = ENTRY_HEADER.unpack_from(data)
+    end = ENTRY_HEADER.size + length
+    header = json.loads(data[ENTRY_HEADER.size:end].decode('utf-8'))
+    if type(header) is not dict:
+        raise ValueError("Bad cache entry header")
+    errors = header.get('errors')
+    syntax_error = header.get('syntax_error')
+    if type(errors) is not list or not all(type(error) is str for error in errors):
+        raise ValueError("Bad errors in cache entry")
+    if syntax_error is not None:
+        if type(syntax_error) is not list or [type(value) for value in syntax_error] != [str, int, int]:
+            raise ValueError("Bad syntax error in cache entry")
+        syntax_error = Diagnostic(*syntax_error)
+    return load_ast(memoryview(data)[end:]), errors, syntax_error
+
+def parse_result(code: str) -> Tuple[List[AST], List[str], Optional[Diagnostic]]:
+    # The recovering parse's AST and errors, plus for an invalid source the
+    # message and position of the GBSyntaxError parse_gb_code raises
+    ast, diagnostics = parse_gb_code_with_diagnostics(code)
+    errors = [str(diagnostic) for diagnostic in diagnostics]
+    syntax_error = None
+    if errors:
+        try:
+            parse_gb_code(code)
+            syntax_error = diagnostics[0]  # Not expected: the strict parse succeeded
+        except GBSyntaxError as e:
+            syntax_error = Diagnostic(e.message, e.line, e.column)
+    return ast, errors, syntax_error
+
+default_cache = ParseCache()
+
+def cached_parse_gb_code(code: str) -> List[AST]:
+    """
+    parse_gb_code through the default cache.
+    """
+    return default_cache.parse(code)
+
+def cached_validate_gb_code(code: str) -> Tuple[bool, List[str]]:
+    """
+    validate_gb_code through the default cache.
+    """
+    return default_cache.validate(code)
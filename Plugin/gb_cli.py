@@ -0,0 +1,223 @@
+"""
+Command line interface for the GB language tools.
+    
+    python -m gb_parser validate [--jobs N] [--format text|json] [--max-depth N] PATH...
+    python -m gb_parser profile [--legacy-lexer] [--collapsed FILE] PATH
+    python -m gb_parser serve [--debounce MS]
+    python -m gb_parser html [-o FILE] PATH
+
+`validate` checks every .gb file under the given directories (and any
+files given directly) on a process pool, printing each result, with all
+of the file's errors, as soon as it is known. Files nested deeper than
+--max-depth, or that the parser fails on in any other way, are reported
+as failed without stopping the batch.
+
+`profile` parses one file with per-rule profiling and prints the report;
+--collapsed also writes the stacks for flamegraph.pl.
+
+`serve` runs a resident validation server speaking JSON-RPC over stdin
+and stdout; see gb_server.
+
+`html` writes the HTML and JavaScript for a program's GUI (see gb_codegen)
+to standard output or FILE.
+"""
+import argparse
+import fnmatch
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional
+
+from gb_parser import ParseLimitError, ParseLimits, validate_gb_code
+
+# Exit codes
+EXIT_OK = 0
+EXIT_INVALID = 1
+EXIT_FAILURE = 2
+
+# Default nesting limit for validate, well within the recursion limit
+MAX_DEPTH = 200
+
+def find_sources(paths: List[str], pattern: str) -> Iterator[str]:
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if fnmatch.fnmatch(name, pattern):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def validate_file(path: str, limits: Optional[ParseLimits] = None) -> Dict:
+    start = time.perf_counter()
+    result = {'path': path, 'status': 'ok', 'errors': []}
+    try:
+        with open(path, encoding='utf-8') as f:
+            valid, errors = validate_gb_code(f.read(), limits)
+        if not valid:
+            result['status'] = 'invalid'
+            result['errors'] = errors
+    except (OSError, UnicodeDecodeError, ParseLimitError) as e:
+        result['status'] = 'failed'
+        result['errors'].append(str(e))
+    except Exception as e:
+        # A parser failure on one file must not end the batch
+        result['status'] = 'failed'
+        result['errors'].append(f"{type(e).__name__}: {e}")
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def failed_result(path: str, error: Exception) -> Dict:
+    return {'path': path, 'status': 'failed', 'errors': [f"{type(error).__name__}: {error}"], 'seconds': 0.0}
+
+def largest_first(paths: List[str]) -> List[str]:
+    """
+    Order files by size, largest first, so that no large file is left to
+    run alone at the end of the batch.
+    """
+    sized = []
+    for path in paths:
+        try:
+            sized.append((os.path.getsize(path), path))
+        except OSError:
+            sized.append((0, path))
+    sized.sort(reverse=True)
+    return [path for _, path in sized]
+
+def run_validation(paths: List[str], jobs: int, limits: Optional[ParseLimits] = None) -> Iterator[Dict]:
+    if jobs <= 1:
+        for path in paths:
+            yield validate_file(path, limits)
+        return
+    
+    # One task per file, so each result is yielded as soon as it is known
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(validate_file, path, limits): path for path in largest_first(paths)}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # The worker itself died
+                yield failed_result(futures[future], e)
+
+def format_text(result: Dict) -> str:
+    label = {'ok': 'OK', 'invalid': 'INVALID', 'failed': 'FAILED'}[result['status']]
+    lines = [f"{result['path']}: {label} ({result['seconds'] * 1000:.1f} ms)"]
+    lines.extend(f"    {error}" for error in result['errors'])
+    return '\n'.join(lines)
+
+def validate_command(args) -> int:
+    paths = list(find_sources(args.paths, args.pattern))
+    counts = {'ok': 0, 'invalid': 0, 'failed': 0}
+    start = time.perf_counter()
+    
+    limits = ParseLimits(max_depth=args.max_depth)
+    for result in run_validation(paths, args.jobs, limits):
+        counts[result['status']] += 1
+        if args.format == 'json':
+            print(json.dumps(result), flush=True)
+        elif result['status'] != 'ok' or not args.quiet:
+            print(format_text(result), flush=True)
+    
+    elapsed = time.perf_counter() - start
+    if args.format == 'json':
+        print(json.dumps({'summary': counts, 'seconds': elapsed}), flush=True)
+    else:
+        print(f"{len(paths)} files: {counts['ok']} ok, {counts['invalid']} invalid, "
+              f"{counts['failed']} failed in {elapsed:.2f}s", file=sys.stderr)
+    
+    if counts['failed']:
+        return EXIT_FAILURE
+    if counts['invalid']:
+        return EXIT_INVALID
+    return EXIT_OK
+
+def profile_command(args) -> int:
+    from gb_profile import profile_gb_code
+    
+    try:
+        with open(args.path, encoding='utf-8') as f:
+            code = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"{args.path}: {e}", file=sys.stderr)
+        return EXIT_FAILURE
+    
+    profile = profile_gb_code(code, legacy_lexer=args.legacy_lexer)
+    print(profile.report())
+    if args.collapsed:
+        with open(args.collapsed, 'w') as f:
+            f.write(profile.collapsed())
+    if profile.error:
+        print(f"{args.path}: {profile.error}", file=sys.stderr)
+        return EXIT_INVALID
+    return EXIT_OK
+
+def serve_command(args) -> int:
+    from gb_server import serve
+    
+    serve(sys.stdin.buffer, sys.stdout.buffer, args.debounce)
+    return EXIT_OK
+
+def html_command(args) -> int:
+    from gb_codegen import generate_html
+    from gb_parser import parse_gb_code
+    
+    try:
+        with open(args.path, encoding='utf-8') as f:
+            ast = parse_gb_code(f.read())
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"{args.path}: {e}", file=sys.stderr)
+        return EXIT_FAILURE
+    except SyntaxError as e:
+        print(f"{args.path}: {e}", file=sys.stderr)
+        return EXIT_INVALID
+    
+    if args.output is None:
+        generate_html(ast, sys.stdout)
+        return EXIT_OK
+    try:
+        with open(args.output, 'w', encoding='utf-8') as out:
+            generate_html(ast, out)
+    except OSError as e:
+        print(f"{args.output}: {e}", file=sys.stderr)
+        return EXIT_FAILURE
+    return EXIT_OK
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='gb_parser', description='GB language tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    validate = commands.add_parser('validate', help='validate .gb files in parallel')
+    validate.add_argument('paths', nargs='+', metavar='PATH', help='file or directory to validate')
+    validate.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                          help='number of worker processes (default: CPU count)')
+    validate.add_argument('--format', choices=('text', 'json'), default='text',
+                          help='text, or one JSON object per line')
+    validate.add_argument('--pattern', default='*.gb', help='file name pattern inside directories')
+    validate.add_argument('-q', '--quiet', action='store_true', help='only report files that fail')
+    validate.add_argument('--max-depth', type=int, default=MAX_DEPTH, metavar='N',
+                          help=f'fail files nested deeper than this (default: {MAX_DEPTH})')
+    validate.set_defaults(handler=validate_command)
+    
+    profile = commands.add_parser('profile', help='time each grammar rule while parsing a file')
+    profile.add_argument('path', metavar='PATH', help='file to parse')
+    profile.add_argument('--legacy-lexer', action='store_true', help='use the character-by-character Lexer')
+    profile.add_argument('--collapsed', metavar='FILE', help='write collapsed stacks for flamegraph.pl')
+    profile.set_defaults(handler=profile_command)
+    
+    from gb_server import DEBOUNCE_MS
+    serve = commands.add_parser('serve', help='validate open documents over JSON-RPC on stdio')
+    serve.add_argument('--debounce', type=float, default=DEBOUNCE_MS, metavar='MS',
+                       help=f'quiet time after a change before validating (default: {DEBOUNCE_MS} ms)')
+    serve.set_defaults(handler=serve_command)
+    
+    html = commands.add_parser('html', help="generate HTML and JavaScript for a program's GUI")
+    html.add_argument('path', metavar='PATH', help='file to generate from')
+    html.add_argument('-o', '--output', metavar='FILE', help='write here instead of standard output')
+    html.set_defaults(handler=html_command)
+    
+    args = parser.parse_args(argv)
+    return args.handler(args)
@@ -0,0 +1,363 @@
+"""
+HTML and JavaScript for the GUI of a GB program.
+
+generate_html() walks the program once, in order, and streams a page
+fragment to a writer. Windows, containers, buttons, inputs and text become
+HTML. The rest of the program becomes JavaScript in inline <script> blocks
+placed between the elements, so statements run in program order as the
+page loads. Output is written in chunks of about CHUNK_SIZE characters.
+Apart from the current chunk, only one top-level statement or button
+handler is ever held as text. What else is kept grows with the number of
+distinct names and handlers, not with the size of the output.
+
+- Window sizes are folded with the optimizer, `def` constants included.
+  A constant size goes in the element's style; any other size is computed
+  by a script just inside the element.
+- Buttons whose handlers compile to the same code share one function. A
+  single delegated listener runs the function named by a button's
+  `data-gb-handler`.
+- As in gb_runtime, GUI elements anywhere else (in a function or an `if`,
+  say) do nothing, and are left out.
+
+The scripts rely on the `gb` object set up by PRELUDE. Globals live in
+`gb.g`, and tsdll and ts.windows calls go through `gb.tsdll` and
+`gb.tsWindows`, which a page may define before the fragment.
+"""
+import hashlib
+import html
+import json
+import re
+from typing import List, Optional, Set, TextIO
+
+from gb_optimizer import OptimizeStats, Optimizer, declaration_counts
+from gb_parser import (
+    AST, BinaryOperation, Boolean, Button, Container, DefDeclaration, FunctionCall, FunctionDef,
+    Identifier, IfStatement, Input, LoopStatement, Number, ReturnStatement, String, TextElement,
+    TSDLLCall, TSWindowsCall, UnaryOperation, VarDeclaration, Window, declared_names,
+)
+from gb_runtime import GUI_NODES
+
+# Characters buffered before they are passed on to the writer
+CHUNK_SIZE = 64 * 1024
+
+PRELUDE = '''<script>
+var gb = window.gb || {};
+gb.g = Object.create(null);
+gb.g.print = function () { console.log.apply(console, arguments); };
+gb.handlers = Object.create(null);
+gb.finished = false;
+gb.tsWindows = gb.tsWindows || function (title, text) { window.alert('[' + title + '] ' + text); };
+gb.tsdll = gb.tsdll || function (dll, name) { throw new Error('tsdll call to ' + dll + ':' + name + ' has no binding'); };
+gb.run = function (statements) {
+    if (!gb.finished) {
+        var result = statements();
+        if (result !== undefined) {
+            gb.finished = true;
+            gb.result = result[0];
+        }
+    }
+};
+gb.size = function (element, width, height) {
+    if (width !== undefined) element.style.width = width + 'px';
+    if (height !== undefined) element.style.height = height + 'px';
+};
+document.addEventListener('click', function (event) {
+    var button = event.target.closest && event.target.closest('[data-gb-handler]');
+    if (button) gb.handlers[button.getAttribute('data-gb-handler')].call(button, event);
+});
+</script>
+'''
+
+# JavaScript operator for each GB operator
+OPERATORS = {
+    'PLUS': '+',
+    'MINUS': '-',
+    'MULTIPLY': '*',
+    'DIVIDE': '/',
+    'EQUAL_EQUAL': '===',
+    'NOT_EQUAL': '!==',
+    'LESS': '<',
+    'LESS_EQUAL': '<=',
+    'GREATER': '>',
+    'GREATER_EQUAL': '>=',
+    'AND': '&&',
+    'OR': '||',
+}
+
+PREFIX_OPERATORS = {
+    'NOT': '!',
+    'MINUS': '-',
+    'PLUS': '+',
+}
+
+JS_NAME = re.compile(r'[A-Za-z_$][\w$]*', re.ASCII)
+
+def js_string(value: str) -> str:
+    # A JavaScript string literal that is also safe inside <script>
+    return json.dumps(value).replace('</', '<\\/')
+
+def js_number(value: float) -> str:
+    if isinstance(value, int) or value.is_integer() and abs(value) < 2 ** 53:
+        text = str(int(value))
+    else:
+        text = repr(value)
+    return f'({text})' if text.startswith('-') else text
+
+class Scope:
+    """
+    Where names are looked up in the code being compiled: a function's
+    locals, or None for code outside functions. `program` is true for the
+    top level of the program, whose `return` ends it.
+    """
+    def __init__(self, locals: Optional[Set[str]] = None, program: bool = False):
+        self.locals = locals
+        self.program = program
+    
+    def name(self, name: str) -> str:
+        if self.locals is not None and name in self.locals:
+            return 'v_' + name
+        return 'gb.g.' + name if JS_NAME.fullmatch(name) else f'gb.g[{js_string(name)}]'
+
+class ScriptCompiler:
+    """
+    Compiles GB statements to JavaScript lines, with the semantics of
+    gb_runtime: inside a function, parameters and the names it declares are
+    local; every other name is a global.
+    """
+    def __init__(self):
+        # Loops nested around the code being compiled. Counters are named
+        # after their depth, so the same code always compiles the same way.
+        self.loop_depth = 0
+    
+    def expression(self, node: AST, scope: Scope) -> str:
+        node_type = type(node)
+        if node_type is Number:
+            return js_number(node.value)
+        if node_type is String:
+            return js_string(node.value)
+        if node_type is Boolean:
+            return 'true' if node.value else 'false'
+        if node_type is Identifier:
+            return scope.name(node.name)
+        if node_type is BinaryOperation:
+            left = self.expression(node.left, scope)
+            right = self.expression(node.right, scope)
+            return f'({left} {OPERATORS[node.op]} {right})'
+        if node_type is UnaryOperation:
+            return f'({PREFIX_OPERATORS[node.op]}{self.expression(node.expr, scope)})'
+        if node_type is FunctionCall:
+            args = ', '.join(self.expression(arg, scope) for arg in node.args)
+            return f'{scope.name(node.name)}({args})'
+        if node_type is TSWindowsCall:
+            return f'gb.tsWindows({js_string(node.title)}, {js_string(node.text)})'
+        if node_type is TSDLLCall:
+            args = ''.join(', ' + self.expression(arg, scope) for arg in node.args)
+            return f'gb.tsdll({js_string(node.dll_name)}, {js_string(node.function_name)}{args})'
+        raise ValueError(f"Cannot compile {node_type.__name__} to JavaScript")
+    
+    def condition(self, node: AST, scope: Scope) -> str:
+        # Without the parentheses `if` and `while` bring anyway
+        code = self.expression(node, scope)
+        return code[1:-1] if type(node) is BinaryOperation else code
+    
+    def block(self, body: List[AST], scope: Scope, indent: str, lines: List[str]):
+        for node in body:
+            if not isinstance(node, GUI_NODES):
+                self.statement(node, scope, indent, lines)
+    
+    def statement(self, node: AST, scope: Scope, indent: str, lines: List[str]):
+        node_type = type(node)
+        inner = indent + '    '
+        if node_type is VarDeclaration or node_type is DefDeclaration:
+            lines.append(f'{indent}{scope.name(node.name)} = {self.expression(node.value, scope)};\n')
+        elif node_type is FunctionDef:
+            self.function_def(node, scope, indent, lines)
+        elif node_type is ReturnStatement:
+            value = self.expression(node.value, scope)
+            lines.append(f'{indent}return [{value}];\n' if scope.program else f'{indent}return {value};\n')
+        elif node_type is IfStatement:
+            lines.append(f'{indent}if ({self.condition(node.condition, scope)}) {{\n')
+            self.block(node.body, scope, inner, lines)
+            for condition, body in node.elif_clauses:
+                lines.append(f'{indent}}} else if ({self.condition(condition, scope)}) {{\n')
+                self.block(body, scope, inner, lines)
+            if node.else_body:
+                lines.append(f'{indent}}} else {{\n')
+                self.block(node.else_body, scope, inner, lines)
+            lines.append(f'{indent}}}\n')
+        elif node_type is LoopStatement:
+            if node.is_times_loop:
+                i, n = f'$i{self.loop_depth}', f'$n{self.loop_depth}'
+                times = self.expression(node.times, scope)
+                lines.append(f'{indent}for (var {i} = 0, {n} = Math.trunc({times}); {i} < {n}; {i}++) {{\n')
+            else:
+                lines.append(f'{indent}while ({self.condition(node.condition, scope)}) {{\n')
+            self.loop_depth += 1
+            self.block(node.body, scope, inner, lines)
+            self.loop_depth -= 1
+            lines.append(f'{indent}}}\n')
+        else:
+            lines.append(f'{indent}{self.expression(node, scope)};\n')
+    
+    def function_def(self, node: FunctionDef, scope: Scope, indent: str, lines: List[str]):
+        inner = indent + '    '
+        function_scope = Scope(set(node.params).union(declared_names(node.body)))
+        params = ', '.join('v_' + param for param in node.params)
+        lines.append(f'{indent}{scope.name(node.name)} = function ({params}) {{\n')
+        local_names = sorted(function_scope.locals.difference(node.params))
+        if local_names:
+            lines.append(f"{inner}var {', '.join('v_' + name for name in local_names)};\n")
+        self.block(node.body, function_scope, inner, lines)
+        lines.append(f'{indent}}};\n')
+
+class ChunkedWriter:
+    """
+    Collects text and passes it on to `out` about `chunk_size` characters
+    at a time.
+    """
+    def __init__(self, out: TextIO, chunk_size: int = CHUNK_SIZE):
+        self.out = out
+        self.chunk_size = chunk_size
+        self.pending = []
+        self.size = 0
+    
+    def write(self, text: str):
+        self.pending.append(text)
+        self.size += len(text)
+        if self.size >= self.chunk_size:
+            self.flush()
+    
+    def flush(self):
+        if self.pending:
+            self.out.write(''.join(self.pending))
+            self.pending = []
+            self.size = 0
+
+class CodegenStats:
+    def __init__(self):
+        self.elements = 0
+        self.buttons = 0
+        self.handlers = 0  # Distinct handler functions emitted
+        self.static_sizes = 0
+        self.dynamic_sizes = 0
+        self.scripts = 0
+    
+    def as_dict(self):
+        return dict(vars(self))
+    
+    def __str__(self):
+        return ', '.join(f'{name}={value}' for name, value in self.as_dict().items())
+
+class HTMLGenerator:
+    def __init__(self, ast: List[AST], writer: ChunkedWriter):
+        self.writer = writer
+        self.scripts = ScriptCompiler()
+        self.optimizer = Optimizer(declaration_counts(ast), OptimizeStats())
+        self.handlers = {}  # Digest of a handler's code -> its name
+        self.stats = CodegenStats()
+        self.in_script = False
+    
+    def program(self, ast: List[AST]):
+        write = self.writer.write
+        write(PRELUDE)
+        scope = Scope(program=True)
+        for node in ast:
+            if isinstance(node, GUI_NODES):
+                self.end_script()
+                self.gui_element(node)
+                continue
+            
+            # Folding a top-level statement also records the `def` constants
+            # later statements and window sizes use
+            lines = []
+            self.scripts.block(self.optimizer.statement(node, top_level=True), scope, '    ', lines)
+            if lines:
+                if not self.in_script:
+                    write('<script>\ngb.run(function () {\n')
+                    self.in_script = True
+                    self.stats.scripts += 1
+                write(''.join(lines))
+        self.end_script()
+    
+    def end_script(self):
+        if self.in_script:
+            self.writer.write('});\n</script>\n')
+            self.in_script = False
+    
+    def gui_element(self, root: AST):
+        # Containers nest arbitrarily deep, so walk with a stack of nodes
+        # and closing tags
+        write = self.writer.write
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if type(node) is str:
+                write(node)
+                continue
+            self.stats.elements += 1
+            node_type = type(node)
+            if node_type is Window:
+                self.window(node)
+                stack.append('</div>\n')
+                stack.extend(reversed(node.children))
+            elif node_type is Container:
+                write('<div class="gb-container">\n')
+                stack.append('</div>\n')
+                stack.extend(reversed(node.children))
+            elif node_type is Button:
+                self.button(node)
+            elif node_type is Input:
+                write(f'<input class="gb-input" name="{html.escape(node.name)}" '
+                      f'value="{html.escape(node.default_value)}">\n')
+            elif node_type is TextElement:
+                write(f'<p class="gb-text">{html.escape(node.text)}</p>\n')
+    
+    def window(self, node: Window):
+        # Constant dimensions go in a style attribute; a script inside the
+        # element sets the others once the statements before it have run
+        style = []
+        dynamic = {}
+        for name in ('width', 'height'):
+            value = self.optimizer.expression(getattr(node, name))
+            if type(value) is Number:
+                style.append(f'{name}:{js_number(value.value)}px')
+                self.stats.static_sizes += 1
+            else:
+                dynamic[name] = self.scripts.expression(value, Scope(program=True))
+                self.stats.dynamic_sizes += 1
+        
+        write = self.writer.write
+        write(f'<div class="gb-window" style="{";".join(style)}">\n' if style else '<div class="gb-window">\n')
+        if dynamic:
+            write(f'<script>gb.run(function () {{ gb.size(document.currentScript.parentNode, '
+                  f'{dynamic.get("width", "undefined")}, {dynamic.get("height", "undefined")}); }});</script>\n')
+        write(f'<div class="gb-window-title">{html.escape(node.title)}</div>\n')
+    
+    def button(self, node: Button):
+        self.stats.buttons += 1
+        text = html.escape(node.text)
+        lines = []
+        self.scripts.block(self.optimizer.block(node.event_handler), Scope(), '    ', lines)
+        if not lines:
+            self.writer.write(f'<button class="gb-button" type="button">{text}</button>\n')
+            return
+        
+        code = ''.join(lines)
+        digest = hashlib.blake2b(code.encode('utf-8'), digest_size=16).digest()
+        name = self.handlers.get(digest)
+        if name is None:
+            name = self.handlers[digest] = f'h{len(self.handlers)}'
+            self.stats.handlers += 1
+            self.writer.write(f'<script>\ngb.handlers.{name} = function () {{\n{code}}};\n</script>\n')
+        self.writer.write(f'<button class="gb-button" type="button" data-gb-handler="{name}">{text}</button>\n')
+
+def generate_html(ast: List[AST], out: TextIO, chunk_size: int = CHUNK_SIZE) -> CodegenStats:
+    """
+    Write the HTML and JavaScript for a parsed program to `out`, in chunks
+    of about `chunk_size` characters. Returns counts of what was emitted.
+    """
+    writer = ChunkedWriter(out, chunk_size)
+    generator = HTMLGenerator(ast, writer)
+    generator.program(ast)
+    writer.flush()
+    return generator.stats
@@ -0,0 +1,288 @@
+"""
+ctypes bindings for tsdll foreign calls.
+
+load_program() collects every tsdll call site of a program into an import
+table, one entry per library and function however many sites call it.
+Each library is opened once and each function resolved once, before the
+program runs, and every binding failure is reported together in a
+GBRuntimeError. The compiled program then calls the cached function
+pointers directly: gb_runtime binds each call site through
+ForeignFunctions.bind() when it compiles it.
+
+GB values are converted following a plan worked out once per function.
+For a function in SIGNATURES (or added with register_signature()) the
+plan comes from its declared C types, declared for one library or for a
+function of that name in any library; numbers are passed as int or double
+as declared and strings as char* (or wchar_t*). Other functions return
+int, and each argument is converted by its type at call time: a whole
+number as int, any other number as double, a string as char*.
+
+Libraries are opened with ctypes.CDLL, or WinDLL on Windows, by the given
+name; a bare name such as `m` is also looked up with
+ctypes.util.find_library().
+"""
+import ctypes
+import ctypes.util
+import sys
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from gb_parser import AST, TSDLLCall, walk
+from gb_runtime import GBRuntimeError, Program, compile_program
+
+# C type names used in signatures
+C_TYPES = {
+    'void': None,
+    'int': ctypes.c_int,
+    'uint': ctypes.c_uint,
+    'long': ctypes.c_long,
+    'ulong': ctypes.c_ulong,
+    'double': ctypes.c_double,
+    'float': ctypes.c_float,
+    'str': ctypes.c_char_p,
+    'wstr': ctypes.c_wchar_p,
+    'pointer': ctypes.c_void_p,
+}
+
+# (library, function name) -> (return type, argument types), for functions
+# whose arguments cannot be guessed from the values passed. Libraries are
+# keyed by library_key(); None stands for any library, and is used for the
+# C runtime, whose library goes by a different name on every system.
+SIGNATURES = {
+    # C library and maths library
+    (None, 'abs'): ('int', ('int',)),
+    (None, 'labs'): ('long', ('long',)),
+    (None, 'atoi'): ('int', ('str',)),
+    (None, 'strlen'): ('ulong', ('str',)),
+    (None, 'getpid'): ('int', ()),
+    (None, 'puts'): ('int', ('str',)),
+    (None, 'sqrt'): ('double', ('double',)),
+    (None, 'cos'): ('double', ('double',)),
+    (None, 'sin'): ('double', ('double',)),
+    (None, 'fabs'): ('double', ('double',)),
+    (None, 'floor'): ('double', ('double',)),
+    (None, 'pow'): ('double', ('double', 'double')),
+    # Windows
+    ('user32', 'MessageBoxA'): ('int', ('pointer', 'str', 'str', 'uint')),
+    ('kernel32', 'GetTickCount'): ('uint', ()),
+    ('kernel32', 'Sleep'): ('void', ('uint',)),
+    ('user32', 'GetSystemMetrics'): ('int', ('int',)),
+    ('gdi32', 'SetPixel'): ('uint', ('pointer', 'int', 'int', 'uint')),
+}
+
+def library_key(dll_name: Optional[str]) -> Optional[str]:
+    # Windows library names ignore case and the .dll suffix
+    if dll_name is None:
+        return None
+    key = dll_name.lower()
+    return key[:-4] if key.endswith('.dll') else key
+
+def find_signature(dll_name: str, function_name: str) -> Optional[Tuple[str, Tuple[str, ...]]]:
+    """
+    The declared (return type, argument types) of a function of a library,
+    or None if it has none.
+    """
+    signature = SIGNATURES.get((library_key(dll_name), function_name))
+    return signature if signature is not None else SIGNATURES.get((None, function_name))
+
+def register_signature(dll_name: Optional[str], function_name: str, restype: str, argtypes: Sequence[str]):
+    """
+    Declare the C types of a foreign function of a library, or of any
+    library for None, by the names in C_TYPES. Cached bindings it applies
+    to are dropped, so programs loaded from then on use it; programs
+    already loaded keep the functions they were bound to.
+    """
+    for name in (restype, *argtypes):
+        if name not in C_TYPES:
+            raise ValueError(f"Unknown C type {name!r}")
+    key = library_key(dll_name)
+    SIGNATURES[key, function_name] = (restype, tuple(argtypes))
+    for bound_dll, bound_function in list(BINDINGS):
+        if bound_function == function_name and (key is None or library_key(bound_dll) == key):
+            del BINDINGS[bound_dll, bound_function]
+
+# How a GB value becomes an argument of each C type
+def to_int(value) -> int:
+    return int(value)
+
+def to_double(value) -> float:
+    return float(value)
+
+def to_bytes(value) -> Optional[bytes]:
+    return None if value is None else str(value).encode('utf-8')
+
+def to_str(value) -> Optional[str]:
+    return None if value is None else str(value)
+
+def to_any(value):
+    # No declared type: go by the value itself
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else ctypes.c_double(value)
+    return value
+
+CONVERTERS = {
+    ctypes.c_int: to_int,
+    ctypes.c_uint: to_int,
+    ctypes.c_long: to_int,
+    ctypes.c_ulong: to_int,
+    ctypes.c_double: to_double,
+    ctypes.c_float: to_double,
+    ctypes.c_char_p: to_bytes,
+    ctypes.c_wchar_p: to_str,
+    ctypes.c_void_p: lambda value: None if value is None else int(value),
+}
+
+class BindingError:
+    """
+    A library that could not be opened or a function not found in it, with
+    the offset of every call site that needs it.
+    """
+    def __init__(self, dll_name: str, function_name: str, message: str, offsets: List[int]):
+        self.dll_name = dll_name
+        self.function_name = function_name
+        self.message = message
+        self.offsets = offsets
+    
+    def as_dict(self) -> Dict:
+        return dict(vars(self))
+    
+    def __str__(self):
+        sites = len(self.offsets)
+        return f"{self.dll_name}:{self.function_name}: {self.message} ({sites} call site{'s' if sites != 1 else ''})"
+
+# Opened libraries and resolved functions, shared by every program in the
+# process. A library that failed to open maps to its error message.
+LIBRARIES = {}
+BINDINGS = {}
+
+def open_library(dll_name: str):
+    library = LIBRARIES.get(dll_name)
+    if library is None:
+        loader = ctypes.WinDLL if sys.platform == 'win32' else ctypes.CDLL
+        try:
+            library = loader(dll_name)
+        except OSError as e:
+            found = ctypes.util.find_library(dll_name)
+            try:
+                library = loader(found) if found else str(e)
+            except OSError as e:
+                library = str(e)
+        LIBRARIES[dll_name] = library
+    if isinstance(library, str):
+        raise GBRuntimeError(f"Cannot open library: {library}")
+    return library
+
+def bind_function(dll_name: str, function_name: str) -> Callable:
+    """
+    The function as a Python callable taking GB values, resolved and given
+    its conversion plan once. Raises GBRuntimeError if it cannot be bound.
+    """
+    key = (dll_name, function_name)
+    bound = BINDINGS.get(key)
+    if bound is not None:
+        return bound
+    label = f"{dll_name}:{function_name}"
+    
+    library = open_library(dll_name)
+    try:
+        # Look the symbol up without ctypes' own per-library cache, so the
+        # types set below are this binding's alone
+        function = library[function_name]
+    except AttributeError:
+        raise GBRuntimeError(f"Function not found in {dll_name}")
+    
+    signature = find_signature(dll_name, function_name)
+    if signature is None:
+        function.restype = ctypes.c_int
+        bound = make_call(function, None, False, label)
+    else:
+        restype, argtypes = signature
+        function.restype = C_TYPES[restype]
+        function.argtypes = [C_TYPES[name] for name in argtypes]
+        converters = tuple(CONVERTERS[C_TYPES[name]] for name in argtypes)
+        decode = restype in ('str', 'wstr')
+        bound = make_call(function, converters, decode, label)
+    BINDINGS[key] = bound
+    return bound
+
+def make_call(function, converters: Optional[Tuple[Callable, ...]], decode: bool, label: str) -> Callable:
+    # The closure a call site calls. Program.run() reports TypeError and
+    # ValueError from a conversion; ctypes' own ArgumentError is wrapped here.
+    if converters is None:
+        def call_any(*args):
+            try:
+                return function(*[to_any(arg) for arg in args])
+            except ctypes.ArgumentError as e:
+                raise GBRuntimeError(f"tsdll call to {label}: {e}") from e
+        return call_any
+    
+    arity = len(converters)
+    if arity == 1 and not decode:
+        convert, = converters
+        
+        def call1(*args):
+            if len(args) != 1:
+                raise GBRuntimeError(f"{label} takes 1 argument, got {len(args)}")
+            try:
+                return function(convert(args[0]))
+            except ctypes.ArgumentError as e:
+                raise GBRuntimeError(f"tsdll call to {label}: {e}") from e
+        return call1
+    
+    def call(*args):
+        if len(args) != arity:
+            raise GBRuntimeError(f"{label} takes {arity} arguments, got {len(args)}")
+        try:
+            result = function(*[convert(arg) for convert, arg in zip(converters, args)])
+        except ctypes.ArgumentError as e:
+            raise GBRuntimeError(f"tsdll call to {label}: {e}") from e
+        if decode and result is not None:
+            return result.decode('utf-8', 'replace') if isinstance(result, bytes) else result
+        return result
+    return call
+
+class ForeignFunctions:
+    """
+    The `tsdll` builtin backed by ctypes. gb_runtime calls bind() once per
+    call site while compiling; calling the object itself looks the binding
+    up on every call.
+    """
+    def __init__(self, imports: Dict[Tuple[str, str], List[int]]):
+        self.imports = imports
+        self.errors = []
+        for (dll_name, function_name), offsets in imports.items():
+            try:
+                bind_function(dll_name, function_name)
+            except GBRuntimeError as e:
+                self.errors.append(BindingError(dll_name, function_name, str(e), offsets))
+    
+    def bind(self, dll_name: str, function_name: str) -> Callable:
+        return bind_function(dll_name, function_name)
+    
+    def __call__(self, dll_name: str, function_name: str, *args) -> Any:
+        return bind_function(dll_name, function_name)(*args)
+
+def collect_imports(ast: List[AST]) -> Dict[Tuple[str, str], List[int]]:
+    """
+    The import table of a program: each (library, function) it calls
+    through tsdll, with the offsets of its call sites.
+    """
+    imports = {}
+    for node in walk(ast):
+        if type(node) is TSDLLCall:
+            imports.setdefault((node.dll_name, node.function_name), []).append(node.offset)
+    for offsets in imports.values():
+        offsets.sort()
+    # In order of first use, for reports that follow the source
+    return dict(sorted(imports.items(), key=lambda item: item[1][0]))
+
+def load_program(ast: List[AST], builtins: Optional[Dict[str, Callable]] = None) -> Program:
+    """
+    Bind every tsdll call of a parsed program and compile it. Raises
+    GBRuntimeError listing every call that cannot be bound.
+    """
+    foreign = ForeignFunctions(collect_imports(ast))
+    if foreign.errors:
+        raise GBRuntimeError("Cannot bind tsdll calls:\n" + '\n'.join(f"    {error}" for error in foreign.errors))
+    return compile_program(ast, dict(builtins or {}, tsdll=foreign))
@@ -0,0 +1,203 @@
+"""
+Incremental re-parsing of edited GB documents.
+
+A ParseResult remembers where each top-level statement starts. Given a
+list of text edits, reparse_document() re-lexes and re-parses only the
+top-level statements around the damaged region and reuses every untouched
+AST subtree, so the work done scales with the size of the edit rather than
+the size of the document.
+"""
+from array import array
+from bisect import bisect_right
+from typing import List, Optional, Tuple
+
+from gb_parser import AST, LineIndex, ParseLimits, Parser, RegexLexer, TOKEN_EOF, is_shared_leaf, walk
+
+# An edit replaces `removed` characters at `offset` with `inserted`
+TextEdit = Tuple[int, int, str]
+
+class ParseResult:
+    """
+    Parse of a whole document, along with the start offset of each
+    top-level statement.
+    
+    Like the text of a gap buffer, the starts before `split` are kept from
+    the beginning of the text and the rest, as negative numbers, from its
+    end. An edit between the two changes neither, so reparse_document()
+    only converts the starts the split is moved across, and the statements
+    after an edit cost nothing.
+    """
+    def __init__(self, text: str, nodes: List[AST], starts: array, split: Optional[int] = None,
+                 bases: Optional[array] = None):
+        self.text = text
+        self.nodes = nodes
+        self.starts = starts
+        self.split = len(starts) if split is None else split
+        # Where each statement started when its offsets were last right.
+        # Statements reused after an edit are only moved when `ast` is read,
+        # so typing does not walk the rest of the document on every keystroke.
+        self.bases = array('q', starts) if bases is None else bases
+        self.pending = bases is not None
+        self.lines = LineIndex(text)
+    
+    @property
+    def ast(self) -> List[AST]:
+        """
+        The top-level statements, with all offsets referring to `text`.
+        """
+        if self.pending:
+            nodes, bases = self.nodes, self.bases
+            for index in range(len(nodes)):
+                start = self.start(index)
+                if start != bases[index]:
+                    shift_offsets((nodes[index],), start - bases[index])
+                    bases[index] = start
+            self.pending = False
+        return self.nodes
+    
+    def start(self, index: int) -> int:
+        """
+        Start offset of the top-level statement at `index`.
+        """
+        start = self.starts[index]
+        return start if index < self.split else start + len(self.text)
+    
+    def find(self, offset: int) -> int:
+        """
+        Index of the last top-level statement starting at or before
+        `offset`, or -1.
+        """
+        starts, split, end = self.starts, self.split, len(self.text)
+        if split < len(starts) and offset >= starts[split] + end:
+            return bisect_right(starts, offset - end, split) - 1
+        return bisect_right(starts, offset, 0, split) - 1
+    
+    def move_split(self, split: int):
+        starts, end = self.starts, len(self.text)
+        if split < self.split:
+            starts[split:self.split] = array('q', [start - end for start in starts[split:self.split]])
+        elif split > self.split:
+            starts[self.split:split] = array('q', [start + end for start in starts[self.split:split]])
+        self.split = split
+    
+    def position(self, index: int) -> Tuple[int, int]:
+        """
+        Line and column of the top-level statement at `index`.
+        """
+        return self.lines.position(self.start(index))
+
+def parse_statements(text: str, pos: int = 0, resync=None, limits: Optional[ParseLimits] = None):
+    """
+    Parse top-level statements starting at `pos`, which must be a token
+    boundary.
+    
+    Before each statement `resync(offset)` is consulted; once it returns an
+    index, parsing stops there. Returns the parsed nodes, their start
+    offsets and the index `resync` returned (or None). `limits` apply to
+    the statements parsed, and the whole text for its size.
+    """
+    parser = Parser(RegexLexer(text, pos, limits), limits=limits)
+    nodes, starts = [], []
+    
+    while parser.current_token.type is not TOKEN_EOF:
+        start = parser.current_token.offset
+        if resync is not None:
+            index = resync(start)
+            if index is not None:
+                return nodes, starts, index
+        starts.append(start)
+        nodes.append(parser.statement())
+    
+    return nodes, starts, None
+
+def parse_document(text: str, limits: Optional[ParseLimits] = None) -> ParseResult:
+    """
+    Parse a whole GB document, keeping what reparse_document() needs.
+    """
+    nodes, starts, _ = parse_statements(text, limits=limits)
+    return ParseResult(text, nodes, array('q', starts))
+
+def apply_edits(text: str, edits: List[TextEdit]) -> Tuple[str, int, int, int]:
+    """
+    Apply edits in order, each against the text left by the previous one.
+    
+    Returns the new text, the damaged region [lo, hi) in new-text offsets
+    and the overall change in length.
+    """
+    lo = hi = None
+    delta = 0
+    for offset, removed, inserted in edits:
+        if offset < 0 or removed < 0 or offset + removed > len(text):
+            raise ValueError(f"Edit ({offset}, {removed}) is outside the document")
+        text = text[:offset] + inserted + text[offset + removed:]
+        shift = len(inserted) - removed
+        delta += shift
+        
+        # Carry the damaged region so far through this edit, then widen it
+        if lo is None:
+            lo, hi = offset, offset + len(inserted)
+        else:
+            if hi > offset:
+                hi = hi + shift if hi >= offset + removed else offset + len(inserted)
+            lo = min(lo, offset)
+            hi = max(hi, offset + len(inserted))
+    
+    return text, lo, hi, delta
+
+def reparse_document(previous: ParseResult, edits: List[TextEdit], limits: Optional[ParseLimits] = None) -> ParseResult:
+    """
+    Re-parse a document after text edits, reusing the previous result.
+    
+    Raises SyntaxError like parse_gb_code if the edited text is invalid,
+    and ParseLimitError if the statements re-parsed go over `limits`;
+    `previous` stays valid for its own text. On success, its statements
+    are handed over to the result, and only the result should be read from.
+    """
+    if not edits:
+        return previous
+    
+    text, lo, hi, delta = apply_edits(previous.text, edits)
+    
+    # Restart one statement before the one holding the damage: the damaged
+    # statement's first token decides whether its predecessor continues.
+    damaged = previous.find(lo)
+    first = max(damaged - 1, 0)
+    pos = previous.start(first) if first > 0 else 0
+    
+    def resync(offset: int) -> Optional[int]:
+        # Past the damage, the text is unchanged; a statement starting where
+        # an old one did parses exactly as it did before.
+        if offset < hi:
+            return None
+        index = previous.find(offset - delta)
+        if index >= 0 and previous.start(index) == offset - delta:
+            return index
+        return None
+    
+    nodes, starts, reuse = parse_statements(text, pos, resync, limits)
+    if reuse is None:
+        reuse = len(previous.nodes)
+    
+    # The statements from `reuse` on are kept from the end of the text,
+    # which they still are after the edit; the re-parsed ones replace the
+    # old ones in place.
+    previous.move_split(reuse)
+    table = previous.starts
+    table[first:reuse] = array('q', starts)
+    previous.bases[first:reuse] = table[first:first + len(starts)]
+    previous.nodes[first:reuse] = nodes
+    result = ParseResult(text, previous.nodes, table, first + len(starts), previous.bases)
+    
+    # The shifts still owed to the reused nodes are handed over
+    previous.pending = False
+    return result
+
+def shift_offsets(nodes: List[AST], delta: int):
+    """
+    Move nodes `delta` characters further into the text.
+    """
+    for node in walk(nodes):
+        # Shared leaves belong to every parse and must not move; other nodes
+        # without a position keep none
+        if not is_shared_leaf(node) and node.offset >= 0:
+            node.offset += delta
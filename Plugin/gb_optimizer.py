@@ -0,0 +1,282 @@
+"""
+Optional optimization pass over the GB AST.
+
+optimize() returns a new, smaller AST that behaves the same as the input:
+
+- arithmetic, comparisons and `and`/`or`/`not` over literals are folded,
+  and `def` constants are substituted into the statements that follow
+  them;
+- `if`/`elif` arms whose condition is a constant are pruned;
+- `loop times N` with a small constant N is unrolled, and loops that never
+  run are removed;
+- `def` constants that are no longer referenced are dropped.
+
+The input AST is left untouched, so cached ASTs can be optimized safely.
+"""
+import copy
+import operator
+from typing import Dict, List, Tuple
+
+from gb_parser import (
+    AST, BinaryOperation, Boolean, Button, Container, DefDeclaration, FunctionCall, FunctionDef,
+    Identifier, IfStatement, LoopStatement, Number, ReturnStatement, String, TSDLLCall,
+    UnaryOperation, VarDeclaration, Window, walk,
+)
+
+# Unroll `loop times N` only when N and the unrolled size stay this small
+UNROLL_MAX_TIMES = 4
+UNROLL_MAX_NODES = 64
+
+LITERALS = (Number, String, Boolean)
+
+# Comparison operators folded when both operands are literals of one kind
+COMPARISONS = {
+    'EQUAL_EQUAL': operator.eq,
+    'NOT_EQUAL': operator.ne,
+    'LESS': operator.lt,
+    'LESS_EQUAL': operator.le,
+    'GREATER': operator.gt,
+    'GREATER_EQUAL': operator.ge,
+}
+
+class OptimizeStats:
+    def __init__(self):
+        self.folded = 0
+        self.substituted = 0
+        self.pruned_branches = 0
+        self.unrolled_loops = 0
+        self.removed_loops = 0
+        self.dropped_defs = 0
+        self.nodes_before = 0
+        self.nodes_after = 0
+    
+    @property
+    def removed(self) -> int:
+        return self.nodes_before - self.nodes_after
+    
+    def as_dict(self) -> Dict[str, int]:
+        return dict(vars(self), removed=self.removed)
+    
+    def __str__(self):
+        return ', '.join(f'{name}={value}' for name, value in self.as_dict().items())
+
+def count_nodes(nodes: List[AST]) -> int:
+    return sum(1 for _ in walk(nodes))
+
+def declaration_counts(nodes: List[AST]) -> Dict[str, int]:
+    # How often each name is bound anywhere: var, def, function and parameter
+    counts = {}
+    for node in walk(nodes):
+        if isinstance(node, (VarDeclaration, DefDeclaration, FunctionDef)):
+            counts[node.name] = counts.get(node.name, 0) + 1
+        if isinstance(node, FunctionDef):
+            for param in node.params:
+                counts[param] = counts.get(param, 0) + 1
+    return counts
+
+def referenced_names(nodes: List[AST]) -> Dict[str, int]:
+    references = {}
+    for node in walk(nodes):
+        if isinstance(node, (Identifier, FunctionCall)):
+            references[node.name] = references.get(node.name, 0) + 1
+    return references
+
+def is_true(node: AST) -> bool:
+    # Truthiness of a literal, as the runtime sees it
+    return bool(node.value)
+
+class Optimizer:
+    def __init__(self, declarations: Dict[str, int], stats: OptimizeStats):
+        self.declarations = declarations
+        self.stats = stats
+        self.constants = {}
+    
+    # Expressions
+    
+    def expression(self, node: AST) -> AST:
+        if isinstance(node, Identifier):
+            if node.name in self.constants:
+                self.stats.substituted += 1
+                return self.constants[node.name]
+            return node
+        if isinstance(node, BinaryOperation):
+            return self.binary_operation(node)
+        if isinstance(node, UnaryOperation):
+            expr = self.expression(node.expr)
+            if node.op == 'NOT' and isinstance(expr, LITERALS):
+                self.stats.folded += 1
+                return Boolean(not is_true(expr), node.offset)
+            if node.op != 'NOT' and isinstance(expr, Number):
+                self.stats.folded += 1
+                return Number(-expr.value if node.op == 'MINUS' else +expr.value, node.offset)
+            return UnaryOperation(node.op, expr, node.offset)
+        if isinstance(node, FunctionCall):
+            args = [self.expression(arg) for arg in node.args]
+            return FunctionCall(node.name, args, node.offset)
+        if isinstance(node, TSDLLCall):
+            args = [self.expression(arg) for arg in node.args]
+            return TSDLLCall(node.dll_name, node.function_name, args, node.offset)
+        return node
+    
+    def binary_operation(self, node: BinaryOperation) -> AST:
+        left = self.expression(node.left)
+        right = self.expression(node.right)
+        op = node.op
+        
+        # `and` and `or` with a literal left operand reduce to one operand
+        if op == 'AND' and isinstance(left, LITERALS):
+            self.stats.folded += 1
+            return right if is_true(left) else left
+        if op == 'OR' and isinstance(left, LITERALS):
+            self.stats.folded += 1
+            return left if is_true(left) else right
+        
+        if op in COMPARISONS and isinstance(left, LITERALS) and type(left) is type(right):
+            if op in ('EQUAL_EQUAL', 'NOT_EQUAL') or not isinstance(left, Boolean):
+                self.stats.folded += 1
+                return Boolean(COMPARISONS[op](left.value, right.value), node.offset)
+        
+        if isinstance(left, Number) and isinstance(right, Number):
+            a, b = left.value, right.value
+            if op == 'PLUS':
+                value = a + b
+            elif op == 'MINUS':
+                value = a - b
+            elif op == 'MULTIPLY':
+                value = a * b
+            elif op == 'DIVIDE' and b != 0:
+                value = a / b
+            else:
+                # Division by zero stays a runtime error
+                return BinaryOperation(left, op, right, node.offset)
+            self.stats.folded += 1
+            return Number(value, node.offset)
+        
+        if op == 'PLUS' and isinstance(left, String) and isinstance(right, String):
+            self.stats.folded += 1
+            return String(left.value + right.value, node.offset)
+        
+        return BinaryOperation(left, op, right, node.offset)
+    
+    # Statements
+    
+    def block(self, body: List[AST], top_level: bool = False) -> List[AST]:
+        result = []
+        for node in body:
+            result.extend(self.statement(node, top_level))
+        return result
+    
+    def statement(self, node: AST, top_level: bool = False) -> List[AST]:
+        if isinstance(node, VarDeclaration):
+            return [VarDeclaration(node.name, self.expression(node.value), node.offset)]
+        if isinstance(node, DefDeclaration):
+            value = self.expression(node.value)
+            # A top-level constant bound exactly once has the same value in
+            # every statement after it
+            if top_level and isinstance(value, LITERALS) and self.declarations.get(node.name) == 1:
+                self.constants[node.name] = value
+            return [DefDeclaration(node.name, value, node.offset)]
+        if isinstance(node, FunctionDef):
+            return [FunctionDef(node.name, node.params, self.block(node.body), node.offset)]
+        if isinstance(node, ReturnStatement):
+            return [ReturnStatement(self.expression(node.value), node.offset)]
+        if isinstance(node, IfStatement):
+            return self.if_statement(node)
+        if isinstance(node, LoopStatement):
+            return self.loop_statement(node)
+        if isinstance(node, (Window, Button, Container)):
+            return [self.gui_element(node)]
+        return [self.expression(node)]
+    
+    def if_statement(self, node: IfStatement) -> List[AST]:
+        arms = []
+        else_body = node.else_body
+        for condition, body in [(node.condition, node.body)] + list(node.elif_clauses):
+            condition = self.expression(condition)
+            if isinstance(condition, LITERALS):
+                self.stats.pruned_branches += 1
+                if is_true(condition):
+                    # Always taken: it stands in for everything after it
+                    else_body = body
+                    break
+                continue
+            arms.append((condition, body))
+        
+        # With no arm left to test, the chosen body runs in place; if and
+        # loop bodies share the enclosing scope, so it can be inlined
+        if not arms:
+            return self.block(else_body)
+        
+        arms = [(condition, self.block(body)) for condition, body in arms]
+        (condition, body), elif_clauses = arms[0], arms[1:]
+        return [IfStatement(condition, body, elif_clauses, self.block(else_body), node.offset)]
+    
+    def loop_statement(self, node: LoopStatement) -> List[AST]:
+        if not node.is_times_loop:
+            condition = self.expression(node.condition)
+            if isinstance(condition, LITERALS) and not is_true(condition):
+                self.stats.removed_loops += 1
+                return []
+            return [LoopStatement(condition, self.block(node.body), offset=node.offset)]
+        
+        times = self.expression(node.times)
+        body = self.block(node.body)
+        if isinstance(times, Number):
+            count = int(times.value)
+            if count <= 0:
+                self.stats.removed_loops += 1
+                return []
+            if count <= UNROLL_MAX_TIMES and count * count_nodes(body) <= UNROLL_MAX_NODES:
+                self.stats.unrolled_loops += 1
+                return body + [node for _ in range(count - 1) for node in copy.deepcopy(body)]
+        return [LoopStatement(None, body, True, times, node.offset)]
+    
+    def gui_element(self, node: AST) -> AST:
+        if isinstance(node, Window):
+            children = [self.gui_element(child) for child in node.children]
+            width, height = self.expression(node.width), self.expression(node.height)
+            return Window(node.title, width, height, children, node.offset)
+        if isinstance(node, Button):
+            return Button(node.text, self.block(node.event_handler), node.offset)
+        if isinstance(node, Container):
+            children = [self.gui_element(child) for child in node.children]
+            return Container(children, node.offset)
+        return node
+
+def drop_unused_defs(nodes: List[AST], references: Dict[str, int], stats: OptimizeStats) -> List[AST]:
+    result = []
+    for node in nodes:
+        if isinstance(node, DefDeclaration) and isinstance(node.value, LITERALS) and node.name not in references:
+            stats.dropped_defs += 1
+            continue
+        if isinstance(node, FunctionDef):
+            body = drop_unused_defs(node.body, references, stats)
+            node = FunctionDef(node.name, node.params, body, node.offset)
+        elif isinstance(node, IfStatement):
+            node = IfStatement(
+                node.condition,
+                drop_unused_defs(node.body, references, stats),
+                [(condition, drop_unused_defs(body, references, stats)) for condition, body in node.elif_clauses],
+                drop_unused_defs(node.else_body, references, stats),
+                node.offset,
+            )
+        elif isinstance(node, LoopStatement):
+            body = drop_unused_defs(node.body, references, stats)
+            node = LoopStatement(node.condition, body, node.is_times_loop, node.times, node.offset)
+        result.append(node)
+    return result
+
+def optimize(ast: List[AST]) -> Tuple[List[AST], OptimizeStats]:
+    """
+    Optimize a parsed program. Returns the new AST and statistics,
+    including how many nodes were removed.
+    """
+    stats = OptimizeStats()
+    stats.nodes_before = count_nodes(ast)
+    
+    optimizer = Optimizer(declaration_counts(ast), stats)
+    result = optimizer.block(ast, top_level=True)
+    result = drop_unused_defs(result, referenced_names(result), stats)
+    
+    stats.nodes_after = count_nodes(result)
+    return result, stats
@@ -1,76 +1,372 @@
+import mmap
+import os
 import re
-from typing import List, Dict, Any, Optional, Tuple
-
-# Token types
-TOKEN_VAR = 'VAR'
-TOKEN_DEF = 'DEF'
-TOKEN_IF = 'IF'
-TOKEN_ELIF = 'ELIF'
-TOKEN_ELSE = 'ELSE'
-TOKEN_THEN = 'THEN'
-TOKEN_END = 'END'
-TOKEN_LOOP = 'LOOP'
-TOKEN_TIMES = 'TIMES'
-TOKEN_RETURN = 'RETURN'
-TOKEN_WINDOW = 'WINDOW'
-TOKEN_BUTTON = 'BUTTON'
-TOKEN_INPUT = 'INPUT'
-TOKEN_TEXT = 'TEXT'
-TOKEN_CONTAINER = 'CONTAINER'
-TOKEN_TS_WINDOWS = 'TS_WINDOWS'
-TOKEN_TSDLL = 'TSDLL'
-TOKEN_STRING = 'STRING'
-TOKEN_NUMBER = 'NUMBER'
-TOKEN_BOOLEAN = 'BOOLEAN'
-TOKEN_IDENTIFIER = 'IDENTIFIER'
-TOKEN_EQUALS = 'EQUALS'
-TOKEN_PLUS = 'PLUS'
-TOKEN_MINUS = 'MINUS'
-TOKEN_MULTIPLY = 'MULTIPLY'
-TOKEN_DIVIDE = 'DIVIDE'
-TOKEN_LPAREN = 'LPAREN'
-TOKEN_RPAREN = 'RPAREN'
-TOKEN_COMMA = 'COMMA'
-TOKEN_COLON = 'COLON'
-TOKEN_SEMICOLON = 'SEMICOLON'
-TOKEN_TITLE = 'TITLE'
-TOKEN_TEXT_ARG = 'TEXT_ARG'
-TOKEN_COMMENT = 'COMMENT'
-TOKEN_EOF = 'EOF'
+import sys
+from array import array
+from bisect import bisect_right
+from enum import IntEnum
+from itertools import chain, islice
+from operator import attrgetter
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple, Union, get_args, get_origin, get_type_hints
+
+class TokenKind(IntEnum):
+    """
+    Token kinds. They are small ints, so they can index dispatch tables and
+    be packed into arrays; str() and format() give the kind's name.
+    
+    Token types used to be these names as strings, so a kind also compares
+    equal to its name (TOKEN_VAR == 'VAR'). Hashing stays that of the int,
+    so a name does not find a kind in a dict or set. Such comparisons run
+    Python code; the parser compares kinds by identity instead.
+    """
+    VAR = 0
+    DEF = 1
+    IF = 2
+    ELIF = 3
+    ELSE = 4
+    THEN = 5
+    END = 6
+    LOOP = 7
+    TIMES = 8
+    RETURN = 9
+    WINDOW = 10
+    BUTTON = 11
+    INPUT = 12
+    TEXT = 13
+    CONTAINER = 14
+    TS_WINDOWS = 15
+    TSDLL = 16
+    STRING = 17
+    NUMBER = 18
+    BOOLEAN = 19
+    IDENTIFIER = 20
+    EQUALS = 21
+    PLUS = 22
+    MINUS = 23
+    MULTIPLY = 24
+    DIVIDE = 25
+    LPAREN = 26
+    RPAREN = 27
+    COMMA = 28
+    COLON = 29
+    SEMICOLON = 30
+    TITLE = 31
+    TEXT_ARG = 32
+    COMMENT = 33
+    EOF = 34
+    EQUAL_EQUAL = 35
+    NOT_EQUAL = 36
+    LESS = 37
+    LESS_EQUAL = 38
+    GREATER = 39
+    GREATER_EQUAL = 40
+    AND = 41
+    OR = 42
+    NOT = 43
+    
+    def __eq__(self, other):
+        if type(other) is str:
+            return self.name == other
+        return int.__eq__(self, other)
+    
+    def __ne__(self, other):
+        if type(other) is str:
+            return self.name != other
+        return int.__ne__(self, other)
+    
+    __hash__ = int.__hash__
+    
+    def __str__(self):
+        return self.name
+    
+    def __format__(self, format_spec: str):
+        return format(self.name, format_spec)
+
+# Token kinds under their original names
+TOKEN_VAR = TokenKind.VAR
+TOKEN_DEF = TokenKind.DEF
+TOKEN_IF = TokenKind.IF
+TOKEN_ELIF = TokenKind.ELIF
+TOKEN_ELSE = TokenKind.ELSE
+TOKEN_THEN = TokenKind.THEN
+TOKEN_END = TokenKind.END
+TOKEN_LOOP = TokenKind.LOOP
+TOKEN_TIMES = TokenKind.TIMES
+TOKEN_RETURN = TokenKind.RETURN
+TOKEN_WINDOW = TokenKind.WINDOW
+TOKEN_BUTTON = TokenKind.BUTTON
+TOKEN_INPUT = TokenKind.INPUT
+TOKEN_TEXT = TokenKind.TEXT
+TOKEN_CONTAINER = TokenKind.CONTAINER
+TOKEN_TS_WINDOWS = TokenKind.TS_WINDOWS
+TOKEN_TSDLL = TokenKind.TSDLL
+TOKEN_STRING = TokenKind.STRING
+TOKEN_NUMBER = TokenKind.NUMBER
+TOKEN_BOOLEAN = TokenKind.BOOLEAN
+TOKEN_IDENTIFIER = TokenKind.IDENTIFIER
+TOKEN_EQUALS = TokenKind.EQUALS
+TOKEN_PLUS = TokenKind.PLUS
+TOKEN_MINUS = TokenKind.MINUS
+TOKEN_MULTIPLY = TokenKind.MULTIPLY
+TOKEN_DIVIDE = TokenKind.DIVIDE
+TOKEN_LPAREN = TokenKind.LPAREN
+TOKEN_RPAREN = TokenKind.RPAREN
+TOKEN_COMMA = TokenKind.COMMA
+TOKEN_COLON = TokenKind.COLON
+TOKEN_SEMICOLON = TokenKind.SEMICOLON
+TOKEN_TITLE = TokenKind.TITLE
+TOKEN_TEXT_ARG = TokenKind.TEXT_ARG
+TOKEN_COMMENT = TokenKind.COMMENT
+TOKEN_EOF = TokenKind.EOF
+TOKEN_EQUAL_EQUAL = TokenKind.EQUAL_EQUAL
+TOKEN_NOT_EQUAL = TokenKind.NOT_EQUAL
+TOKEN_LESS = TokenKind.LESS
+TOKEN_LESS_EQUAL = TokenKind.LESS_EQUAL
+TOKEN_GREATER = TokenKind.GREATER
+TOKEN_GREATER_EQUAL = TokenKind.GREATER_EQUAL
+TOKEN_AND = TokenKind.AND
+TOKEN_OR = TokenKind.OR
+TOKEN_NOT = TokenKind.NOT
+
+# Token kinds indexed by value, and their names (the token types used to be
+# these strings)
+KINDS = tuple(TokenKind)
+TOKEN_TYPES = tuple(kind.name for kind in TokenKind)
+TOKEN_KINDS = {kind.name: kind for kind in TokenKind}
+
+# Keywords recognized by the lexers
+KEYWORDS = {
+    'var': TOKEN_VAR,
+    'def': TOKEN_DEF,
+    'if': TOKEN_IF,
+    'elif': TOKEN_ELIF,
+    'else': TOKEN_ELSE,
+    'then': TOKEN_THEN,
+    'end': TOKEN_END,
+    'loop': TOKEN_LOOP,
+    'times': TOKEN_TIMES,
+    'return': TOKEN_RETURN,
+    'window': TOKEN_WINDOW,
+    'button': TOKEN_BUTTON,
+    'input': TOKEN_INPUT,
+    'text': TOKEN_TEXT,
+    'container': TOKEN_CONTAINER,
+    'true': TOKEN_BOOLEAN,
+    'false': TOKEN_BOOLEAN,
+    'tsdll': TOKEN_TSDLL,
+    'and': TOKEN_AND,
+    'or': TOKEN_OR,
+    'not': TOKEN_NOT,
+}
+
+# Operators and punctuation
+OPERATORS = {
+    '=': TOKEN_EQUALS,
+    '==': TOKEN_EQUAL_EQUAL,
+    '!=': TOKEN_NOT_EQUAL,
+    '<': TOKEN_LESS,
+    '<=': TOKEN_LESS_EQUAL,
+    '>': TOKEN_GREATER,
+    '>=': TOKEN_GREATER_EQUAL,
+    '+': TOKEN_PLUS,
+    '-': TOKEN_MINUS,
+    '*': TOKEN_MULTIPLY,
+    '/': TOKEN_DIVIDE,
+    '(': TOKEN_LPAREN,
+    ')': TOKEN_RPAREN,
+    ',': TOKEN_COMMA,
+    ':': TOKEN_COLON,
+    ';': TOKEN_SEMICOLON,
+}
+
+class LineIndex:
+    """
+    Turns offsets in a source text into line and column numbers.
+    
+    The line starts are only collected, and then bisected, when a position
+    is first asked for, typically to report an error; lexing and parsing
+    themselves never track lines. The text may also be UTF-8 bytes, in
+    which case offsets are byte offsets but columns still count characters.
+    """
+    def __init__(self, text):
+        self.text = text
+        self.starts = None
+    
+    def line_starts(self) -> array:
+        if self.starts is None:
+            newline = '\n' if isinstance(self.text, str) else b'\n'
+            find = self.text.find
+            starts = array('I', [0])
+            pos = find(newline)
+            while pos >= 0:
+                starts.append(pos + 1)
+                pos = find(newline, pos + 1)
+            self.starts = starts
+        return self.starts
+    
+    def position(self, offset: int) -> Tuple[int, int]:
+        """
+        Line and column, both starting at 1, of `offset`.
+        """
+        starts = self.line_starts()
+        line = bisect_right(starts, offset)
+        start = starts[line - 1]
+        if isinstance(self.text, str):
+            return line, offset - start + 1
+        return line, len(self.text[start:offset].decode('utf-8', 'replace')) + 1
 
 class Token:
-    def __init__(self, type: str, value: str, line: int, column: int):
+    __slots__ = ('type', 'value', 'offset', 'lines')
+    
+    def __init__(self, type: TokenKind, value: str, offset: int, lines: LineIndex):
         self.type = type
         self.value = value
+        self.offset = offset  # Where the token starts in the source
+        self.lines = lines
+    
+    @property
+    def line(self) -> int:
+        return self.lines.position(self.offset)[0]
+    
+    @property
+    def column(self) -> int:
+        return self.lines.position(self.offset)[1]
+    
+    def __str__(self):
+        line, column = self.lines.position(self.offset)
+        return f'Token({self.type}, {repr(self.value)}, line={line}, col={column})'
+
+class Diagnostic:
+    def __init__(self, message: str, line: int, column: int):
+        self.message = message
         self.line = line
         self.column = column
     
     def __str__(self):
-        return f'Token({self.type}, {repr(self.value)}, line={self.line}, col={self.column})'
+        return f"Error at line {self.line}, column {self.column}: {self.message}"
+
+class GBSyntaxError(SyntaxError):
+    """
+    A syntax error in GB language code, with the same message, line and
+    column a Diagnostic for it would have. `lineno` and `offset` are set as
+    on Python's own SyntaxError.
+    """
+    def __init__(self, message: str, line: int, column: int):
+        super().__init__(f"Error at line {line}, column {column}: {message}")
+        self.message = message
+        self.line = self.lineno = line
+        self.column = self.offset = column
+    
+    def __str__(self):
+        # SyntaxError would add the line number again
+        return self.msg
+    
+    def __reduce__(self):
+        return (GBSyntaxError, (self.message, self.line, self.column))
+
+class ParseLimits:
+    """
+    Caps on what a single parse may use, for parsing untrusted code at a
+    predictable worst-case cost. None leaves a limit off.
+    
+    max_source_bytes: size of the source, UTF-8 encoded
+    max_tokens: tokens in the source, EOF not included
+    max_depth: nesting of blocks (if, loop, function, window, container,
+        button handler) and of function call arguments
+    max_string_length: characters in any one string, title or text literal
+    max_nodes: AST nodes built, failed statements included when recovering
+    """
+    def __init__(self, max_source_bytes: Optional[int] = None, max_tokens: Optional[int] = None,
+                 max_depth: Optional[int] = None, max_string_length: Optional[int] = None,
+                 max_nodes: Optional[int] = None):
+        self.max_source_bytes = max_source_bytes
+        self.max_tokens = max_tokens
+        self.max_depth = max_depth
+        self.max_string_length = max_string_length
+        self.max_nodes = max_nodes
+    
+    def as_dict(self) -> Dict:
+        return dict(vars(self))
+
+NO_LIMITS = ParseLimits()
+
+def limit_value(maximum: Optional[int]) -> int:
+    # A limit as a number to compare against, however large when it is off
+    return sys.maxsize if maximum is None else maximum
+
+# Message for each limit, by the name ParseLimitError.limit gives it
+LIMIT_MESSAGES = {
+    'source_bytes': "Source is larger than {} bytes",
+    'tokens': "More than {} tokens",
+    'depth': "Nesting deeper than {} levels",
+    'string_length': "String literal longer than {} characters",
+    'nodes': "More than {} AST nodes",
+}
+
+class ParseLimitError(Exception):
+    """
+    A parse stopped for going over one of its ParseLimits. Not a
+    SyntaxError: the code may be valid, and error recovery never resumes
+    past it.
+    
+    limit: the limit gone over, named as in LIMIT_MESSAGES
+    maximum: its value
+    offset, line, column: where parsing had got to, or None for the size
+        of the source as a whole
+    """
+    def __init__(self, limit: str, maximum: int, offset: Optional[int] = None,
+                 line: Optional[int] = None, column: Optional[int] = None):
+        self.limit = limit
+        self.maximum = maximum
+        self.offset = offset
+        self.line = line
+        self.column = column
+        self.message = LIMIT_MESSAGES[limit].format(maximum)
+        super().__init__(str(self))
+    
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in ('limit', 'maximum', 'offset', 'line', 'column', 'message')}
+    
+    def __str__(self):
+        if self.line is None:
+            return self.message
+        return f"Error at line {self.line}, column {self.column}: {self.message}"
+
+def limit_error(limit: str, maximum: int, offset: int, lines: 'LineIndex') -> ParseLimitError:
+    if lines.starts is not None:
+        return ParseLimitError(limit, maximum, offset, *lines.position(offset))
+    # The only position the parse will ask for, and often near the start of
+    # a large source: count the lines before it rather than index them all
+    text = lines.text
+    newline = '\n' if isinstance(text, str) else b'\n'
+    line = text.count(newline, 0, offset) + 1
+    start = text.rfind(newline, 0, offset) + 1
+    column = offset - start if isinstance(text, str) else len(text[start:offset].decode('utf-8', 'replace'))
+    return ParseLimitError(limit, maximum, offset, line, column + 1)
+
+def check_source_size(text, maximum: int):
+    # Text of more characters than the limit is over it without measuring;
+    # otherwise only non-ASCII text that might be over is encoded
+    size = len(text)
+    if size > maximum or (size * 4 > maximum and isinstance(text, str) and not text.isascii()
+                          and len(text.encode('utf-8', 'surrogatepass')) > maximum):
+        raise ParseLimitError('source_bytes', maximum)
 
 class Lexer:
     def __init__(self, text: str):
         self.text = text
         self.pos = 0
-        self.line = 1
-        self.column = 1
+        self.lines = LineIndex(text)
         self.current_char = self.text[self.pos] if self.pos < len(self.text) else None
     
     def error(self, message: str = None):
         if message is None:
             message = f"Invalid character: '{self.current_char}'"
-        raise SyntaxError(f"Error at line {self.line}, column {self.column}: {message}")
+        raise GBSyntaxError(message, *self.lines.position(self.pos))
     
     def advance(self):
         self.pos += 1
-        self.column += 1
-        if self.pos < len(self.text):
-            self.current_char = self.text[self.pos]
-            if self.current_char == '\n':
-                self.line += 1
-                self.column = 1
-        else:
-            self.current_char = None
+        self.current_char = self.text[self.pos] if self.pos < len(self.text) else None
     
     def skip_whitespace(self):
         while self.current_char is not None and self.current_char.isspace():
@@ -120,471 +416,1127 @@ class Lexer:
             else:
                 self.error("Unterminated string")
     
-    def title_text_format(self):
-        # Handle title'value' or text'value' format
-        prefix = ''
-        if self.current_char == 't':
-            self.advance()
-            if self.current_char == 'i':
-                self.advance()
-                if self.current_char == 't':
-                    self.advance()
-                    if self.current_char == 'l':
-                        self.advance()
-                        if self.current_char == 'e':
-                            self.advance()
-                            prefix = 'text'
-                elif self.current_char == 't':
-                    self.advance()
-                    if self.current_char == 'l':
-                        self.advance()
-                        prefix = 'title'
-        
-        if prefix and self.current_char == "'":
-            token_type = TOKEN_TITLE if prefix == 'title' else TOKEN_TEXT_ARG
-            self.advance()  # Skip the quote
-            value = ''
-            while self.current_char is not None and self.current_char != "'":
-                value += self.current_char
-                self.advance()
-            if self.current_char == "'":
-                self.advance()  # Skip the closing quote
-                return token_type, value
-            else:
-                self.error(f"Unterminated {prefix} string")
-        
-        # If we didn't match title'value' or text'value', put the characters back
-        self.pos -= len(prefix)
-        self.column -= len(prefix)
-        self.current_char = self.text[self.pos] if self.pos < len(self.text) else None
-        return None
+    def quoted(self, prefix: str) -> str:
+        # The value of title'value' or text'value', the prefix already read
+        self.advance()  # Skip the opening quote
+        start = self.pos
+        end = self.text.find("'", start)
+        if end < 0:
+            self.pos = len(self.text)
+            self.current_char = None
+            self.error(f"Unterminated {prefix} string")
+        self.pos = end
+        self.advance()  # Skip the closing quote
+        return self.text[start:end]
     
     def identifier(self):
-        result = ''
+        start = self.pos
         while self.current_char is not None and (self.current_char.isalnum() or self.current_char == '_'):
-            result += self.current_char
             self.advance()
+        result = self.text[start:self.pos]
         
-        # Check for keywords
-        keywords = {
-            'var': TOKEN_VAR,
-            'def': TOKEN_DEF,
-            'if': TOKEN_IF,
-            'elif': TOKEN_ELIF,
-            'else': TOKEN_ELSE,
-            'then': TOKEN_THEN,
-            'end': TOKEN_END,
-            'loop': TOKEN_LOOP,
-            'times': TOKEN_TIMES,
-            'return': TOKEN_RETURN,
-            'window': TOKEN_WINDOW,
-            'button': TOKEN_BUTTON,
-            'input': TOKEN_INPUT,
-            'text': TOKEN_TEXT,
-            'container': TOKEN_CONTAINER,
-            'true': TOKEN_BOOLEAN,
-            'false': TOKEN_BOOLEAN,
-        }
-        
-        # Check for special functions
-        if result == 'ts' and self.current_char == '.':
-            self.advance()  # Skip the dot
-            func_name = ''
-            while self.current_char is not None and (self.current_char.isalnum() or self.current_char == '_'):
-                func_name += self.current_char
-                self.advance()
-            if func_name == 'windows':
-                return TOKEN_TS_WINDOWS
-            # If not a recognized function, put the characters back
-            self.pos -= len(func_name) + 1  # +1 for the dot
-            self.column -= len(func_name) + 1
-            self.current_char = self.text[self.pos] if self.pos < len(self.text) else None
-        
-        if result == 'tsdll':
-            return TOKEN_TSDLL
+        # title'value' and text'value' are only told apart from identifiers
+        # by the quote that follows, and ts.windows by looking past the dot
+        # without consuming it, so nothing read is ever put back
+        if self.current_char == "'" and (result == 'title' or result == 'text'):
+            token_type = TOKEN_TITLE if result == 'title' else TOKEN_TEXT_ARG
+            return token_type, sys.intern(self.quoted(result))
+        if result == 'ts' and self.current_char == '.' and self.text.startswith('windows', self.pos + 1):
+            end = self.pos + len('.windows')
+            if end == len(self.text) or not (self.text[end].isalnum() or self.text[end] == '_'):
+                self.pos = end
+                self.current_char = self.text[end] if end < len(self.text) else None
+                return TOKEN_TS_WINDOWS, 'ts.windows'
         
-        return keywords.get(result, TOKEN_IDENTIFIER), result
+        return KEYWORDS.get(result, TOKEN_IDENTIFIER), sys.intern(result)
     
     def get_next_token(self):
         while self.current_char is not None:
             if self.skip_comment():
                 self.skip_whitespace()
                 continue
-                
+            
             if self.current_char.isspace():
                 self.skip_whitespace()
                 continue
             
-            # Check for title'value' or text'value' format
-            title_text_result = self.title_text_format()
-            if title_text_result:
-                token_type, value = title_text_result
-                return Token(token_type, value, self.line, self.column - len(value) - 2)  # -2 for quotes
+            start = self.pos
             
             if self.current_char.isalpha() or self.current_char == '_':
                 token_type, value = self.identifier()
-                return Token(token_type, value, self.line, self.column - len(value))
+                return Token(token_type, value, start, self.lines)
             
             if self.current_char.isdigit() or self.current_char == '.':
                 value = self.number()
-                return Token(TOKEN_NUMBER, value, self.line, self.column - len(str(value)))
+                return Token(TOKEN_NUMBER, value, start, self.lines)
             
             if self.current_char == '"':
                 value = self.string()
-                return Token(TOKEN_STRING, value, self.line, self.column - len(value) - 2)  # -2 for quotes
-            
-            if self.current_char == '=':
-                self.advance()
-                return Token(TOKEN_EQUALS, '=', self.line, self.column - 1)
+                return Token(TOKEN_STRING, value, start, self.lines)
             
-            if self.current_char == '+':
+            # Operators and punctuation, looked up in OPERATORS, the
+            # two-character ones first
+            operator = self.text[self.pos:self.pos + 2]
+            token_type = OPERATORS.get(operator)
+            if token_type is None:
+                operator = self.current_char
+                token_type = OPERATORS.get(operator)
+                if token_type is None:
+                    self.error()
+            for _ in operator:
                 self.advance()
-                return Token(TOKEN_PLUS, '+', self.line, self.column - 1)
-            
-            if self.current_char == '-':
-                self.advance()
-                return Token(TOKEN_MINUS, '-', self.line, self.column - 1)
-            
-            if self.current_char == '*':
-                self.advance()
-                return Token(TOKEN_MULTIPLY, '*', self.line, self.column - 1)
-            
-            if self.current_char == '/':
-                self.advance()
-                return Token(TOKEN_DIVIDE, '/', self.line, self.column - 1)
+            return Token(token_type, operator, start, self.lines)
+        
+        return Token(TOKEN_EOF, None, self.pos, self.lines)
+
+KEYWORDS_BYTES = {keyword.encode('ascii'): token_type for keyword, token_type in KEYWORDS.items()}
+OPERATORS_BYTES = {operator.encode('ascii'): token_type for operator, token_type in OPERATORS.items()}
+
+# Master pattern for RegexLexer. Group 1 swallows the whitespace and
+# comments in front of the token. The named alternatives are tried in order,
+# so the title'..'/text'..' and ts.windows forms come before identifiers.
+# Every position matches (possibly with no token), which keeps finditer()
+# contiguous; a match without a token marks EOF or an invalid character.
+MASTER_PATTERN_SOURCE = r"""
+    ((?:\s+|//[^\n]*)*)
+    (?:
+        title'(?P<TITLE>[^']*)'
+      | text'(?P<TEXT_ARG>[^']*)'
+      | (?P<BAD_TITLE>title'|text')
+      | (?P<TS_WINDOWS>ts\.windows)(?!%(word)s)
+      | (?P<IDENTIFIER>%(word_start)s%(word)s*)
+      | (?P<OPERATOR>[=<>!]=|[=<>+\-*/(),:;])
+      | (?P<NUMBER>[\d.]+)
+      | "(?P<STRING>[^"\\]*(?:\\.[^"\\]*)*)"
+      | (?P<BAD_STRING>")
+    )?
+"""
+
+MASTER_PATTERN = re.compile(
+    MASTER_PATTERN_SOURCE % {'word_start': r'[^\W\d]', 'word': r'\w'},
+    re.VERBOSE | re.DOTALL)
+
+# The same pattern over UTF-8 encoded bytes, where any non-ASCII byte is
+# taken to be part of an identifier
+MASTER_PATTERN_BYTES = re.compile(
+    (MASTER_PATTERN_SOURCE % {'word_start': r'[A-Za-z_\x80-\xff]', 'word': r'[\w\x80-\xff]'}).encode('ascii'),
+    re.VERBOSE | re.DOTALL)
+
+STRING_ESCAPE = re.compile(r'\\(["\\])')
+
+class RegexLexer:
+    """
+    Lexer driven by a single compiled master pattern.
+    
+    Produces the same tokens as Lexer, but slices values straight out of
+    the source instead of building them one character at a time. Lexing may
+    start part-way into the text at a token boundary.
+    
+    With `limits`, the source size, token count and string literal length
+    are checked against them, raising ParseLimitError.
+    """
+    def __init__(self, text: str, pos: int = 0, limits: Optional[ParseLimits] = None):
+        self.text = text
+        self.pos = pos
+        self.lines = LineIndex(text)
+        self.diagnostics = None  # When set, errors are collected here instead of raised
+        self.limits = limits = limits or NO_LIMITS
+        if limits.max_source_bytes is not None:
+            check_source_size(text, limits.max_source_bytes)
+        self.tokens = self.tokenize()
+        if limits.max_tokens is not None:
+            # Tokens up to the limit are handed straight through
+            tokens = self.tokens
+            self.tokens = chain(islice(tokens, limits.max_tokens), self.past_token_limit(tokens))
+    
+    def error(self, message: str = None):
+        if message is None:
+            message = f"Invalid character: '{self.text[self.pos]}'"
+        line, column = self.lines.position(self.pos)
+        if self.diagnostics is None:
+            raise GBSyntaxError(message, line, column)
+        self.diagnostics.append(Diagnostic(message, line, column))
+    
+    def get_next_token(self):
+        return next(self.tokens)
+    
+    def past_token_limit(self, tokens):
+        # Once max_tokens have been handed out, only EOF may follow
+        token = next(tokens)
+        if token.type is not TOKEN_EOF:
+            raise limit_error('tokens', self.limits.max_tokens, token.offset, self.lines)
+        yield token
+        yield from tokens
+    
+    def tokenize(self):
+        text = self.text
+        lines = self.lines
+        max_string_length = limit_value(self.limits.max_string_length)
+        invalid = None  # Position of the last invalid character reported
+        
+        for m in MASTER_PATTERN.finditer(text, self.pos):
+            # Group 1 is the whitespace and comments skipped over
+            start = m.end(1)
+            end = self.pos = m.end()
+            kind = m.lastgroup
             
-            if self.current_char == '(':
-                self.advance()
-                return Token(TOKEN_LPAREN, '(', self.line, self.column - 1)
+            if kind == 'IDENTIFIER':
+                value = sys.intern(m.group(kind))
+                yield Token(KEYWORDS.get(value, TOKEN_IDENTIFIER), value, start, lines)
             
-            if self.current_char == ')':
-                self.advance()
-                return Token(TOKEN_RPAREN, ')', self.line, self.column - 1)
+            elif kind == 'OPERATOR':
+                value = text[start:end]
+                yield Token(OPERATORS[value], value, start, lines)
             
-            if self.current_char == ',':
-                self.advance()
-                return Token(TOKEN_COMMA, ',', self.line, self.column - 1)
+            elif kind == 'NUMBER':
+                value = m.group(kind)
+                try:
+                    number = float(value) if '.' in value else int(value)
+                except ValueError:
+                    self.pos = start
+                    self.error(f"Invalid number format: {value}")
+                    # When recovering, carry on as if the number were 0
+                    self.pos = end
+                    number = 0
+                yield Token(TOKEN_NUMBER, number, start, lines)
             
-            if self.current_char == ':':
-                self.advance()
-                return Token(TOKEN_COLON, ':', self.line, self.column - 1)
+            elif kind == 'STRING' or kind == 'TITLE' or kind == 'TEXT_ARG':
+                value = m.group(kind)
+                if len(value) > max_string_length:
+                    raise limit_error('string_length', max_string_length, start, lines)
+                if kind == 'STRING':
+                    token_type = TOKEN_STRING
+                    if '\\' in value:
+                        value = STRING_ESCAPE.sub(r'\1', value)
+                else:
+                    token_type = TOKEN_TITLE if kind == 'TITLE' else TOKEN_TEXT_ARG
+                yield Token(token_type, sys.intern(value), start, lines)
             
-            if self.current_char == ';':
-                self.advance()
-                return Token(TOKEN_SEMICOLON, ';', self.line, self.column - 1)
+            elif kind == 'TS_WINDOWS':
+                yield Token(TOKEN_TS_WINDOWS, 'ts.windows', start, lines)
             
-            self.error()
+            else:
+                self.pos = start
+                if start >= len(text):
+                    break
+                if kind == 'BAD_TITLE':
+                    self.error(f"Unterminated {m.group(kind)[:-1]} string")
+                elif kind == 'BAD_STRING':
+                    self.error("Unterminated string")
+                else:
+                    # An invalid character is skipped when recovering. The
+                    # match that follows starts at it, so report it once.
+                    if start != invalid:
+                        invalid = start
+                        self.error()
+                    continue
+                # An unterminated literal runs to the end of the text
+                break
+        
+        while True:
+            yield Token(TOKEN_EOF, None, self.pos, lines)
+
+# Spelling of the token kinds whose value never varies, indexed by kind
+FIXED_VALUES = [None] * len(TOKEN_TYPES)
+for spelling, token_type in list(KEYWORDS.items()) + list(OPERATORS.items()):
+    if token_type is not TOKEN_BOOLEAN:
+        FIXED_VALUES[token_type] = spelling
+FIXED_VALUES[TOKEN_TS_WINDOWS] = 'ts.windows'
+
+class TokenBuffer:
+    """
+    Compact token stream: parallel arrays of token kind, start offset and
+    end offset. Token values are sliced out of the source only when they
+    are asked for.
+    
+    The source may be a str or a bytes-like object holding UTF-8 (bytes,
+    mmap); in the latter case offsets are byte offsets and only the
+    payloads that are asked for get decoded.
+    """
+    def __init__(self, text):
+        self.text = text
+        self.binary = not isinstance(text, str)
+        self.kinds = array('B')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.lines = LineIndex(text)
+    
+    def __len__(self):
+        return len(self.kinds)
+    
+    def append(self, kind: int, start: int, end: int):
+        self.kinds.append(kind)
+        self.starts.append(start)
+        self.ends.append(end)
+    
+    def slice(self, start: int, end: int) -> str:
+        value = self.text[start:end]
+        return value.decode('utf-8') if self.binary else value
+    
+    def type(self, index: int) -> TokenKind:
+        return KINDS[self.kinds[index]]
+    
+    def value(self, index: int):
+        kind = KINDS[self.kinds[index]]
+        value = FIXED_VALUES[kind]
+        if value is not None:
+            return value
+        
+        start = self.starts[index]
+        end = self.ends[index]
+        
+        if kind is TOKEN_NUMBER:
+            value = self.slice(start, end)
+            return float(value) if '.' in value else int(value)
+        if kind is TOKEN_STRING:
+            value = self.slice(start + 1, end - 1)
+            if '\\' in value:
+                value = STRING_ESCAPE.sub(r'\1', value)
+            return sys.intern(value)
+        if kind is TOKEN_TITLE:
+            return sys.intern(self.slice(start + len("title'"), end - 1))
+        if kind is TOKEN_TEXT_ARG:
+            return sys.intern(self.slice(start + len("text'"), end - 1))
+        if kind is TOKEN_EOF:
+            return None
+        return sys.intern(self.slice(start, end))
+    
+    def token(self, index: int) -> Token:
+        return Token(self.type(index), self.value(index), self.starts[index], self.lines)
+
+def tokenize(text) -> TokenBuffer:
+    """
+    Lex GB language code into a compact TokenBuffer. The source may be a
+    str or UTF-8 encoded bytes-like object such as an mmap.
+    """
+    buffer = TokenBuffer(text)
+    append = buffer.append
+    
+    if buffer.binary:
+        pattern, keywords, operators, dot = MASTER_PATTERN_BYTES, KEYWORDS_BYTES, OPERATORS_BYTES, b'.'
+    else:
+        pattern, keywords, operators, dot = MASTER_PATTERN, KEYWORDS, OPERATORS, '.'
+    
+    def error(message: str, pos: int):
+        raise GBSyntaxError(message, *buffer.lines.position(pos))
+    
+    for m in pattern.finditer(text):
+        # Group 1 is the whitespace and comments skipped over
+        start = m.end(1)
+        end = m.end()
+        kind = m.lastgroup
         
-        return Token(TOKEN_EOF, None, self.line, self.column)
+        if kind == 'IDENTIFIER':
+            append(keywords.get(m.group(kind), TOKEN_IDENTIFIER), start, end)
+        
+        elif kind == 'OPERATOR':
+            append(operators[m.group(kind)], start, end)
+        
+        elif kind == 'NUMBER':
+            value = m.group(kind)
+            if value == dot or value.count(dot) > 1:
+                error(f"Invalid number format: {buffer.slice(start, end)}", start)
+            append(TOKEN_NUMBER, start, end)
+        
+        elif kind == 'STRING' or kind == 'TITLE' or kind == 'TEXT_ARG':
+            append(TOKEN_KINDS[kind], start, end)
+        
+        elif kind == 'TS_WINDOWS':
+            append(TOKEN_TS_WINDOWS, start, end)
+        
+        else:
+            if start >= len(text):
+                break
+            if kind == 'BAD_TITLE':
+                message = f"Unterminated {buffer.slice(start, end - 1)} string"
+            elif kind == 'BAD_STRING':
+                message = "Unterminated string"
+            else:
+                message = f"Invalid character: '{buffer.slice(start, start + 1)}'"
+            error(message, start)
+    
+    append(TOKEN_EOF, len(text), len(text))
+    return buffer
 
-# AST node classes
+class TokenCursor:
+    """
+    Thin lexer-compatible view over a TokenBuffer, so that Parser can run on
+    it unchanged. Only the token being handed out is materialized.
+    """
+    def __init__(self, buffer: TokenBuffer):
+        self.buffer = buffer
+        self.index = 0
+    
+    def get_next_token(self):
+        index = self.index
+        # EOF is handed out repeatedly once reached
+        if index < len(self.buffer) - 1:
+            self.index = index + 1
+        return self.buffer.token(index)
+
+# AST node classes. Nodes use __slots__ to stay small; `offset` is where
+# the token a node was parsed from starts in the source, or -1 for nodes
+# built by hand and for shared leaf nodes. LineIndex turns it into a line
+# and column.
 class AST:
-    pass
+    __slots__ = ('offset',)
 
 class VarDeclaration(AST):
-    def __init__(self, name: str, value: AST):
+    __slots__ = ('name', 'value')
+    
+    def __init__(self, name: str, value: AST, offset: int = -1):
         self.name = name
         self.value = value
+        self.offset = offset
 
 class DefDeclaration(AST):
-    def __init__(self, name: str, value: AST):
+    __slots__ = ('name', 'value')
+    
+    def __init__(self, name: str, value: AST, offset: int = -1):
         self.name = name
         self.value = value
+        self.offset = offset
 
 class FunctionDef(AST):
-    def __init__(self, name: str, params: List[str], body: List[AST]):
+    __slots__ = ('name', 'params', 'body')
+    
+    def __init__(self, name: str, params: List[str], body: List[AST], offset: int = -1):
         self.name = name
         self.params = params
         self.body = body
+        self.offset = offset
 
 class ReturnStatement(AST):
-    def __init__(self, value: AST):
+    __slots__ = ('value',)
+    
+    def __init__(self, value: AST, offset: int = -1):
         self.value = value
+        self.offset = offset
 
 class IfStatement(AST):
-    def __init__(self, condition: AST, body: List[AST], elif_clauses: List[Tuple[AST, List[AST]]], else_body: List[AST]):
+    __slots__ = ('condition', 'body', 'elif_clauses', 'else_body')
+    
+    def __init__(self, condition: AST, body: List[AST], elif_clauses: List[Tuple[AST, List[AST]]], else_body: List[AST], offset: int = -1):
         self.condition = condition
         self.body = body
         self.elif_clauses = elif_clauses
         self.else_body = else_body
+        self.offset = offset
 
 class LoopStatement(AST):
-    def __init__(self, condition: AST, body: List[AST], is_times_loop: bool = False, times: Optional[AST] = None):
+    __slots__ = ('condition', 'body', 'is_times_loop', 'times')
+    
+    def __init__(self, condition: AST, body: List[AST], is_times_loop: bool = False, times: Optional[AST] = None, offset: int = -1):
         self.condition = condition
         self.body = body
         self.is_times_loop = is_times_loop
         self.times = times
+        self.offset = offset
 
 class BinaryOperation(AST):
-    def __init__(self, left: AST, op: str, right: AST):
+    __slots__ = ('left', 'op', 'right')
+    
+    def __init__(self, left: AST, op: str, right: AST, offset: int = -1):
         self.left = left
         self.op = op
         self.right = right
+        self.offset = offset
 
 class UnaryOperation(AST):
-    def __init__(self, op: str, expr: AST):
+    __slots__ = ('op', 'expr')
+    
+    def __init__(self, op: str, expr: AST, offset: int = -1):
         self.op = op
         self.expr = expr
+        self.offset = offset
 
 class Number(AST):
-    def __init__(self, value: float):
+    __slots__ = ('value',)
+    
+    def __init__(self, value: float, offset: int = -1):
         self.value = value
+        self.offset = offset
 
 class String(AST):
-    def __init__(self, value: str):
+    __slots__ = ('value',)
+    
+    def __init__(self, value: str, offset: int = -1):
         self.value = value
+        self.offset = offset
 
 class Boolean(AST):
-    def __init__(self, value: bool):
+    __slots__ = ('value',)
+    
+    def __init__(self, value: bool, offset: int = -1):
         self.value = value
+        self.offset = offset
 
 class Identifier(AST):
-    def __init__(self, name: str):
+    __slots__ = ('name',)
+    
+    def __init__(self, name: str, offset: int = -1):
         self.name = name
+        self.offset = offset
 
 class FunctionCall(AST):
-    def __init__(self, name: str, args: List[AST]):
+    __slots__ = ('name', 'args')
+    
+    def __init__(self, name: str, args: List[AST], offset: int = -1):
         self.name = name
         self.args = args
+        self.offset = offset
 
 class TSWindowsCall(AST):
-    def __init__(self, title: str, text: str):
+    __slots__ = ('title', 'text')
+    
+    def __init__(self, title: str, text: str, offset: int = -1):
         self.title = title
         self.text = text
+        self.offset = offset
 
 class TSDLLCall(AST):
-    def __init__(self, dll_name: str, function_name: str, args: List[AST]):
+    __slots__ = ('dll_name', 'function_name', 'args')
+    
+    def __init__(self, dll_name: str, function_name: str, args: List[AST], offset: int = -1):
         self.dll_name = dll_name
         self.function_name = function_name
         self.args = args
+        self.offset = offset
 
 class Window(AST):
-    def __init__(self, title: str, width: AST, height: AST, children: List[AST]):
+    __slots__ = ('title', 'width', 'height', 'children')
+    
+    def __init__(self, title: str, width: AST, height: AST, children: List[AST], offset: int = -1):
         self.title = title
         self.width = width
         self.height = height
         self.children = children
+        self.offset = offset
 
 class Button(AST):
-    def __init__(self, text: str, event_handler: List[AST]):
+    __slots__ = ('text', 'event_handler')
+    
+    def __init__(self, text: str, event_handler: List[AST], offset: int = -1):
         self.text = text
         self.event_handler = event_handler
+        self.offset = offset
 
 class Input(AST):
-    def __init__(self, name: str, default_value: str):
+    __slots__ = ('name', 'default_value')
+    
+    def __init__(self, name: str, default_value: str, offset: int = -1):
         self.name = name
         self.default_value = default_value
+        self.offset = offset
 
 class TextElement(AST):
-    def __init__(self, text: str):
+    __slots__ = ('text',)
+    
+    def __init__(self, text: str, offset: int = -1):
         self.text = text
+        self.offset = offset
 
 class Container(AST):
-    def __init__(self, children: List[AST]):
+    __slots__ = ('children',)
+    
+    def __init__(self, children: List[AST], offset: int = -1):
         self.children = children
+        self.offset = offset
+
+# Leaf nodes shared by every parse instead of being built per occurrence.
+# They carry no position (offset -1) and are never to be changed in place:
+# anything that edits nodes, such as shifting offsets, skips them (see
+# is_shared_leaf).
+TRUE = Boolean(True)
+FALSE = Boolean(False)
+SMALL_NUMBERS = tuple(Number(value) for value in range(256))
+SHARED_LEAVES = frozenset(map(id, (TRUE, FALSE) + SMALL_NUMBERS))
+
+def is_shared_leaf(node: AST) -> bool:
+    return id(node) in SHARED_LEAVES
+
+# How a node field holds children: a single node (or None), a list of
+# nodes, or a list of (condition, body) clauses
+FIELD_NODE, FIELD_NODES, FIELD_CLAUSES = range(3)
+
+def field_shape(annotation) -> Optional[int]:
+    if annotation is AST:
+        return FIELD_NODE
+    args = get_args(annotation)
+    if get_origin(annotation) is Union and AST in args:
+        return FIELD_NODE
+    if get_origin(annotation) is list and args:
+        if args[0] is AST:
+            return FIELD_NODES
+        if get_origin(args[0]) is tuple:
+            return FIELD_CLAUSES
+    return None
+
+def child_fields(cls: type) -> Tuple[Tuple[str, int], ...]:
+    """
+    The fields of a node class that hold children, with their shapes, in
+    the order they are declared. Read from the constructor's annotations
+    once per class.
+    """
+    fields = CHILD_FIELDS.get(cls)
+    if fields is None:
+        hints = get_type_hints(cls.__init__) if cls.__init__ is not object.__init__ else {}
+        names = [name for base in reversed(cls.__mro__) for name in vars(base).get('__slots__', ())]
+        fields = tuple((name, shape) for name, shape in ((name, field_shape(hints.get(name))) for name in names)
+                       if shape is not None)
+        CHILD_FIELDS[cls] = fields
+    return fields
+
+def child_getter(cls: type) -> Optional[Callable[[AST], List[AST]]]:
+    """
+    A function returning the children of a node of class `cls` as a new
+    list, specialised for its fields; None for leaf classes.
+    """
+    if cls in CHILD_GETTERS:
+        return CHILD_GETTERS[cls]
+    fields = child_fields(cls)
+    names = [name for name, _ in fields]
+    shapes = [shape for _, shape in fields]
+    if not fields:
+        getter = None
+    elif shapes == [FIELD_NODES]:
+        get_list = attrgetter(names[0])
+        getter = lambda node: list(get_list(node))
+    elif shapes == [FIELD_NODE]:
+        get_node = attrgetter(names[0])
+        getter = lambda node: [] if get_node(node) is None else [get_node(node)]
+    elif all(shape == FIELD_NODE for shape in shapes):
+        get_nodes = attrgetter(*names)
+        getter = lambda node: [value for value in get_nodes(node) if value is not None]
+    else:
+        getter = lambda node: fields_children(node, fields)
+    CHILD_GETTERS[cls] = getter
+    return getter
+
+def fields_children(node: AST, fields: Tuple[Tuple[str, int], ...]) -> List[AST]:
+    children = []
+    for name, shape in fields:
+        value = getattr(node, name)
+        if shape == FIELD_NODES:
+            children.extend(value)
+        elif shape == FIELD_NODE:
+            if value is not None:
+                children.append(value)
+        else:
+            for condition, body in value:
+                children.append(condition)
+                children.extend(body)
+    return children
+
+# Node class -> child fields, and -> child getter, filled in for every node
+# class here and for other AST subclasses when first met
+CHILD_FIELDS = {}
+CHILD_GETTERS = {}
+for node_class in AST.__subclasses__():
+    child_getter(node_class)
+
+def child_nodes(node: AST) -> List[AST]:
+    """
+    The nodes directly under `node`, field by field.
+    """
+    cls = type(node)
+    getter = CHILD_GETTERS[cls] if cls in CHILD_GETTERS else child_getter(cls)
+    return [] if getter is None else getter(node)
+
+def walk(nodes: List[AST]) -> Iterator[AST]:
+    """
+    Every node in the given trees, without recursion and in no particular
+    order.
+    """
+    getters = CHILD_GETTERS
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        yield node
+        cls = type(node)
+        getter = getters[cls] if cls in getters else child_getter(cls)
+        if getter is not None:
+            stack.extend(getter(node))
+
+def declared_names(body: List[AST]) -> List[str]:
+    # Names a statement list declares, including inside nested if/loop
+    # bodies (which share the enclosing frame) but not inside functions
+    names = []
+    stack = list(reversed(body))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (VarDeclaration, DefDeclaration, FunctionDef)):
+            names.append(node.name)
+        elif isinstance(node, IfStatement):
+            stack.extend(reversed(node.else_body))
+            for _, elif_body in reversed(node.elif_clauses):
+                stack.extend(reversed(elif_body))
+            stack.extend(reversed(node.body))
+        elif isinstance(node, LoopStatement):
+            stack.extend(reversed(node.body))
+    return names
+
+# Tokens a statement or GUI element can start with, and the tokens closing
+# a block; error recovery resumes parsing at one of these
+SYNC_TOKENS = frozenset((
+    TOKEN_VAR, TOKEN_DEF, TOKEN_IF, TOKEN_LOOP, TOKEN_RETURN, TOKEN_TS_WINDOWS, TOKEN_TSDLL,
+    TOKEN_WINDOW, TOKEN_BUTTON, TOKEN_INPUT, TOKEN_TEXT, TOKEN_CONTAINER,
+    TOKEN_END, TOKEN_ELIF, TOKEN_ELSE,
+))
+
+# Binding power of each infix operator; higher binds tighter, and operators
+# of equal power associate to the left
+INFIX_POWER = {
+    TOKEN_OR: 10,
+    TOKEN_AND: 20,
+    TOKEN_EQUAL_EQUAL: 40,
+    TOKEN_NOT_EQUAL: 40,
+    TOKEN_LESS: 40,
+    TOKEN_LESS_EQUAL: 40,
+    TOKEN_GREATER: 40,
+    TOKEN_GREATER_EQUAL: 40,
+    TOKEN_PLUS: 50,
+    TOKEN_MINUS: 50,
+    TOKEN_MULTIPLY: 60,
+    TOKEN_DIVIDE: 60,
+}
+
+# Binding power of prefix operators: `not` applies to a whole comparison,
+# `-` and `+` to a single operand
+PREFIX_POWER = {
+    TOKEN_NOT: 30,
+    TOKEN_PLUS: 70,
+    TOKEN_MINUS: 70,
+}
+
+# The binding powers above as tables indexed by token kind, for Parser.expr.
+# Before an operand: each prefix operator's power, 0 for an open parenthesis,
+# None for any other token. After an operand: each infix operator's power,
+# 1 for any other token, which ends the operator chain.
+OPENING_POWER = [None] * len(TokenKind)
+OPENING_POWER[TOKEN_LPAREN] = 0
+for token_type, power in PREFIX_POWER.items():
+    OPENING_POWER[token_type] = power
+CLOSING_POWER = [1] * len(TokenKind)
+for token_type, power in INFIX_POWER.items():
+    CLOSING_POWER[token_type] = power
+
+# Parser rule for each token kind a GUI element can start with. Rules are
+# looked up by name, so subclasses and instrumented parsers are honoured.
+GUI_RULES = [None] * len(TokenKind)
+GUI_RULES[TOKEN_WINDOW] = 'window_element'
+GUI_RULES[TOKEN_BUTTON] = 'button_element'
+GUI_RULES[TOKEN_INPUT] = 'input_element'
+GUI_RULES[TOKEN_TEXT] = 'text_element'
+GUI_RULES[TOKEN_CONTAINER] = 'container_element'
+
+# Parser rule for each token kind a statement can start with; any other
+# token starts an expression
+STATEMENT_RULES = list(GUI_RULES)
+STATEMENT_RULES[TOKEN_VAR] = 'var_declaration'
+STATEMENT_RULES[TOKEN_DEF] = 'def_declaration'
+STATEMENT_RULES[TOKEN_IF] = 'if_statement'
+STATEMENT_RULES[TOKEN_LOOP] = 'loop_statement'
+STATEMENT_RULES[TOKEN_RETURN] = 'return_statement'
+STATEMENT_RULES[TOKEN_TS_WINDOWS] = 'ts_windows_call'
+STATEMENT_RULES[TOKEN_TSDLL] = 'tsdll_call'
+
+# Stands in for the missing left operand of a prefix operator in Parser.expr
+PREFIX = object()
+
+# Keywords that always open a block closed by `end`
+BLOCK_KEYWORDS = frozenset((TOKEN_IF, TOKEN_LOOP, TOKEN_WINDOW, TOKEN_CONTAINER))
+
+# Tokens that close a block, for Parser.block
+BLOCK_END = frozenset((TOKEN_END,))
+IF_BLOCK_END = frozenset((TOKEN_ELIF, TOKEN_ELSE, TOKEN_END))
+PROGRAM_END = frozenset((TOKEN_EOF,))
+
+# Tokens Parser.peek() can see past the current one
+LOOKAHEAD = 4
 
 class Parser:
-    def __init__(self, lexer: Lexer):
+    def __init__(self, lexer: Lexer, recover: bool = False, limits: Optional[ParseLimits] = None):
         self.lexer = lexer
-        self.current_token = self.lexer.get_next_token()
+        self.recover = recover
+        self.diagnostics = []
+        self.depth = 0  # Blocks opened and not yet closed by `end`
+        self.consumed = 0  # Tokens eaten so far
+        self.calls = 0  # Function calls whose arguments are being parsed
+        self.nodes = 0  # AST nodes built so far
+        limits = limits or NO_LIMITS
+        self.max_depth = limit_value(limits.max_depth)
+        self.max_nodes = limit_value(limits.max_nodes)
+        if recover and getattr(lexer, 'diagnostics', False) is None:
+            # Have the lexer report its errors here instead of raising them
+            lexer.diagnostics = self.diagnostics
+        # Tokens lexed ahead by peek(), in a ring. Only while some are
+        # buffered does next_token() go through them; otherwise it is the
+        # lexer's own method, so parsing without peeking costs nothing.
+        self.ahead = [None] * LOOKAHEAD
+        self.ahead_start = 0
+        self.ahead_count = 0
+        self.next_token = lexer.get_next_token
+        # Whether expr() may parse numbers and identifiers itself instead of
+        # calling primary(); cleared by subclasses or tools that replace it
+        self.inline_primary = type(self).primary is Parser.primary
+        self.current_token = self.next_token()
+    
+    def peek(self, k: int = 1) -> Token:
+        """
+        The token `k` places after the current one, without consuming it.
+        """
+        if not 1 <= k <= LOOKAHEAD:
+            raise ValueError(f"Can only peek 1 to {LOOKAHEAD} tokens ahead")
+        ahead = self.ahead
+        while self.ahead_count < k:
+            ahead[(self.ahead_start + self.ahead_count) % LOOKAHEAD] = self.lexer.get_next_token()
+            self.ahead_count += 1
+        self.next_token = self.next_buffered_token
+        return ahead[(self.ahead_start + k - 1) % LOOKAHEAD]
+    
+    def next_buffered_token(self) -> Token:
+        if not self.ahead_count:
+            return self.lexer.get_next_token()
+        token = self.ahead[self.ahead_start]
+        self.ahead[self.ahead_start] = None
+        self.ahead_start = (self.ahead_start + 1) % LOOKAHEAD
+        self.ahead_count -= 1
+        if not self.ahead_count:
+            self.next_token = self.lexer.get_next_token
+        return token
     
     def error(self, message: str = None):
+        token = self.current_token
         if message is None:
-            message = f"Syntax error at {self.current_token}"
-        raise SyntaxError(message)
+            found = token.type if token.value is None else f"{token.type} {token.value!r}"
+            message = f"Syntax error at {found}"
+        if self.recover:
+            self.report(message)
+        raise GBSyntaxError(message, *token.lines.position(token.offset))
+    
+    def limit_exceeded(self, limit: str, maximum: int):
+        token = self.current_token
+        raise limit_error(limit, maximum, token.offset, token.lines)
+    
+    def report(self, message: str):
+        token = self.current_token
+        line, column = token.lines.position(token.offset)
+        # An error cascading from one at the same token is not reported again
+        if self.diagnostics:
+            last = self.diagnostics[-1]
+            if last.line == line and last.column == column:
+                return
+        self.diagnostics.append(Diagnostic(message, line, column))
     
-    def eat(self, token_type: str):
-        if self.current_token.type == token_type:
-            self.current_token = self.lexer.get_next_token()
+    def eat(self, token_type: TokenKind):
+        if self.current_token.type is token_type:
+            if token_type is TOKEN_END:
+                self.depth -= 1
+            self.consumed += 1
+            self.current_token = self.next_token()
         else:
             self.error(f"Expected {token_type}, got {self.current_token.type}")
     
-    def factor(self):
+    def block(self, element, terminators=BLOCK_END):
+        # Parse elements up to one of the terminators (or EOF). When
+        # recovering, an element that fails is skipped and parsing goes on.
+        if self.depth > self.max_depth:
+            self.limit_exceeded('depth', self.max_depth)
+        items = []
+        while self.current_token.type not in terminators and self.current_token.type is not TOKEN_EOF:
+            depth, consumed = self.depth, self.consumed
+            try:
+                items.append(element())
+            except SyntaxError:
+                if not self.recover:
+                    raise
+                self.synchronize(depth, consumed)
+        return items
+    
+    def synchronize(self, depth: int, consumed: int):
+        # Panic-mode recovery: skip the rest of the statement that failed,
+        # along with any blocks it opened, up to a token that can start the
+        # next statement or close the enclosing block.
+        previous = (None, None)
+        must_skip = self.consumed == consumed  # Guarantee progress
+        while self.current_token.type is not TOKEN_EOF:
+            token_type = self.current_token.type
+            if self.depth <= depth and token_type in SYNC_TOKENS and not must_skip:
+                break
+            must_skip = False
+            
+            if (token_type in BLOCK_KEYWORDS
+                    or token_type is TOKEN_LPAREN and previous == (TOKEN_DEF, TOKEN_IDENTIFIER)
+                    or token_type is TOKEN_IDENTIFIER and previous == (TOKEN_BUTTON, TOKEN_STRING)):
+                self.depth += 1
+            elif token_type is TOKEN_END and self.depth > depth:
+                self.depth -= 1
+                if self.depth == depth:
+                    # This `end` closes the failed statement
+                    self.current_token = self.next_token()
+                    break
+            
+            previous = (previous[1], token_type)
+            self.current_token = self.next_token()
+        self.depth = depth
+        self.calls = 0  # Calls only nest within a single statement
+    
+    def expr(self):
+        # Operator-precedence (Pratt) parsing over an explicit stack, so that
+        # neither long operator chains nor deep parentheses recurse. Stack
+        # entries are (binding power, operator token, left operand), with
+        # PREFIX as the left operand of a prefix operator, and (0, None, None)
+        # for an open parenthesis. The top entry is kept in locals and only
+        # pushed under a tighter operator, so a chain of operators of equal
+        # power never touches the list; top_power is -1 with no entry.
+        # Operator and parenthesis tokens are already known to match, so they
+        # are consumed without going through eat(), and counted in `consumed`
+        # until the expression ends or fails.
+        stack = []
+        top_power = -1
+        top_token = top_left = None
+        open_parens = 0
+        consumed = 0
+        inline = self.inline_primary
+        try:
+            while True:
+                # Before an operand: open parentheses and prefix operators
+                token = self.current_token
+                kind = token.type
+                power = OPENING_POWER[kind]
+                while power is not None:
+                    if top_power >= 0:
+                        stack.append((top_power, top_token, top_left))
+                    if power:
+                        top_power, top_token, top_left = power, token, PREFIX
+                        self.nodes += 1
+                    else:
+                        top_power, top_token, top_left = 0, None, None
+                        open_parens += 1
+                    consumed += 1
+                    self.current_token = token = self.next_token()
+                    kind = token.type
+                    power = OPENING_POWER[kind]
+                
+                # The operand. Numbers and identifiers, the bulk of them, are
+                # primary() inlined.
+                if inline and (kind is TOKEN_NUMBER or kind is TOKEN_IDENTIFIER):
+                    self.nodes += 1
+                    if self.nodes > self.max_nodes:
+                        self.limit_exceeded('nodes', self.max_nodes)
+                    consumed += 1
+                    self.current_token = following = self.next_token()
+                    if kind is TOKEN_NUMBER:
+                        value = token.value
+                        if type(value) is int and 0 <= value < 256:
+                            node = SMALL_NUMBERS[value]
+                        else:
+                            node = Number(value, token.offset)
+                    elif following.type is TOKEN_LPAREN:
+                        node = self.call(token)
+                    else:
+                        node = Identifier(token.value, token.offset)
+                else:
+                    node = self.primary()
+                
+                # After an operand: fold the operators that bind at least as
+                # tightly as the next one, down to the innermost parenthesis,
+                # and close that parenthesis if the next token does
+                while True:
+                    token = self.current_token
+                    power = CLOSING_POWER[token.type]
+                    while top_power >= power:
+                        if top_left is PREFIX:
+                            node = UnaryOperation(TOKEN_TYPES[top_token.type], node, top_token.offset)
+                        else:
+                            node = BinaryOperation(top_left, TOKEN_TYPES[top_token.type], node, top_token.offset)
+                        if stack:
+                            top_power, top_token, top_left = stack.pop()
+                        else:
+                            top_power = -1
+                    if power > 1:
+                        break
+                    if not open_parens:
+                        return node
+                    self.eat(TOKEN_RPAREN)  # Reports a missing parenthesis
+                    open_parens -= 1
+                    if stack:
+                        top_power, top_token, top_left = stack.pop()
+                    else:
+                        top_power = -1
+                
+                # An infix operator, with the operand as its left one
+                if top_power >= 0:
+                    stack.append((top_power, top_token, top_left))
+                top_power, top_token, top_left = power, token, node
+                self.nodes += 1
+                consumed += 1
+                self.current_token = self.next_token()
+        finally:
+            self.consumed += consumed
+    
+    def primary(self):
         token = self.current_token
+        # Counted here for the operators counted in expr() too
+        self.nodes += 1
+        if self.nodes > self.max_nodes:
+            self.limit_exceeded('nodes', self.max_nodes)
         
-        if token.type == TOKEN_NUMBER:
+        if token.type is TOKEN_NUMBER:
             self.eat(TOKEN_NUMBER)
-            return Number(token.value)
+            value = token.value
+            if type(value) is int and 0 <= value < len(SMALL_NUMBERS):
+                return SMALL_NUMBERS[value]
+            return Number(value, token.offset)
         
-        if token.type == TOKEN_STRING:
+        if token.type is TOKEN_STRING:
             self.eat(TOKEN_STRING)
-            return String(token.value)
+            return String(token.value, token.offset)
         
-        if token.type == TOKEN_BOOLEAN:
+        if token.type is TOKEN_BOOLEAN:
             self.eat(TOKEN_BOOLEAN)
-            return Boolean(token.value == 'true')
+            return TRUE if token.value == 'true' else FALSE
         
-        if token.type == TOKEN_IDENTIFIER:
+        if token.type is TOKEN_IDENTIFIER:
             self.eat(TOKEN_IDENTIFIER)
             
             # Check if it's a function call
-            if self.current_token.type == TOKEN_LPAREN:
-                self.eat(TOKEN_LPAREN)
-                args = []
-                if self.current_token.type != TOKEN_RPAREN:
-                    args.append(self.expr())
-                    while self.current_token.type == TOKEN_COMMA:
-                        self.eat(TOKEN_COMMA)
-                        args.append(self.expr())
-                self.eat(TOKEN_RPAREN)
-                return FunctionCall(token.value, args)
+            if self.current_token.type is TOKEN_LPAREN:
+                return self.call(token)
             
-            return Identifier(token.value)
-        
-        if token.type == TOKEN_LPAREN:
-            self.eat(TOKEN_LPAREN)
-            node = self.expr()
-            self.eat(TOKEN_RPAREN)
-            return node
-        
-        if token.type == TOKEN_PLUS or token.type == TOKEN_MINUS:
-            op = token.type
-            self.eat(op)
-            return UnaryOperation(op, self.factor())
+            return Identifier(token.value, token.offset)
         
         self.error()
     
-    def term(self):
-        node = self.factor()
-        
-        while self.current_token.type in (TOKEN_MULTIPLY, TOKEN_DIVIDE):
-            token = self.current_token
-            if token.type == TOKEN_MULTIPLY:
-                self.eat(TOKEN_MULTIPLY)
-            elif token.type == TOKEN_DIVIDE:
-                self.eat(TOKEN_DIVIDE)
-            
-            node = BinaryOperation(left=node, op=token.type, right=self.factor())
-        
-        return node
-    
-    def expr(self):
-        node = self.term()
-        
-        while self.current_token.type in (TOKEN_PLUS, TOKEN_MINUS):
-            token = self.current_token
-            if token.type == TOKEN_PLUS:
-                self.eat(TOKEN_PLUS)
-            elif token.type == TOKEN_MINUS:
-                self.eat(TOKEN_MINUS)
-            
-            node = BinaryOperation(left=node, op=token.type, right=self.term())
-        
-        return node
+    def call(self, name: Token) -> AST:
+        # The arguments of a call to the function named by `name`, which has
+        # been consumed, from the opening parenthesis on
+        self.eat(TOKEN_LPAREN)
+        self.calls += 1
+        if self.depth + self.calls > self.max_depth:
+            self.limit_exceeded('depth', self.max_depth)
+        args = []
+        if self.current_token.type is not TOKEN_RPAREN:
+            args.append(self.expr())
+            while self.current_token.type is TOKEN_COMMA:
+                self.eat(TOKEN_COMMA)
+                args.append(self.expr())
+        self.eat(TOKEN_RPAREN)
+        self.calls -= 1
+        return FunctionCall(name.value, args, name.offset)
     
     def var_declaration(self):
+        token = self.current_token
         self.eat(TOKEN_VAR)
         var_name = self.current_token.value
         self.eat(TOKEN_IDENTIFIER)
         self.eat(TOKEN_EQUALS)
         expr = self.expr()
-        return VarDeclaration(var_name, expr)
+        return VarDeclaration(var_name, expr, token.offset)
     
     def def_declaration(self):
+        token = self.current_token
         self.eat(TOKEN_DEF)
         
-        # Check if it's a function definition
-        if self.current_token.type == TOKEN_IDENTIFIER and self.lexer.text[self.lexer.pos:self.lexer.pos+1] == '(':
+        # A name followed by a parenthesis starts a function definition
+        if self.current_token.type is TOKEN_IDENTIFIER and self.peek().type is TOKEN_LPAREN:
             func_name = self.current_token.value
             self.eat(TOKEN_IDENTIFIER)
             self.eat(TOKEN_LPAREN)
+            self.depth += 1
             params = []
-            if self.current_token.type != TOKEN_RPAREN:
+            if self.current_token.type is not TOKEN_RPAREN:
                 params.append(self.current_token.value)
                 self.eat(TOKEN_IDENTIFIER)
-                while self.current_token.type == TOKEN_COMMA:
+                while self.current_token.type is TOKEN_COMMA:
                     self.eat(TOKEN_COMMA)
                     params.append(self.current_token.value)
                     self.eat(TOKEN_IDENTIFIER)
             self.eat(TOKEN_RPAREN)
             
             # Parse function body
-            body = []
-            while self.current_token.type != TOKEN_END:
-                body.append(self.statement())
+            body = self.block(self.statement)
             self.eat(TOKEN_END)
             
-            return FunctionDef(func_name, params, body)
+            return FunctionDef(func_name, params, body, token.offset)
         
         # Otherwise it's a simple definition
         def_name = self.current_token.value
         self.eat(TOKEN_IDENTIFIER)
         self.eat(TOKEN_EQUALS)
         expr = self.expr()
-        return DefDeclaration(def_name, expr)
+        return DefDeclaration(def_name, expr, token.offset)
     
     def return_statement(self):
+        token = self.current_token
         self.eat(TOKEN_RETURN)
         expr = self.expr()
-        return ReturnStatement(expr)
+        return ReturnStatement(expr, token.offset)
     
     def if_statement(self):
+        token = self.current_token
         self.eat(TOKEN_IF)
+        self.depth += 1
         condition = self.expr()
         self.eat(TOKEN_THEN)
         
         # Parse if body
-        if_body = []
-        while self.current_token.type not in (TOKEN_ELIF, TOKEN_ELSE, TOKEN_END):
-            if_body.append(self.statement())
+        if_body = self.block(self.statement, IF_BLOCK_END)
         
         # Parse elif clauses
         elif_clauses = []
-        while self.current_token.type == TOKEN_ELIF:
+        while self.current_token.type is TOKEN_ELIF:
             self.eat(TOKEN_ELIF)
             elif_condition = self.expr()
             self.eat(TOKEN_THEN)
             
-            elif_body = []
-            while self.current_token.type not in (TOKEN_ELIF, TOKEN_ELSE, TOKEN_END):
-                elif_body.append(self.statement())
+            elif_body = self.block(self.statement, IF_BLOCK_END)
             
             elif_clauses.append((elif_condition, elif_body))
         
         # Parse else body
         else_body = []
-        if self.current_token.type == TOKEN_ELSE:
+        if self.current_token.type is TOKEN_ELSE:
             self.eat(TOKEN_ELSE)
-            while self.current_token.type != TOKEN_END:
-                else_body.append(self.statement())
+            else_body = self.block(self.statement)
         
         self.eat(TOKEN_END)
         
-        return IfStatement(condition, if_body, elif_clauses, else_body)
+        return IfStatement(condition, if_body, elif_clauses, else_body, token.offset)
     
     def loop_statement(self):
+        token = self.current_token
         self.eat(TOKEN_LOOP)
+        self.depth += 1
         
         # Check if it's a times loop
-        if self.current_token.type == TOKEN_TIMES:
+        if self.current_token.type is TOKEN_TIMES:
             self.eat(TOKEN_TIMES)
             times = self.expr()
             self.eat(TOKEN_THEN)
             
-            body = []
-            while self.current_token.type != TOKEN_END:
-                body.append(self.statement())
+            body = self.block(self.statement)
             self.eat(TOKEN_END)
             
-            return LoopStatement(None, body, is_times_loop=True, times=times)
+            return LoopStatement(None, body, True, times, token.offset)
         
         # Otherwise it's a condition loop
         condition = self.expr()
         self.eat(TOKEN_THEN)
         
-        body = []
-        while self.current_token.type != TOKEN_END:
-            body.append(self.statement())
+        body = self.block(self.statement)
         self.eat(TOKEN_END)
         
-        return LoopStatement(condition, body)
+        return LoopStatement(condition, body, offset=token.offset)
     
     def ts_windows_call(self):
+        token = self.current_token
         self.eat(TOKEN_TS_WINDOWS)
         self.eat(TOKEN_LPAREN)
         
         # Parse title parameter
-        if self.current_token.type != TOKEN_TITLE:
+        if self.current_token.type is not TOKEN_TITLE:
             self.error("Expected title parameter in ts.windows call")
         title = self.current_token.value
         self.eat(TOKEN_TITLE)
@@ -593,60 +1545,58 @@ class Parser:
         self.eat(TOKEN_COMMA)
         
         # Parse text parameter
-        if self.current_token.type != TOKEN_TEXT_ARG:
+        if self.current_token.type is not TOKEN_TEXT_ARG:
             self.error("Expected text parameter in ts.windows call")
         text_content = self.current_token.value
         self.eat(TOKEN_TEXT_ARG)
         
         self.eat(TOKEN_RPAREN)
         
-        return TSWindowsCall(title, text_content)
+        return TSWindowsCall(title, text_content, token.offset)
     
     def tsdll_call(self):
+        token = self.current_token
         self.eat(TOKEN_TSDLL)
         self.eat(TOKEN_LPAREN)
         
         # Parse DLL name
-        if self.current_token.type != TOKEN_STRING:
+        if self.current_token.type is not TOKEN_STRING:
             self.error("Expected DLL name as string")
         dll_name = self.current_token.value
         self.eat(TOKEN_STRING)
         self.eat(TOKEN_COMMA)
         
         # Parse function name
-        if self.current_token.type != TOKEN_STRING:
+        if self.current_token.type is not TOKEN_STRING:
             self.error("Expected function name as string")
         function_name = self.current_token.value
         self.eat(TOKEN_STRING)
         
         # Parse arguments
         args = []
-        while self.current_token.type != TOKEN_RPAREN:
+        while self.current_token.type is not TOKEN_RPAREN:
             self.eat(TOKEN_COMMA)
             args.append(self.expr())
         
         self.eat(TOKEN_RPAREN)
         
-        return TSDLLCall(dll_name, function_name, args)
+        return TSDLLCall(dll_name, function_name, args, token.offset)
     
     def gui_element(self):
-        if self.current_token.type == TOKEN_WINDOW:
-            return self.window_element()
-        elif self.current_token.type == TOKEN_BUTTON:
-            return self.button_element()
-        elif self.current_token.type == TOKEN_INPUT:
-            return self.input_element()
-        elif self.current_token.type == TOKEN_TEXT:
-            return self.text_element()
-        elif self.current_token.type == TOKEN_CONTAINER:
-            return self.container_element()
-        
-        self.error("Expected GUI element")
+        rule = GUI_RULES[self.current_token.type]
+        if rule is None:
+            self.error("Expected GUI element")
+        self.nodes += 1
+        if self.nodes > self.max_nodes:
+            self.limit_exceeded('nodes', self.max_nodes)
+        return getattr(self, rule)()
     
     def window_element(self):
+        token = self.current_token
         self.eat(TOKEN_WINDOW)
+        self.depth += 1
         
-        if self.current_token.type != TOKEN_STRING:
+        if self.current_token.type is not TOKEN_STRING:
             self.error("Expected window title as string")
         title = self.current_token.value
         self.eat(TOKEN_STRING)
@@ -655,121 +1605,140 @@ class Parser:
         height = self.expr()
         
         # Parse child elements
-        children = []
-        while self.current_token.type != TOKEN_END:
-            children.append(self.gui_element())
+        children = self.block(self.gui_element)
         
         self.eat(TOKEN_END)
         
-        return Window(title, width, height, children)
+        return Window(title, width, height, children, token.offset)
     
     def button_element(self):
+        token = self.current_token
         self.eat(TOKEN_BUTTON)
         
-        if self.current_token.type != TOKEN_STRING:
+        if self.current_token.type is not TOKEN_STRING:
             self.error("Expected button text as string")
         text = self.current_token.value
         self.eat(TOKEN_STRING)
         
         # Parse event handler name (optional)
         event_handler = []
-        if self.current_token.type == TOKEN_IDENTIFIER:
+        if self.current_token.type is TOKEN_IDENTIFIER:
             self.eat(TOKEN_IDENTIFIER)
+            self.depth += 1
             
             # Parse event handler body
-            while self.current_token.type != TOKEN_END:
-                event_handler.append(self.statement())
+            event_handler = self.block(self.statement)
             
             self.eat(TOKEN_END)
         
-        return Button(text, event_handler)
+        return Button(text, event_handler, token.offset)
     
     def input_element(self):
+        token = self.current_token
         self.eat(TOKEN_INPUT)
         
-        if self.current_token.type != TOKEN_STRING:
+        if self.current_token.type is not TOKEN_STRING:
             self.error("Expected input name as string")
         name = self.current_token.value
         self.eat(TOKEN_STRING)
         
-        if self.current_token.type != TOKEN_STRING:
+        if self.current_token.type is not TOKEN_STRING:
             self.error("Expected default value as string")
         default_value = self.current_token.value
         self.eat(TOKEN_STRING)
         
-        return Input(name, default_value)
+        return Input(name, default_value, token.offset)
     
     def text_element(self):
+        token = self.current_token
         self.eat(TOKEN_TEXT)
         
-        if self.current_token.type != TOKEN_STRING:
+        if self.current_token.type is not TOKEN_STRING:
             self.error("Expected text content as string")
         text_content = self.current_token.value
         self.eat(TOKEN_STRING)
         
-        return TextElement(text_content)
+        return TextElement(text_content, token.offset)
     
     def container_element(self):
+        token = self.current_token
         self.eat(TOKEN_CONTAINER)
+        self.depth += 1
         
         # Parse child elements
-        children = []
-        while self.current_token.type != TOKEN_END:
-            children.append(self.gui_element())
+        children = self.block(self.gui_element)
         
         self.eat(TOKEN_END)
         
-        return Container(children)
+        return Container(children, token.offset)
     
     def statement(self):
-        if self.current_token.type == TOKEN_VAR:
-            return self.var_declaration()
-        elif self.current_token.type == TOKEN_DEF:
-            return self.def_declaration()
-        elif self.current_token.type == TOKEN_IF:
-            return self.if_statement()
-        elif self.current_token.type == TOKEN_LOOP:
-            return self.loop_statement()
-        elif self.current_token.type == TOKEN_RETURN:
-            return self.return_statement()
-        elif self.current_token.type == TOKEN_TS_WINDOWS:
-            return self.ts_windows_call()
-        elif self.current_token.type == TOKEN_TSDLL:
-            return self.tsdll_call()
-        elif self.current_token.type in (TOKEN_WINDOW, TOKEN_BUTTON, TOKEN_INPUT, TOKEN_TEXT, TOKEN_CONTAINER):
-            return self.gui_element()
-        else:
+        rule = STATEMENT_RULES[self.current_token.type]
+        if rule is None:
             # It might be a function call or expression
             return self.expr()
+        self.nodes += 1
+        if self.nodes > self.max_nodes:
+            self.limit_exceeded('nodes', self.max_nodes)
+        return getattr(self, rule)()
     
     def parse(self):
-        program = []
-        while self.current_token.type != TOKEN_EOF:
-            program.append(self.statement())
-        return program
+        return self.block(self.statement, PROGRAM_END)
 
-def parse_gb_code(code: str) -> List[AST]:
+def parse_gb_code(code: str, limits: Optional[ParseLimits] = None) -> List[AST]:
     """
     Parse GB language code into an AST.
+    
+    Raises ParseLimitError as soon as the code goes over one of `limits`.
     """
-    lexer = Lexer(code)
-    parser = Parser(lexer)
+    lexer = RegexLexer(code, limits=limits)
+    parser = Parser(lexer, limits=limits)
     return parser.parse()
 
-def validate_gb_code(code: str) -> Tuple[bool, List[str]]:
+def parse_gb_file(path: str) -> List[AST]:
     """
-    Validate GB language code and return any errors.
+    Parse a GB language source file into an AST.
+    
+    The file is memory-mapped and lexed in place as UTF-8, so it is never
+    read or decoded as a whole; only identifier, number and string payloads
+    are decoded, as the parser asks for them. Node offsets are byte
+    offsets into the file.
     """
-    errors = []
-    try:
-        parse_gb_code(code)
-        return True, errors
-    except SyntaxError as e:
-        errors.append(str(e))
-        return False, errors
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+            parser = Parser(TokenCursor(tokenize(source)))
+            return parser.parse()
+
+def parse_gb_code_with_diagnostics(code: str, limits: Optional[ParseLimits] = None) -> Tuple[List[AST], List[Diagnostic]]:
+    """
+    Parse GB language code, recovering from syntax errors.
+    
+    Returns the AST of everything that could be parsed along with every
+    error found, in source order. Going over one of `limits` is not
+    recovered from: it raises ParseLimitError.
+    """
+    parser = Parser(RegexLexer(code, limits=limits), recover=True, limits=limits)
+    ast = parser.parse()
+    parser.diagnostics.sort(key=lambda diagnostic: (diagnostic.line, diagnostic.column))
+    return ast, parser.diagnostics
+
+def validate_gb_code(code: str, limits: Optional[ParseLimits] = None) -> Tuple[bool, List[str]]:
+    """
+    Validate GB language code and return all errors found. Raises
+    ParseLimitError if the code goes over one of `limits`.
+    """
+    _, diagnostics = parse_gb_code_with_diagnostics(code, limits)
+    errors = [str(diagnostic) for diagnostic in diagnostics]
+    return not errors, errors
 
 # Example usage
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        from gb_cli import main
+        sys.exit(main(sys.argv[1:]))
+    
     # Example GB code
     example_code = '''
     // Variable declarations
@@ -792,11 +1761,16 @@ if __name__ == "__main__":
         var status = "Minor"
     end
     
-    // Loop
-    loop i = 0; i < 10; i = i + 1 then
+    // Loops
+    loop times 10 then
         // Do something
     end
     
+    var i = 0
+    loop i < 10 then
+        var i = i + 1
+    end
+    
     // Windows API call
     ts.windows(title'Greeting', text'Hello, World!')
     
@@ -816,4 +1790,4 @@ if __name__ == "__main__":
         print("Parsing successful!")
         # You would typically process the AST here
     except Exception as e:
-        print(f"Parsing error: {e}")
\ No newline at end of file
+        print(f"Parsing error: {e}")
@@ -0,0 +1,160 @@
+"""
+Opt-in profiling of the GB lexers and parser.
+
+instrument() wraps the grammar-rule methods of one Parser or lexer
+instance so that every call is timed. Nothing is changed on the classes,
+so code that is not being profiled runs exactly as before.
+
+Recorded per rule: call count, cumulative time (outermost calls only, so
+recursion is not counted twice) and self time. Also recorded: tokens per
+type, and self time per call stack, which collapsed() writes in the
+format flamegraph.pl reads.
+"""
+import time
+from typing import Dict, Optional
+
+from gb_parser import Lexer, Parser, RegexLexer, TokenKind
+
+# Parser methods that are timed. `eat` is left out: it only advances the
+# lexer, which is timed on its own.
+PARSER_RULES = (
+    'parse', 'block', 'statement', 'expr', 'primary', 'call', 'var_declaration', 'def_declaration',
+    'return_statement', 'if_statement', 'loop_statement', 'ts_windows_call', 'tsdll_call',
+    'gui_element', 'window_element', 'button_element', 'input_element', 'text_element',
+    'container_element', 'synchronize',
+)
+
+LEXER_RULES = ('identifier', 'quoted', 'number', 'string', 'skip_comment', 'skip_whitespace')
+
+class RuleStats:
+    def __init__(self):
+        self.calls = 0
+        self.cumulative = 0.0
+        self.self_time = 0.0
+    
+    def as_dict(self) -> Dict:
+        return dict(vars(self))
+
+class Profile:
+    """
+    Statistics collected from instrumented parsers and lexers. Times are
+    in seconds.
+    """
+    def __init__(self):
+        self.rules = {}
+        self.tokens = {}
+        self.stacks = {}
+        self.error = None  # Why parsing stopped early, if it did
+        self.frames = []  # Active calls: [rule, start, time spent in callees]
+        self.active = {}  # Rule -> number of active calls
+    
+    def enter(self, rule: str):
+        self.active[rule] = self.active.get(rule, 0) + 1
+        self.frames.append([rule, time.perf_counter(), 0.0])
+    
+    def exit(self):
+        rule, start, children = self.frames.pop()
+        elapsed = time.perf_counter() - start
+        stats = self.rules.get(rule)
+        if stats is None:
+            stats = self.rules[rule] = RuleStats()
+        stats.calls += 1
+        stats.self_time += elapsed - children
+        
+        self.active[rule] -= 1
+        if not self.active[rule]:
+            stats.cumulative += elapsed
+        
+        stack = ';'.join([frame[0] for frame in self.frames] + [rule])
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + elapsed - children
+        if self.frames:
+            self.frames[-1][2] += elapsed
+    
+    def count_token(self, token_type: TokenKind):
+        self.tokens[token_type] = self.tokens.get(token_type, 0) + 1
+    
+    def as_dict(self) -> Dict:
+        return {
+            'rules': {rule: stats.as_dict() for rule, stats in self.rules.items()},
+            'tokens': {str(token_type): count for token_type, count in self.tokens.items()},
+            'error': self.error,
+        }
+    
+    def collapsed(self) -> str:
+        """
+        Self time per call stack in microseconds, one `a;b;c 123` line per
+        stack, as consumed by flamegraph.pl and speedscope.
+        """
+        lines = []
+        for stack, seconds in sorted(self.stacks.items()):
+            microseconds = round(seconds * 1e6)
+            if microseconds:
+                lines.append(f"{stack} {microseconds}")
+        return '\n'.join(lines) + '\n'
+    
+    def report(self) -> str:
+        lines = [f"{'rule':<20} {'calls':>9} {'cumulative ms':>14} {'self ms':>10}"]
+        for rule, stats in sorted(self.rules.items(), key=lambda item: -item[1].self_time):
+            lines.append(f"{rule:<20} {stats.calls:>9} {stats.cumulative * 1000:>14.2f} {stats.self_time * 1000:>10.2f}")
+        lines.append('')
+        lines.append('tokens: ' + ', '.join(f'{token_type}={count}' for token_type, count in
+                                          sorted(self.tokens.items(), key=lambda item: -item[1])))
+        return '\n'.join(lines)
+
+def wrap_rule(profile: Profile, rule: str, method):
+    enter, exit = profile.enter, profile.exit
+    
+    def timed(*args, **kwargs):
+        enter(rule)
+        try:
+            return method(*args, **kwargs)
+        finally:
+            exit()
+    return timed
+
+def instrument(target, profile: Optional[Profile] = None) -> Profile:
+    """
+    Profile a Parser, Lexer or RegexLexer instance from now on. Instrument
+    a lexer before handing it to a Parser so its first token is counted.
+    """
+    if profile is None:
+        profile = Profile()
+    
+    if isinstance(target, Parser):
+        rules = PARSER_RULES
+    elif isinstance(target, Lexer):
+        rules = LEXER_RULES
+    else:
+        rules = ()
+    
+    for rule in rules:
+        setattr(target, rule, wrap_rule(profile, rule, getattr(target, rule)))
+    if isinstance(target, Parser):
+        # Have every operand go through the timed primary()
+        target.inline_primary = False
+    
+    if isinstance(target, (Lexer, RegexLexer)):
+        get_next_token = wrap_rule(profile, 'get_next_token', target.get_next_token)
+        
+        def counted_get_next_token():
+            token = get_next_token()
+            profile.count_token(token.type)
+            return token
+        target.get_next_token = counted_get_next_token
+    return profile
+
+def profile_gb_code(code: str, legacy_lexer: bool = False, recover: bool = False) -> Profile:
+    """
+    Parse `code` with profiling on and return the profile. With
+    `legacy_lexer`, the character-by-character Lexer is used.
+    """
+    profile = Profile()
+    lexer = Lexer(code) if legacy_lexer else RegexLexer(code)
+    instrument(lexer, profile)
+    parser = Parser(lexer, recover=recover)
+    instrument(parser, profile)
+    try:
+        parser.parse()
+    except SyntaxError as e:
+        profile.error = str(e)
+    return profile
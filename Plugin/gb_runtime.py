@@ -0,0 +1,385 @@
+"""
+Execution engine for GB programs.
+
+compile_program() turns the AST into nested Python closures once. Every
+variable is resolved to a slot in a frame list at compile time, so running
+a program does no name lookups and no per-node type dispatch.
+
+Scoping: names declared at the top level (var, def, function definitions)
+live in the global frame. Inside a function, parameters and names the
+function declares are local; every other name refers to a global.
+"""
+from typing import Any, Callable, Dict, List, Optional
+
+from gb_parser import (
+    AST, BinaryOperation, Boolean, Button, Container, DefDeclaration, FunctionCall, FunctionDef,
+    Identifier, IfStatement, Input, LoopStatement, Number, ReturnStatement, String, TextElement,
+    TSDLLCall, TSWindowsCall, UnaryOperation, VarDeclaration, Window, declared_names,
+)
+
+class GBRuntimeError(Exception):
+    pass
+
+# Marks a slot whose variable has not been assigned yet
+UNSET = object()
+
+def default_ts_windows(title: str, text: str):
+    print(f"[{title}] {text}")
+
+def default_tsdll(dll_name: str, function_name: str, *args):
+    raise GBRuntimeError(f"tsdll call to {dll_name}:{function_name} has no binding")
+
+DEFAULT_BUILTINS = {
+    'print': print,
+    'ts.windows': default_ts_windows,
+    'tsdll': default_tsdll,
+}
+
+# GUI elements describe the interface; they do nothing when executed
+GUI_NODES = (Window, Button, Input, TextElement, Container)
+
+class Scope:
+    """
+    Compile-time map from names to frame slots.
+    """
+    def __init__(self, parent: Optional['Scope'] = None):
+        self.parent = parent
+        self.slots = {}
+    
+    def declare(self, name: str) -> int:
+        if name not in self.slots:
+            self.slots[name] = len(self.slots)
+        return self.slots[name]
+
+class Program:
+    """
+    A compiled GB program. run() executes it from scratch in a fresh
+    global frame and returns the value of a top-level `return`, if any.
+    """
+    def __init__(self, body: Callable, global_frame: List[Any], scope: Scope):
+        self.body = body
+        self.frame = global_frame
+        self.scope = scope
+    
+    def run(self) -> Any:
+        self.frame[:] = [UNSET] * len(self.scope.slots)
+        try:
+            result = self.body(self.frame)
+        except (TypeError, ValueError, RecursionError) as e:
+            raise GBRuntimeError(str(e)) from e
+        return None if result is None else result[0]
+    
+    def globals(self) -> Dict[str, Any]:
+        return {name: self.frame[slot] for name, slot in self.scope.slots.items()
+                if slot < len(self.frame) and self.frame[slot] is not UNSET}
+
+class Compiler:
+    """
+    Compiles AST nodes into closures. Expression closures take the current
+    frame and return a value. Statement closures take the frame and return
+    None to carry on, or a 1-tuple holding the value of a `return`.
+    """
+    def __init__(self, builtins: Dict[str, Callable], global_frame: List[Any], global_scope: Scope):
+        self.builtins = builtins
+        self.global_frame = global_frame
+        self.global_scope = global_scope
+        self.scope = global_scope
+    
+    # Variables
+    
+    def load(self, name: str) -> Callable:
+        if name in self.scope.slots:
+            return self.load_slot(name, self.scope.slots[name], self.scope is self.global_scope)
+        if name in self.global_scope.slots:
+            return self.load_slot(name, self.global_scope.slots[name], True)
+        if name in self.builtins:
+            value = self.builtins[name]
+            return lambda f: value
+        
+        def undefined(f):
+            raise GBRuntimeError(f"Undefined variable '{name}'")
+        return undefined
+    
+    def load_slot(self, name: str, slot: int, is_global: bool) -> Callable:
+        if is_global:
+            frame = self.global_frame
+            
+            def load_global(f):
+                value = frame[slot]
+                if value is UNSET:
+                    raise GBRuntimeError(f"Variable '{name}' used before assignment")
+                return value
+            return load_global
+        
+        def load_local(f):
+            value = f[slot]
+            if value is UNSET:
+                raise GBRuntimeError(f"Variable '{name}' used before assignment")
+            return value
+        return load_local
+    
+    def store(self, name: str, value: Callable) -> Callable:
+        slot = self.scope.declare(name)
+        if self.scope is self.global_scope:
+            frame = self.global_frame
+            
+            def store_global(f):
+                frame[slot] = value(f)
+            return store_global
+        
+        def store_local(f):
+            f[slot] = value(f)
+        return store_local
+    
+    # Expressions
+    
+    def expression(self, node: AST) -> Callable:
+        if isinstance(node, (Number, String, Boolean)):
+            value = node.value
+            return lambda f: value
+        if isinstance(node, Identifier):
+            return self.load(node.name)
+        if isinstance(node, BinaryOperation):
+            return self.binary_operation(node)
+        if isinstance(node, UnaryOperation):
+            operand = self.expression(node.expr)
+            if node.op == 'MINUS':
+                return lambda f: -operand(f)
+            if node.op == 'NOT':
+                return lambda f: not operand(f)
+            return lambda f: +operand(f)
+        if isinstance(node, FunctionCall):
+            return self.function_call(node)
+        if isinstance(node, TSWindowsCall):
+            hook = self.builtins['ts.windows']
+            title, text = node.title, node.text
+            return lambda f: hook(title, text)
+        if isinstance(node, TSDLLCall):
+            return self.tsdll_call(node)
+        raise GBRuntimeError(f"Cannot evaluate {type(node).__name__}")
+    
+    def tsdll_call(self, node: TSDLLCall) -> Callable:
+        hook = self.builtins['tsdll']
+        dll_name, function_name = node.dll_name, node.function_name
+        args = [self.expression(arg) for arg in node.args]
+        
+        # A hook with a bind() method (see gb_ffi) resolves each call site
+        # once, here, instead of on every call
+        bind = getattr(hook, 'bind', None)
+        if bind is None:
+            return lambda f: hook(dll_name, function_name, *[arg(f) for arg in args])
+        function = bind(dll_name, function_name)
+        if not args:
+            return lambda f: function()
+        if len(args) == 1:
+            arg0, = args
+            return lambda f: function(arg0(f))
+        if len(args) == 2:
+            arg0, arg1 = args
+            return lambda f: function(arg0(f), arg1(f))
+        return lambda f: function(*[arg(f) for arg in args])
+    
+    def binary_operation(self, node: BinaryOperation) -> Callable:
+        left = self.expression(node.left)
+        op = node.op
+        
+        # Specialize the common `expression <op> constant` shape
+        if isinstance(node.right, Number):
+            constant = node.right.value
+            if op == 'PLUS':
+                return lambda f: left(f) + constant
+            if op == 'MINUS':
+                return lambda f: left(f) - constant
+            if op == 'MULTIPLY':
+                return lambda f: left(f) * constant
+            if op == 'DIVIDE' and constant != 0:
+                return lambda f: left(f) / constant
+        
+        right = self.expression(node.right)
+        if op == 'PLUS':
+            return lambda f: left(f) + right(f)
+        if op == 'MINUS':
+            return lambda f: left(f) - right(f)
+        if op == 'MULTIPLY':
+            return lambda f: left(f) * right(f)
+        if op == 'DIVIDE':
+            def divide(f):
+                divisor = right(f)
+                if divisor == 0:
+                    raise GBRuntimeError("Division by zero")
+                return left(f) / divisor
+            return divide
+        if op == 'EQUAL_EQUAL':
+            return lambda f: left(f) == right(f)
+        if op == 'NOT_EQUAL':
+            return lambda f: left(f) != right(f)
+        if op == 'LESS':
+            return lambda f: left(f) < right(f)
+        if op == 'LESS_EQUAL':
+            return lambda f: left(f) <= right(f)
+        if op == 'GREATER':
+            return lambda f: left(f) > right(f)
+        if op == 'GREATER_EQUAL':
+            return lambda f: left(f) >= right(f)
+        # `and` and `or` only evaluate the right operand when needed
+        if op == 'AND':
+            return lambda f: left(f) and right(f)
+        if op == 'OR':
+            return lambda f: left(f) or right(f)
+        raise GBRuntimeError(f"Unknown operator {op}")
+    
+    def function_call(self, node: FunctionCall) -> Callable:
+        function = self.load(node.name)
+        args = [self.expression(arg) for arg in node.args]
+        if not args:
+            return lambda f: function(f)()
+        if len(args) == 1:
+            arg0, = args
+            return lambda f: function(f)(arg0(f))
+        if len(args) == 2:
+            arg0, arg1 = args
+            return lambda f: function(f)(arg0(f), arg1(f))
+        return lambda f: function(f)(*[arg(f) for arg in args])
+    
+    # Statements
+    
+    def block(self, body: List[AST]) -> Callable:
+        statements = [self.statement(node) for node in body if not isinstance(node, GUI_NODES)]
+        if not statements:
+            return lambda f: None
+        if len(statements) == 1:
+            return statements[0]
+        if len(statements) == 2:
+            first, second = statements
+            
+            def block2(f):
+                result = first(f)
+                if result is not None:
+                    return result
+                return second(f)
+            return block2
+        
+        def block(f):
+            for statement in statements:
+                result = statement(f)
+                if result is not None:
+                    return result
+        return block
+    
+    def statement(self, node: AST) -> Callable:
+        if isinstance(node, (VarDeclaration, DefDeclaration)):
+            return self.store(node.name, self.expression(node.value))
+        if isinstance(node, FunctionDef):
+            return self.function_def(node)
+        if isinstance(node, ReturnStatement):
+            value = self.expression(node.value)
+            return lambda f: (value(f),)
+        if isinstance(node, IfStatement):
+            return self.if_statement(node)
+        if isinstance(node, LoopStatement):
+            return self.loop_statement(node)
+        
+        # Any other expression is evaluated for its effect
+        expression = self.expression(node)
+        
+        def expression_statement(f):
+            expression(f)
+        return expression_statement
+    
+    def if_statement(self, node: IfStatement) -> Callable:
+        branches = [(self.expression(node.condition), self.block(node.body))]
+        for condition, body in node.elif_clauses:
+            branches.append((self.expression(condition), self.block(body)))
+        else_body = self.block(node.else_body)
+        
+        if len(branches) == 1:
+            (condition, body), = branches
+            
+            def if_else(f):
+                if condition(f):
+                    return body(f)
+                return else_body(f)
+            return if_else
+        
+        def if_chain(f):
+            for condition, body in branches:
+                if condition(f):
+                    return body(f)
+            return else_body(f)
+        return if_chain
+    
+    def loop_statement(self, node: LoopStatement) -> Callable:
+        body = self.block(node.body)
+        
+        if node.is_times_loop:
+            times = self.expression(node.times)
+            
+            def times_loop(f):
+                for _ in range(int(times(f))):
+                    result = body(f)
+                    if result is not None:
+                        return result
+            return times_loop
+        
+        condition = self.expression(node.condition)
+        
+        def condition_loop(f):
+            while condition(f):
+                result = body(f)
+                if result is not None:
+                    return result
+        return condition_loop
+    
+    def function_def(self, node: FunctionDef) -> Callable:
+        name = node.name
+        outer = self.scope
+        store_slot = outer.declare(name)
+        is_global = outer is self.global_scope
+        
+        # Compile the body in a scope of its own: parameters first, then
+        # every name the body declares
+        scope = Scope(parent=outer)
+        for param in node.params:
+            scope.declare(param)
+        for local in declared_names(node.body):
+            scope.declare(local)
+        self.scope = scope
+        try:
+            body = self.block(node.body)
+        finally:
+            self.scope = outer
+        
+        param_count = len(node.params)
+        padding = [UNSET] * (len(scope.slots) - param_count)
+        
+        def function(*args):
+            if len(args) != param_count:
+                raise GBRuntimeError(f"{name}() takes {param_count} arguments, got {len(args)}")
+            result = body([*args, *padding])
+            return None if result is None else result[0]
+        
+        frame = self.global_frame
+        if is_global:
+            def define_global(f):
+                frame[store_slot] = function
+            return define_global
+        
+        def define_local(f):
+            f[store_slot] = function
+        return define_local
+
+def compile_program(ast: List[AST], builtins: Optional[Dict[str, Callable]] = None) -> Program:
+    """
+    Compile a parsed GB program into a runnable Program.
+    """
+    all_builtins = dict(DEFAULT_BUILTINS)
+    if builtins:
+        all_builtins.update(builtins)
+    
+    scope = Scope()
+    for name in declared_names(ast):
+        scope.declare(name)
+    frame = []
+    compiler = Compiler(all_builtins, frame, scope)
+    body = compiler.block(ast)
+    return Program(body, frame, scope)
@@ -0,0 +1,53 @@
+"""
+Generated GB programs and AST comparison, shared by the tests and the
+benchmarks.
+"""
+from gb_parser import AST
+
+SAMPLE = '''// Generated block %(i)d
+var counter%(i)d = %(i)d + 2 * (3 - 1) / 4.5
+var label%(i)d = "Item \\"%(i)d\\" of the list"
+def LIMIT%(i)d = 1024
+def step%(i)d(a, b)
+    return a * b + LIMIT%(i)d
+end
+loop times 3 then
+    var total = total + step%(i)d(counter%(i)d, 2)
+end
+ts.windows(title'Notice %(i)d', text'Block %(i)d loaded')
+tsdll("user32.dll", "MessageBoxA", 0, label%(i)d)
+window "Panel %(i)d" 800 600
+    text "Welcome"
+    container
+        button "Run" onRun%(i)d
+            ts.windows(title'Run', text'Running %(i)d')
+        end
+        input "Name" ""
+    end
+end
+'''
+
+def make_source(blocks: int) -> str:
+    """
+    A valid program of `blocks` copies of SAMPLE, numbered apart.
+    """
+    return ''.join(SAMPLE % {'i': i} for i in range(blocks))
+
+def same_tree(a, b) -> bool:
+    """
+    Structural equality of two ASTs (or lists of them), positions included.
+    """
+    stack = [(a, b)]
+    while stack:
+        x, y = stack.pop()
+        if isinstance(x, AST):
+            if type(x) is not type(y) or x.offset != y.offset:
+                return False
+            stack.extend((getattr(x, field), getattr(y, field)) for field in x.__slots__)
+        elif isinstance(x, (list, tuple)):
+            if not isinstance(y, (list, tuple)) or len(x) != len(y):
+                return False
+            stack.extend(zip(x, y))
+        elif type(x) is not type(y) or x != y:
+            return False
+    return True
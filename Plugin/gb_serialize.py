@@ -0,0 +1,430 @@
+"""
+Compact binary format for parsed GB programs.
+
+dump_ast() writes an AST to a file; load_ast() rebuilds it from bytes or a
+memory-mapped file far faster than the source can be lexed and parsed.
+
+Layout (little-endian), after a fixed header:
+    
+    string offsets   u32 x (strings + 1)
+    string data      UTF-8, concatenated
+    node table       i32 x 3 per node: kind, source offset, first operand
+    operands         i32, each node's fields in declaration order
+    integers         i64 number literals
+    floats           f64 number literals
+    roots            i32 node indexes of the top-level statements
+
+Nodes are written children first, so the loader builds every node in a
+single forward pass; node loading is not lazy. Only string decoding is:
+each string is stored once and decoded when the first node using it is
+built, so strings no node uses are never decoded.
+On a little-endian machine the tables are read in place through the
+buffer, never copied; the loaded nodes keep no reference to it. Indexes
+are checked as they are used, and a bad one raises ASTFormatError.
+"""
+import io
+import mmap
+import struct
+import sys
+from array import array
+from typing import BinaryIO, List
+
+from gb_parser import (
+    AST, FALSE, SMALL_NUMBERS, TRUE, BinaryOperation, Boolean, Button, Container, DefDeclaration,
+    FunctionCall, FunctionDef, Identifier, IfStatement, Input, LoopStatement, Number,
+    ReturnStatement, String, TextElement, TSDLLCall, TSWindowsCall, UnaryOperation, VarDeclaration,
+    Window,
+)
+
+MAGIC = b'GBAS'
+FORMAT_VERSION = 2
+
+# magic, version, reserved, then the count of strings, string data bytes,
+# nodes, operands, integers, floats and roots
+HEADER = struct.Struct('<4sHH7I')
+
+# Field encodings: a string index, a node index (-1 for None), a list of
+# node indexes, a list of string indexes, elif clauses, a flag or a number
+STR, NODE, NODES, STRS, CLAUSES, FLAG, NUMBER = range(7)
+
+# Every node class with its fields, in constructor order. A node's kind is
+# its index here, so new classes must only ever be appended.
+SCHEMA = (
+    (VarDeclaration, (('name', STR), ('value', NODE))),
+    (DefDeclaration, (('name', STR), ('value', NODE))),
+    (FunctionDef, (('name', STR), ('params', STRS), ('body', NODES))),
+    (ReturnStatement, (('value', NODE),)),
+    (IfStatement, (('condition', NODE), ('body', NODES), ('elif_clauses', CLAUSES), ('else_body', NODES))),
+    (LoopStatement, (('condition', NODE), ('body', NODES), ('is_times_loop', FLAG), ('times', NODE))),
+    (BinaryOperation, (('left', NODE), ('op', STR), ('right', NODE))),
+    (UnaryOperation, (('op', STR), ('expr', NODE))),
+    (Number, (('value', NUMBER),)),
+    (String, (('value', STR),)),
+    (Boolean, (('value', FLAG),)),
+    (Identifier, (('name', STR),)),
+    (FunctionCall, (('name', STR), ('args', NODES))),
+    (TSWindowsCall, (('title', STR), ('text', STR))),
+    (TSDLLCall, (('dll_name', STR), ('function_name', STR), ('args', NODES))),
+    (Window, (('title', STR), ('width', NODE), ('height', NODE), ('children', NODES))),
+    (Button, (('text', STR), ('event_handler', NODES))),
+    (Input, (('name', STR), ('default_value', STR))),
+    (TextElement, (('text', STR),)),
+    (Container, (('children', NODES),)),
+)
+KINDS = {node_class: kind for kind, (node_class, _) in enumerate(SCHEMA)}
+
+# Number operands: index * 3 + one of these tags
+INT, FLOAT, BIG_INT = range(3)
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+class ASTFormatError(ValueError):
+    pass
+
+def to_little_endian(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def from_little_endian(typecode: str, data) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+class Writer:
+    def __init__(self):
+        self.strings = {}
+        self.nodes = array('i')
+        self.operands = array('i')
+        self.ints = array('q')
+        self.floats = array('d')
+        self.indexes = {}  # id(node) -> node index, so shared nodes are written once
+    
+    def string(self, value: str) -> int:
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.strings)
+        return index
+    
+    def number(self, value) -> int:
+        if isinstance(value, float):
+            self.floats.append(value)
+            return (len(self.floats) - 1) * 3 + FLOAT
+        if INT64_MIN <= value <= INT64_MAX:
+            self.ints.append(value)
+            return (len(self.ints) - 1) * 3 + INT
+        return self.string(str(value)) * 3 + BIG_INT
+    
+    def add(self, root: AST) -> int:
+        # Post-order without recursion: a node is written once all the
+        # nodes under it have been
+        stack = [(root, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if id(node) in self.indexes:
+                continue
+            if not children_done:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(children(node)))
+                continue
+            self.write_node(node)
+        return self.indexes[id(root)]
+    
+    def write_node(self, node: AST):
+        kind = KINDS[type(node)]
+        self.nodes.extend((kind, node.offset, len(self.operands)))
+        operands = self.operands
+        for field, encoding in SCHEMA[kind][1]:
+            value = getattr(node, field)
+            if encoding == STR:
+                operands.append(self.string(value))
+            elif encoding == NODE:
+                operands.append(-1 if value is None else self.indexes[id(value)])
+            elif encoding == NODES:
+                operands.append(len(value))
+                operands.extend(self.indexes[id(item)] for item in value)
+            elif encoding == STRS:
+                operands.append(len(value))
+                operands.extend(self.string(item) for item in value)
+            elif encoding == CLAUSES:
+                operands.append(len(value))
+                for condition, body in value:
+                    operands.append(self.indexes[id(condition)])
+                    operands.append(len(body))
+                    operands.extend(self.indexes[id(item)] for item in body)
+            elif encoding == FLAG:
+                operands.append(1 if value else 0)
+            else:
+                operands.append(self.number(value))
+        self.indexes[id(node)] = len(self.nodes) // 3 - 1
+
+def children(node: AST) -> List[AST]:
+    # Child nodes in field order
+    result = []
+    for field, encoding in SCHEMA[KINDS[type(node)]][1]:
+        value = getattr(node, field)
+        if encoding == NODE:
+            if value is not None:
+                result.append(value)
+        elif encoding == NODES:
+            result.extend(value)
+        elif encoding == CLAUSES:
+            for condition, body in value:
+                result.append(condition)
+                result.extend(body)
+    return result
+
+def dump_ast(ast: List[AST], fp: BinaryIO):
+    """
+    Write a parsed program to the binary file `fp`.
+    """
+    writer = Writer()
+    roots = array('i', [writer.add(node) for node in ast])
+    
+    encoded = [value.encode('utf-8', 'surrogatepass') for value in writer.strings]
+    offsets = array('I', [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    
+    fp.write(HEADER.pack(
+        MAGIC, FORMAT_VERSION, 0, len(encoded), offsets[-1], len(writer.nodes) // 3,
+        len(writer.operands), len(writer.ints), len(writer.floats), len(roots),
+    ))
+    fp.write(to_little_endian(offsets))
+    fp.write(b''.join(encoded))
+    for values in (writer.nodes, writer.operands, writer.ints, writer.floats, roots):
+        fp.write(to_little_endian(values))
+
+def dumps_ast(ast: List[AST]) -> bytes:
+    """
+    Binary encoding of a parsed program, as dump_ast() writes it.
+    """
+    buffer = io.BytesIO()
+    dump_ast(ast, buffer)
+    return buffer.getvalue()
+
+class StringTable:
+    """
+    Strings of a loaded file, decoded on first use and shared afterwards.
+    """
+    def __init__(self, offsets, data: memoryview):
+        self.offsets = offsets
+        self.data = data
+        self.count = len(offsets) - 1
+        self.decoded = {}
+    
+    def __getitem__(self, index: int) -> str:
+        value = self.decoded.get(index)
+        if value is None:
+            if not 0 <= index < self.count:
+                raise IndexError(f"string index {index} out of range")
+            start, end = self.offsets[index], self.offsets[index + 1]
+            if not start <= end <= len(self.data):
+                raise IndexError(f"string {index} lies outside the string data")
+            value = self.decoded[index] = sys.intern(str(self.data[start:end], 'utf-8', 'surrogatepass'))
+        return value
+
+def read_table(view: memoryview, typecode: str):
+    # Little-endian values, read in place where the machine allows
+    if sys.byteorder == 'little':
+        return view.cast(typecode)
+    return from_little_endian(typecode, view)
+
+def load_ast(buf) -> List[AST]:
+    """
+    Rebuild a program from the bytes written by dump_ast(). `buf` may be
+    bytes, a memoryview or an mmap.
+    """
+    view = memoryview(buf)
+    sections = []
+    try:
+        if len(view) < HEADER.size:
+            raise ASTFormatError("Truncated AST header")
+        magic, version, _, string_count, string_bytes, node_count, operand_count, int_count, float_count, root_count = \
+            HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ASTFormatError("Not a GB AST file")
+        if version != FORMAT_VERSION:
+            raise ASTFormatError(f"Unsupported AST format version {version}")
+        
+        pos = HEADER.size
+        for typecode, count in (('I', string_count + 1), ('B', string_bytes), ('i', node_count * 3),
+                                ('i', operand_count), ('q', int_count), ('d', float_count), ('i', root_count)):
+            end = pos + count * array(typecode).itemsize
+            if end > len(view):
+                raise ASTFormatError("Truncated AST data")
+            sections.append(view[pos:end] if typecode == 'B' else read_table(view[pos:end], typecode))
+            pos = end
+        offsets, data, table, operands, ints, floats, roots = sections
+        
+        kinds, positions, firsts = table[0::3], table[1::3], table[2::3]
+        sections.extend((kinds, positions, firsts))
+        if node_count and not (0 <= min(kinds) and max(kinds) < len(BUILDERS)
+                               and 0 <= min(firsts) and max(firsts) <= operand_count):
+            raise ASTFormatError("Corrupt AST data: node kind or operand position out of range")
+        
+        # Nodes by index: a negative or forward reference is a KeyError,
+        # where a list would wrap around or hand back the wrong node
+        strings = StringTable(offsets, data)
+        nodes = {}
+        try:
+            for index, (kind, offset, at) in enumerate(zip(kinds, positions, firsts)):
+                nodes[index] = BUILDERS[kind](operands, at, offset, nodes, strings, ints, floats)
+            return [nodes[index] for index in roots]
+        except (IndexError, KeyError, TypeError, ValueError) as e:
+            # Raised outside this block, so the loaders' frames, and the
+            # slices of the buffer they hold, are not kept by a traceback
+            error = f"Corrupt AST data: {type(e).__name__}: {e}"
+        raise ASTFormatError(error)
+    finally:
+        # Let go of the buffer, so that a memory map can be closed
+        for section in sections:
+            if type(section) is memoryview:
+                section.release()
+        view.release()
+
+def load_ast_file(path: str) -> List[AST]:
+    """
+    Load a program written by dump_ast() from `path`, memory-mapping it.
+    """
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            return load_ast(buf)
+
+# Loaders, one per node kind. Each takes the operands, the offset of the
+# node's first operand, its position, the nodes built so far and the
+# string and number tables.
+
+def counted(o, at):
+    # The `count` operands after the count at `at`
+    count = o[at]
+    items = o[at + 1:at + 1 + count]
+    if count < 0 or len(items) != count:
+        raise IndexError(f"count {count} out of range")
+    return items
+
+def node_list(o, at, nodes):
+    items = counted(o, at)
+    return [nodes[i] for i in items], at + 1 + len(items)
+
+def number_value(operand, strings, ints, floats):
+    index, tag = divmod(operand, 3)
+    if index < 0:
+        raise IndexError(f"number index {index} out of range")
+    if tag == INT:
+        return ints[index]
+    if tag == FLOAT:
+        return floats[index]
+    return int(strings[index])
+
+def load_var(o, at, offset, nodes, s, ints, floats):
+    return VarDeclaration(s[o[at]], nodes[o[at + 1]], offset)
+
+def load_def(o, at, offset, nodes, s, ints, floats):
+    return DefDeclaration(s[o[at]], nodes[o[at + 1]], offset)
+
+def load_function_def(o, at, offset, nodes, s, ints, floats):
+    params = [s[i] for i in counted(o, at + 1)]
+    body, _ = node_list(o, at + 2 + len(params), nodes)
+    return FunctionDef(s[o[at]], params, body, offset)
+
+def load_return(o, at, offset, nodes, s, ints, floats):
+    return ReturnStatement(nodes[o[at]], offset)
+
+def load_if(o, at, offset, nodes, s, ints, floats):
+    condition = nodes[o[at]]
+    body, at = node_list(o, at + 1, nodes)
+    elif_clauses = []
+    if o[at] < 0:
+        raise IndexError(f"negative count {o[at]}")
+    for _ in range(o[at]):
+        elif_condition = nodes[o[at + 1]]
+        elif_body, at = node_list(o, at + 2, nodes)
+        elif_clauses.append((elif_condition, elif_body))
+        at -= 1
+    else_body, _ = node_list(o, at + 1, nodes)
+    return IfStatement(condition, body, elif_clauses, else_body, offset)
+
+def load_loop(o, at, offset, nodes, s, ints, floats):
+    condition = nodes[o[at]] if o[at] >= 0 else None
+    body, at = node_list(o, at + 1, nodes)
+    times = nodes[o[at + 1]] if o[at + 1] >= 0 else None
+    return LoopStatement(condition, body, bool(o[at]), times, offset)
+
+def load_binary(o, at, offset, nodes, s, ints, floats):
+    return BinaryOperation(nodes[o[at]], s[o[at + 1]], nodes[o[at + 2]], offset)
+
+def load_unary(o, at, offset, nodes, s, ints, floats):
+    return UnaryOperation(s[o[at]], nodes[o[at + 1]], offset)
+
+def load_number(o, at, offset, nodes, s, ints, floats):
+    value = number_value(o[at], s, ints, floats)
+    if offset < 0 and type(value) is int and 0 <= value < len(SMALL_NUMBERS):
+        return SMALL_NUMBERS[value]
+    return Number(value, offset)
+
+def load_string(o, at, offset, nodes, s, ints, floats):
+    return String(s[o[at]], offset)
+
+def load_boolean(o, at, offset, nodes, s, ints, floats):
+    if offset < 0:
+        return TRUE if o[at] else FALSE
+    return Boolean(bool(o[at]), offset)
+
+def load_identifier(o, at, offset, nodes, s, ints, floats):
+    return Identifier(s[o[at]], offset)
+
+def load_call(o, at, offset, nodes, s, ints, floats):
+    args, _ = node_list(o, at + 1, nodes)
+    return FunctionCall(s[o[at]], args, offset)
+
+def load_ts_windows(o, at, offset, nodes, s, ints, floats):
+    return TSWindowsCall(s[o[at]], s[o[at + 1]], offset)
+
+def load_tsdll(o, at, offset, nodes, s, ints, floats):
+    args, _ = node_list(o, at + 2, nodes)
+    return TSDLLCall(s[o[at]], s[o[at + 1]], args, offset)
+
+def load_window(o, at, offset, nodes, s, ints, floats):
+    children, _ = node_list(o, at + 3, nodes)
+    return Window(s[o[at]], nodes[o[at + 1]], nodes[o[at + 2]], children, offset)
+
+def load_button(o, at, offset, nodes, s, ints, floats):
+    event_handler, _ = node_list(o, at + 1, nodes)
+    return Button(s[o[at]], event_handler, offset)
+
+def load_input(o, at, offset, nodes, s, ints, floats):
+    return Input(s[o[at]], s[o[at + 1]], offset)
+
+def load_text(o, at, offset, nodes, s, ints, floats):
+    return TextElement(s[o[at]], offset)
+
+def load_container(o, at, offset, nodes, s, ints, floats):
+    children, _ = node_list(o, at, nodes)
+    return Container(children, offset)
+
+LOADERS = {
+    VarDeclaration: load_var,
+    DefDeclaration: load_def,
+    FunctionDef: load_function_def,
+    ReturnStatement: load_return,
+    IfStatement: load_if,
+    LoopStatement: load_loop,
+    BinaryOperation: load_binary,
+    UnaryOperation: load_unary,
+    Number: load_number,
+    String: load_string,
+    Boolean: load_boolean,
+    Identifier: load_identifier,
+    FunctionCall: load_call,
+    TSWindowsCall: load_ts_windows,
+    TSDLLCall: load_tsdll,
+    Window: load_window,
+    Button: load_button,
+    Input: load_input,
+    TextElement: load_text,
+    Container: load_container,
+}
+BUILDERS = tuple(LOADERS[node_class] for node_class, _ in SCHEMA)
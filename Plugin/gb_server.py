@@ -0,0 +1,328 @@
+"""
+Resident validation server speaking JSON-RPC 2.0 over stdio.
+
+Messages are framed as in the Language Server Protocol: a
+`Content-Length: N` header, a blank line, then N bytes of JSON.
+
+Methods (params in braces):
+    
+    open {uri, text, version?}        start tracking a document
+    change {uri, version?, text}      replace its whole text
+    change {uri, version?, edits}     or apply [offset, removed, inserted]
+                                      edits, in order
+    close {uri}                       stop tracking it
+    validate {uri} or {text}          reply with {valid, diagnostics}
+    shutdown, exit
+
+Open documents keep their text and, while valid, the incremental parse of
+gb_incremental, so a change given as edits only re-parses the statements
+around it. Diagnostics are published as `diagnostics` notifications
+{uri, version, valid, diagnostics: [{line, column, message}]} once no
+change has arrived for the debounce interval, so a burst of edits is
+parsed once.
+
+Documents are parsed under LIMITS, so one deeply nested document cannot
+exhaust the stack; going over them is reported as the document's only
+diagnostic. A request that fails in any other way gets an internal error
+reply, and the server carries on. So does a message whose Content-Length
+cannot be read: it gets a parse error reply and its body is skipped.
+"""
+import io
+import json
+import os
+import queue
+import re
+import threading
+from typing import BinaryIO, Callable, Dict, Optional
+
+from gb_incremental import apply_edits, parse_document, reparse_document
+from gb_parser import Diagnostic, ParseLimitError, ParseLimits, parse_gb_code_with_diagnostics
+
+# Quiet time after a change before its document is validated
+DEBOUNCE_MS = 2.0
+
+# Limits every document is parsed under
+LIMITS = ParseLimits(max_depth=200)
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+# A Content-Length header, found anywhere in a line: after a message that
+# could not be read, the next header follows its body on the same line
+CONTENT_LENGTH = re.compile(rb'content-length\s*:', re.IGNORECASE)
+
+class RequestError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+def read_message(stream: BinaryIO) -> Optional[bytes]:
+    """
+    The body of the next framed message, or None at end of input. Raises
+    RequestError once the headers of a message with an unreadable
+    Content-Length are read; the next call skips its body, up to the next
+    Content-Length header.
+    """
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            if length is not None:
+                break
+            continue  # Stray blank line between messages
+        header = CONTENT_LENGTH.search(line)
+        if header:
+            length = line[header.end():].strip()
+    if not length.isdigit():
+        raise RequestError(PARSE_ERROR, f"Invalid Content-Length: {length.decode('latin-1')!r}")
+    return stream.read(int(length))
+
+class FrameReader:
+    """
+    The readline() and read() that read_message() needs, over a file
+    descriptor read with os.read() into a buffer of its own. Unlike a
+    buffered stream it holds no lock while blocked, so a thread left
+    waiting in it does not stop the interpreter from exiting.
+    """
+    def __init__(self, fd: int):
+        self.fd = fd
+        self.buffer = bytearray()
+    
+    def fill(self) -> bool:
+        chunk = os.read(self.fd, 65536)
+        self.buffer += chunk
+        return bool(chunk)
+    
+    def readline(self) -> bytes:
+        while True:
+            end = self.buffer.find(b'\n') + 1
+            if end or not self.fill():
+                end = end or len(self.buffer)
+                line = bytes(self.buffer[:end])
+                del self.buffer[:end]
+                return line
+    
+    def read(self, size: int) -> bytes:
+        while len(self.buffer) < size and self.fill():
+            pass
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+def write_message(stream: BinaryIO, message: Dict):
+    body = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    stream.write(b'Content-Length: %d\r\n\r\n' % len(body) + body)
+    stream.flush()
+
+def diagnostic_dict(diagnostic: Diagnostic) -> Dict:
+    return {'line': diagnostic.line, 'column': diagnostic.column, 'message': diagnostic.message}
+
+class Document:
+    def __init__(self, uri: str, text: str, version):
+        self.uri = uri
+        self.text = text
+        self.version = version
+        self.result = None  # Incremental parse of the last valid text
+        self.edits = []  # Edits since `result` was parsed, or None after a whole new text
+        self.diagnostics = []
+    
+    def validate(self):
+        # Reuse the previous parse while the document stays valid; only an
+        # invalid one needs the slower, error-recovering parse
+        result = None
+        try:
+            try:
+                if self.result is not None and self.edits is not None:
+                    result = reparse_document(self.result, self.edits, LIMITS)
+                else:
+                    result = parse_document(self.text, LIMITS)
+                self.diagnostics = []
+            except SyntaxError:
+                _, self.diagnostics = parse_gb_code_with_diagnostics(self.text, LIMITS)
+        except ParseLimitError as e:
+            result = None
+            self.diagnostics = [Diagnostic(e.message, e.line or 1, e.column or 1)]
+        self.result = result
+        self.edits = []
+    
+    def report(self) -> Dict:
+        return {'valid': not self.diagnostics, 'diagnostics': [diagnostic_dict(d) for d in self.diagnostics]}
+
+# JSON-RPC method -> Server method
+METHODS = {
+    'open': 'open',
+    'change': 'change',
+    'close': 'close',
+    'validate': 'validate',
+    'shutdown': 'shutdown',
+    'exit': 'exit',
+}
+
+class Server:
+    """
+    Document state and message handling, apart from any transport.
+    `send` is called with each outgoing message.
+    """
+    def __init__(self, send: Callable[[Dict], None]):
+        self.send = send
+        self.documents = {}
+        self.dirty = {}  # Documents changed since they were last validated, in order
+        self.exited = False
+    
+    def handle(self, body: bytes):
+        request_id = None
+        try:
+            try:
+                message = json.loads(body)
+            except ValueError as e:
+                raise RequestError(PARSE_ERROR, f"Invalid JSON: {e}")
+            if not isinstance(message, dict) or not isinstance(message.get('method'), str):
+                raise RequestError(INVALID_REQUEST, "Expected a JSON-RPC request object")
+            request_id = message.get('id')
+            method = METHODS.get(message['method'])
+            if method is None:
+                raise RequestError(METHOD_NOT_FOUND, f"Unknown method: {message['method']}")
+            params = message.get('params') or {}
+            if not isinstance(params, dict):
+                raise RequestError(INVALID_PARAMS, "Params must be an object")
+            result = getattr(self, method)(params)
+        except Exception as e:
+            code = e.code if isinstance(e, RequestError) else INTERNAL_ERROR
+            message = str(e) if isinstance(e, RequestError) else f"Internal error: {type(e).__name__}: {e}"
+            # Notifications get no reply, not even for errors, except a
+            # request that could not be read at all
+            if request_id is not None or code in (PARSE_ERROR, INVALID_REQUEST):
+                self.send_error(request_id, code, message)
+            return
+        if request_id is not None:
+            self.send({'jsonrpc': '2.0', 'id': request_id, 'result': result})
+    
+    def send_error(self, request_id, code: int, message: str):
+        self.send({'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}})
+    
+    def document(self, params: Dict) -> Document:
+        document = self.documents.get(params.get('uri'))
+        if document is None:
+            raise RequestError(INVALID_PARAMS, f"Document not open: {params.get('uri')}")
+        return document
+    
+    def open(self, params: Dict):
+        uri, text = params.get('uri'), params.get('text')
+        if not isinstance(uri, str) or not isinstance(text, str):
+            raise RequestError(INVALID_PARAMS, "open needs a uri and a text")
+        self.documents[uri] = document = Document(uri, text, params.get('version'))
+        self.dirty[uri] = document
+    
+    def change(self, params: Dict):
+        document = self.document(params)
+        if isinstance(params.get('text'), str):
+            document.text = params['text']
+            document.edits = None
+        elif isinstance(params.get('edits'), list):
+            try:
+                edits = [(int(offset), int(removed), str(inserted)) for offset, removed, inserted in params['edits']]
+                document.text = apply_edits(document.text, edits)[0] if edits else document.text
+            except (TypeError, ValueError) as e:
+                raise RequestError(INVALID_PARAMS, f"Bad edits: {e}")
+            if document.edits is not None:
+                document.edits.extend(edits)
+        else:
+            raise RequestError(INVALID_PARAMS, "change needs a text or edits")
+        document.version = params.get('version', document.version)
+        self.dirty[document.uri] = document
+    
+    def close(self, params: Dict):
+        document = self.document(params)
+        del self.documents[document.uri]
+        self.dirty.pop(document.uri, None)
+    
+    def validate(self, params: Dict) -> Dict:
+        if 'uri' not in params and isinstance(params.get('text'), str):
+            # One-off text that is not kept
+            document = Document(None, params['text'], None)
+            document.validate()
+            return document.report()
+        document = self.document(params)
+        if self.dirty.pop(document.uri, None) is not None:
+            document.validate()
+            self.publish_document(document)
+        return document.report()
+    
+    def shutdown(self, params: Dict):
+        self.documents.clear()
+        self.dirty.clear()
+    
+    def exit(self, params: Dict):
+        self.exited = True
+    
+    def publish(self):
+        """
+        Validate every changed document and publish its diagnostics.
+        """
+        dirty, self.dirty = self.dirty, {}
+        for document in dirty.values():
+            try:
+                document.validate()
+            except Exception as e:
+                # Reported for this document alone; its next change is
+                # parsed from scratch
+                document.result, document.edits = None, None
+                document.diagnostics = [Diagnostic(f"Internal error: {type(e).__name__}: {e}", 1, 1)]
+            self.publish_document(document)
+    
+    def publish_document(self, document: Document):
+        params = {'uri': document.uri, 'version': document.version}
+        params.update(document.report())
+        self.send({'jsonrpc': '2.0', 'method': 'diagnostics', 'params': params})
+
+def read_messages(stream: BinaryIO, messages: queue.Queue):
+    try:
+        while True:
+            try:
+                body = read_message(stream)
+            except RequestError as e:
+                body = e  # Answered in turn, then reading goes on
+            messages.put(body)
+            if body is None:
+                break
+    except (OSError, ValueError):
+        messages.put(None)
+
+def serve(input: BinaryIO, output: BinaryIO, debounce_ms: float = DEBOUNCE_MS):
+    """
+    Answer messages from `input` on `output` until `exit` or end of input.
+    Messages are read on a separate thread, so changes keep being taken in
+    (and coalesced) while a document is being validated. A stream with a
+    file descriptor is read through it directly (see FrameReader), so the
+    reader can be left blocked when the server returns.
+    """
+    server = Server(lambda message: write_message(output, message))
+    messages = queue.Queue()
+    try:
+        source = FrameReader(input.fileno())
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        source = input
+    threading.Thread(target=read_messages, args=(source, messages), daemon=True).start()
+    
+    timeout = None  # Wait for messages forever while nothing is dirty
+    while not server.exited:
+        try:
+            body = messages.get(timeout=timeout)
+        except queue.Empty:
+            server.publish()  # Quiet for the debounce interval
+            timeout = None
+            continue
+        if body is None:
+            break
+        if isinstance(body, RequestError):
+            server.send_error(None, body.code, str(body))
+        else:
+            server.handle(body)
+        timeout = debounce_ms / 1000 if server.dirty else None
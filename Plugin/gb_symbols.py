@@ -0,0 +1,273 @@
+"""
+Symbol index over one or more parsed GB files.
+
+index_file() walks a file's AST once, collecting every declaration (var,
+def, function definitions and their parameters) and every reference
+(identifier uses and function call sites), with offsets. Names are
+resolved as the runtime resolves them: inside a function, parameters and
+the names the function declares are local to it, and every other name is
+a global shared by all files.
+
+SymbolIndex keeps the symbols of each file apart and, for globals, maps
+each name to its declarations and references per file. Looking a name up
+costs O(1) plus the number of results, and re-indexing a file after it was
+re-parsed only touches the names that file mentions. A count of references
+to each global name is kept as files are indexed, along with the unused
+declarations, so unused() never scans the files.
+"""
+from typing import Dict, List, Optional, Tuple, Union
+
+from gb_parser import (
+    AST, DefDeclaration, FunctionCall, FunctionDef, Identifier, LineIndex, VarDeclaration, child_nodes,
+    declared_names,
+)
+
+# Symbol kind of each declaration node
+DECLARATIONS = {
+    VarDeclaration: 'var',
+    DefDeclaration: 'def',
+    FunctionDef: 'function',
+}
+
+# Reference kind of each node that refers to a name
+REFERENCES = {
+    Identifier: 'use',
+    FunctionCall: 'call',
+}
+
+class Symbol:
+    """
+    A declared name.
+    
+    kind: 'var', 'def', 'function' or 'param'
+    offset: where the declaration starts; a parameter has the offset of its
+        function definition
+    function: the function symbol this is local to, or None for a global
+    params: parameter names, for a function
+    """
+    __slots__ = ('name', 'kind', 'uri', 'offset', 'function', 'params')
+    
+    def __init__(self, name: str, kind: str, uri: str, offset: int, function: Optional['Symbol'] = None,
+                 params: Optional[List[str]] = None):
+        self.name = name
+        self.kind = kind
+        self.uri = uri
+        self.offset = offset
+        self.function = function
+        self.params = params
+    
+    def as_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'uri': self.uri,
+            'offset': self.offset,
+            'function': None if self.function is None else self.function.name,
+            'params': self.params,
+        }
+
+class Reference:
+    """
+    A use of a name: kind is 'use' for an identifier and 'call' for a
+    function call. `function` is the function symbol the name is local to,
+    or None when it refers to a global.
+    """
+    __slots__ = ('name', 'kind', 'uri', 'offset', 'function')
+    
+    def __init__(self, name: str, kind: str, uri: str, offset: int, function: Optional[Symbol] = None):
+        self.name = name
+        self.kind = kind
+        self.uri = uri
+        self.offset = offset
+        self.function = function
+    
+    def as_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'kind': self.kind,
+            'uri': self.uri,
+            'offset': self.offset,
+            'function': None if self.function is None else self.function.name,
+        }
+
+class FileSymbols:
+    """
+    Symbols of one file. Globals are grouped by name; locals by the
+    function they belong to and their name.
+    """
+    def __init__(self, uri: str, lines: Optional[LineIndex] = None):
+        self.uri = uri
+        self.lines = lines
+        self.definitions = []  # Every symbol, in source order
+        self.references = []  # Every reference, in source order
+        self.globals = {}  # name -> [Symbol]
+        self.global_references = {}  # name -> [Reference]
+        self.locals = {}  # (function, name) -> [Symbol]
+        self.local_references = {}  # (function, name) -> [Reference]
+        self.unused_locals = []
+
+def index_file(uri: str, ast: List[AST], lines: Optional[LineIndex] = None) -> FileSymbols:
+    """
+    Collect the symbols and references of one parsed file, without
+    recursion.
+    """
+    symbols = FileSymbols(uri, lines)
+    local_names = {}  # Function symbol -> names local to it
+    
+    def declare(symbol: Symbol):
+        symbols.definitions.append(symbol)
+        if symbol.function is None:
+            symbols.globals.setdefault(symbol.name, []).append(symbol)
+        else:
+            symbols.locals.setdefault((symbol.function, symbol.name), []).append(symbol)
+    
+    stack = [(node, None) for node in reversed(ast)]
+    while stack:
+        node, function = stack.pop()
+        node_type = type(node)
+        
+        kind = DECLARATIONS.get(node_type)
+        if kind is not None:
+            # A declaration inside a function is local to it, as is the
+            # function a nested definition declares
+            symbol = Symbol(node.name, kind, uri, node.offset, function)
+            declare(symbol)
+            if kind == 'function':
+                symbol.params = list(node.params)
+                local_names[symbol] = set(node.params).union(declared_names(node.body))
+                for param in node.params:
+                    declare(Symbol(param, 'param', uri, node.offset, symbol))
+                stack.extend((child, symbol) for child in reversed(node.body))
+                continue
+        else:
+            kind = REFERENCES.get(node_type)
+            if kind is not None:
+                scope = function if function is not None and node.name in local_names[function] else None
+                reference = Reference(node.name, kind, uri, node.offset, scope)
+                symbols.references.append(reference)
+                if scope is None:
+                    symbols.global_references.setdefault(node.name, []).append(reference)
+                else:
+                    symbols.local_references.setdefault((scope, node.name), []).append(reference)
+        
+        stack.extend((child, function) for child in child_nodes(node))
+    
+    # child_nodes() comes in no particular order
+    symbols.definitions.sort(key=lambda symbol: symbol.offset)
+    symbols.references.sort(key=lambda reference: reference.offset)
+    symbols.unused_locals = [symbol for symbol in symbols.definitions
+                             if symbol.function is not None and (symbol.function, symbol.name) not in symbols.local_references]
+    return symbols
+
+class SymbolIndex:
+    """
+    Symbols of a set of files, updated one file at a time.
+    """
+    def __init__(self):
+        self.files = {}  # uri -> FileSymbols
+        self.global_definitions = {}  # name -> {uri: [Symbol]}
+        self.global_references = {}  # name -> {uri: [Reference]}
+        self.reference_counts = {}  # name -> references to the global, in all files
+        self.unused_symbols = {}  # Declarations never referenced in their scope, as keys
+    
+    def update(self, uri: str, ast: List[AST], text: Optional[str] = None):
+        """
+        Index a file, replacing whatever was indexed for it before. Pass the
+        source `text` for position() to give lines and columns.
+        """
+        self.remove(uri)
+        symbols = index_file(uri, ast, None if text is None else LineIndex(text))
+        self.files[uri] = symbols
+        unused = self.unused_symbols
+        counts = self.reference_counts
+        for name, found in symbols.global_references.items():
+            self.global_references.setdefault(name, {})[uri] = found
+            if name not in counts:
+                # Declarations in other files are used from now on
+                counts[name] = 0
+                for symbol in self.definitions(name):
+                    del unused[symbol]
+            counts[name] += len(found)
+        for name, found in symbols.globals.items():
+            self.global_definitions.setdefault(name, {})[uri] = found
+            if name not in counts:
+                unused.update(dict.fromkeys(found))
+        unused.update(dict.fromkeys(symbols.unused_locals))
+    
+    def remove(self, uri: str):
+        symbols = self.files.pop(uri, None)
+        if symbols is None:
+            return
+        unused = self.unused_symbols
+        counts = self.reference_counts
+        for name, found in symbols.globals.items():
+            by_file = self.global_definitions[name]
+            del by_file[uri]
+            if not by_file:
+                del self.global_definitions[name]
+            if name not in counts:
+                for symbol in found:
+                    del unused[symbol]
+        for name, found in symbols.global_references.items():
+            by_file = self.global_references[name]
+            del by_file[uri]
+            if not by_file:
+                del self.global_references[name]
+            counts[name] -= len(found)
+            if not counts[name]:
+                # Declarations in other files are unused from now on
+                del counts[name]
+                unused.update(dict.fromkeys(self.definitions(name)))
+        for symbol in symbols.unused_locals:
+            del unused[symbol]
+    
+    def definitions(self, name: str) -> List[Symbol]:
+        """
+        Global declarations of `name`, in all files.
+        """
+        return [symbol for found in self.global_definitions.get(name, {}).values() for symbol in found]
+    
+    def references(self, name: str) -> List[Reference]:
+        """
+        References to the global `name`, in all files. Names declared
+        nowhere, such as builtins, have references too.
+        """
+        return [reference for found in self.global_references.get(name, {}).values() for reference in found]
+    
+    def definition(self, reference: Reference) -> List[Symbol]:
+        """
+        The declarations a reference may refer to (go to definition).
+        """
+        if reference.function is None:
+            return self.definitions(reference.name)
+        return list(self.files[reference.uri].locals[reference.function, reference.name])
+    
+    def references_to(self, symbol: Symbol) -> List[Reference]:
+        """
+        References to a declared symbol (find references, rename).
+        """
+        if symbol.function is None:
+            return self.references(symbol.name)
+        return list(self.files[symbol.uri].local_references.get((symbol.function, symbol.name), ()))
+    
+    def unused(self) -> List[Symbol]:
+        """
+        Declarations whose name is never referenced in their scope.
+        """
+        return list(self.unused_symbols)
+    
+    def undefined(self) -> List[str]:
+        """
+        Global names referenced but declared in no file.
+        """
+        return [name for name in self.global_references if name not in self.global_definitions]
+    
+    def position(self, item: Union[Symbol, Reference]) -> Tuple[int, int]:
+        """
+        Line and column of a symbol or reference, if its file was indexed
+        with its text.
+        """
+        lines = self.files[item.uri].lines
+        if lines is None:
+            raise ValueError(f"{item.uri} was indexed without its text")
+        return lines.position(item.offset)
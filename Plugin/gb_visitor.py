@@ -0,0 +1,310 @@
+"""
+Visitors and transformers over the GB AST, without recursion.
+
+NodeVisitor and NodeTransformer call `visit_<ClassName>` for each node,
+falling back along the node class's bases (so `visit_AST` catches
+everything) and then to generic_visit(). Each visitor class binds, once
+per node class, the method to call together with a getter of the node's
+children, last first, built from the child-field table of gb_parser; a
+transformer also binds how to rebuild the node. Children are pushed on an
+explicit stack as the getter returns them, so there are no isinstance
+chains, no per-node reversing and no recursion: arbitrarily deep nesting
+is fine.
+
+iter_tree() is the matching walker: every node with its parent, in
+pre-order.
+"""
+from operator import attrgetter, is_not
+from typing import Callable, Iterator, List, Optional, Tuple, Union, get_type_hints
+
+from gb_parser import AST, FIELD_NODE, FIELD_NODES, child_fields
+
+class ClassTable(dict):
+    """
+    Node class -> what `make` returns for it, made on first use.
+    """
+    def __init__(self, make: Callable[[type], object]):
+        super().__init__()
+        self.make = make
+    
+    def __missing__(self, node_class: type):
+        value = self[node_class] = self.make(node_class)
+        return value
+
+def reversed_child_getter(node_class: type) -> Optional[Callable[[AST], List[AST]]]:
+    # The children of a node, last first, ready to be pushed on a stack;
+    # None for leaf classes
+    fields = child_fields(node_class)
+    if not fields:
+        return None
+    names = [name for name, _ in reversed(fields)]
+    shapes = [shape for _, shape in fields]
+    if shapes == [FIELD_NODES]:
+        get_list = attrgetter(names[0])
+        return lambda node: get_list(node)[::-1]
+    if shapes == [FIELD_NODE]:
+        get_node = attrgetter(names[0])
+        return lambda node: [] if get_node(node) is None else [get_node(node)]
+    if all(shape == FIELD_NODE for shape in shapes):
+        get_nodes = attrgetter(*names)
+        return lambda node: [value for value in get_nodes(node) if value is not None]
+    fields = fields[::-1]
+    return lambda node: reversed_fields_children(node, fields)
+
+def reversed_fields_children(node: AST, fields) -> List[AST]:
+    # fields_children() of gb_parser, built last first from reversed fields
+    children = []
+    for name, shape in fields:
+        value = getattr(node, name)
+        if shape == FIELD_NODES:
+            children += value[::-1]
+        elif shape == FIELD_NODE:
+            if value is not None:
+                children.append(value)
+        else:
+            for condition, body in reversed(value):
+                children += body[::-1]
+                children.append(condition)
+    return children
+
+REVERSED_GETTERS = ClassTable(reversed_child_getter)
+
+def iter_tree(nodes: List[AST]) -> Iterator[Tuple[AST, Optional[AST]]]:
+    """
+    Every node in the given trees with its parent (None at the top), in
+    pre-order: a node before its children, children in field order.
+    """
+    getters = REVERSED_GETTERS
+    stack = [(node, None) for node in reversed(nodes)]
+    while stack:
+        node, parent = stack.pop()
+        yield node, parent
+        getter = getters[type(node)]
+        if getter is not None:
+            stack.extend([(child, node) for child in getter(node)])
+
+def class_table(visitor_class: type, name: str, make: Callable[[type, type], object]) -> ClassTable:
+    # Kept on each visitor class itself, so subclasses bind their own methods
+    table = vars(visitor_class).get(name)
+    if table is None:
+        table = ClassTable(lambda node_class: make(visitor_class, node_class))
+        setattr(visitor_class, name, table)
+    return table
+
+def find_handler(visitor_class: type, node_class: type) -> Optional[Callable]:
+    # The visit_ method for the nearest class among the node's bases
+    for base in node_class.__mro__:
+        handler = getattr(visitor_class, 'visit_' + base.__name__, None)
+        if handler is not None:
+            return handler
+    return None
+
+def visit_binding(visitor_class: type, node_class: type) -> Tuple[Optional[Callable], Optional[Callable]]:
+    # The method to call on a node, or else the getter of its children to
+    # schedule; an overridden generic_visit() stands in for a missing method
+    handler = find_handler(visitor_class, node_class)
+    if handler is None and visitor_class.generic_visit is not NodeVisitor.generic_visit:
+        handler = visitor_class.generic_visit
+    return handler, REVERSED_GETTERS[node_class]
+
+def transform_binding(visitor_class: type, node_class: type):
+    # The method to call on a node, the getter of its children and, for
+    # classes that have children, how to rebuild one from new children
+    children = REVERSED_GETTERS[node_class]
+    return find_handler(visitor_class, node_class), children, None if children is None else REBUILDERS[node_class]
+
+class NodeVisitor:
+    """
+    Visits nodes in pre-order. A `visit_<ClassName>` method decides whether
+    the node's children are visited by calling generic_visit(), which only
+    schedules them: they are visited after the method returns, not inside
+    the call. Nodes without a method have their children visited.
+    
+    visit() may be called again from inside a `visit_` method, on the same
+    visitor; the inner call's nodes are visited before it returns.
+    """
+    visit_bindings = None
+    # Nodes scheduled but not yet visited, by the innermost visit() call
+    stack = None
+    
+    def visit(self, nodes: Union[AST, List[AST]]):
+        """
+        Visit a node or a list of nodes and everything under them.
+        """
+        bindings = class_table(type(self), 'visit_bindings', visit_binding)
+        outer = self.stack
+        self.stack = stack = [nodes] if isinstance(nodes, AST) else list(reversed(nodes))
+        pop, extend = stack.pop, stack.extend
+        try:
+            while stack:
+                node = pop()
+                handler, children = bindings[type(node)]
+                if handler is not None:
+                    handler(self, node)
+                elif children is not None:
+                    extend(children(node))
+        finally:
+            self.stack = outer
+    
+    def generic_visit(self, node: AST):
+        getter = REVERSED_GETTERS[type(node)]
+        if getter is not None:
+            self.stack.extend(getter(node))
+
+class NodeTransformer:
+    """
+    Rebuilds trees bottom-up: each node's children are transformed first,
+    then its `visit_<ClassName>` method is called with the node as rebuilt
+    from them. The method returns the replacement: the node itself to keep
+    it, another node, None to remove it, or, for a node in a list, a list
+    of nodes to splice in. Nodes without a method are kept. A node held in
+    a field that cannot be empty may be replaced but not removed: None
+    there raises ValueError.
+    
+    The input trees are left untouched. A node is copied only if one of its
+    children changed, so unchanged subtrees are shared with the input.
+    """
+    transform_bindings = None
+    
+    def transform(self, nodes: List[AST]) -> List[AST]:
+        """
+        Transform a list of trees, returning the new list.
+        """
+        bindings = class_table(type(self), 'transform_bindings', transform_binding)
+        results = []
+        append = results.append
+        # A node with children is met twice: first to schedule them, then as
+        # (node, children) to collect their results off `results`
+        stack = list(reversed(nodes))
+        pop, push, extend = stack.pop, stack.append, stack.extend
+        while stack:
+            node = pop()
+            if type(node) is tuple:
+                node, children = node
+                count = len(children)
+                transformed = results[-count:]
+                del results[-count:]
+                handler, _, rebuild = bindings[type(node)]
+                if any(map(is_not, transformed, reversed(children))):
+                    node = rebuild(node, transformed)
+            else:
+                handler, get_children, _ = bindings[type(node)]
+                if get_children is not None:
+                    children = get_children(node)
+                    if children:
+                        push((node, children))
+                        extend(children)
+                        continue
+            append(node if handler is None else handler(self, node))
+        return splice(results)
+    
+    def transform_node(self, node: AST) -> Optional[AST]:
+        """
+        Transform a single tree; None if it was removed.
+        """
+        result = self.transform([node])
+        if len(result) > 1:
+            raise ValueError(f"{type(node).__name__} was replaced by {len(result)} nodes")
+        return result[0] if result else None
+
+def splice(results: list) -> List[AST]:
+    # Transformed list items: lists are spliced in and removed nodes dropped
+    nodes = []
+    for result in results:
+        if type(result) is list:
+            nodes.extend(result)
+        elif result is not None:
+            nodes.append(result)
+    return nodes
+
+def rebuild_function(node_class: type) -> Callable[[AST, list], AST]:
+    """
+    A function copying a node of `node_class` (which has children) with its
+    children replaced by their transformed results, given in the order
+    child_nodes() lists them.
+    """
+    # Node classes are rebuilt through their constructor, whose parameters
+    # are named after the fields they set
+    code = node_class.__init__.__code__
+    params = code.co_varnames[1:code.co_argcount]
+    get_args = attrgetter(*params)
+    # A single-node field annotated plain AST, not Optional, must stay set
+    hints = get_type_hints(node_class.__init__)
+    fields = tuple((params.index(name), shape, name if hints.get(name) is AST else None)
+                   for name, shape in child_fields(node_class))
+    
+    if [shape for _, shape, _ in fields] == [FIELD_NODES]:
+        (list_index, _, _), = fields
+        
+        def rebuild(node: AST, results: list) -> AST:
+            args = list(get_args(node))
+            args[list_index] = splice(results)
+            return node_class(*args)
+        return rebuild
+    
+    def rebuild_fields(node: AST, results: list) -> AST:
+        args = list(get_args(node))
+        at = 0
+        for index, shape, required in fields:
+            value = args[index]
+            if shape == FIELD_NODE:
+                if value is None:
+                    continue
+                value = results[at]
+                at += 1
+                if type(value) is list:
+                    raise ValueError(f"{node_class.__name__} holds one node where a list was returned")
+                if value is None and required:
+                    raise ValueError(f"{node_class.__name__}.{required} cannot be removed")
+            elif shape == FIELD_NODES:
+                value, at = splice(results[at:at + len(value)]), at + len(value)
+            else:
+                clauses = []
+                for _, body in value:
+                    condition = results[at]
+                    if condition is None or type(condition) is list:
+                        raise ValueError(f"{node_class.__name__} needs one condition per clause")
+                    clauses.append((condition, splice(results[at + 1:at + 1 + len(body)])))
+                    at += 1 + len(body)
+                value = clauses
+            args[index] = value
+        return node_class(*args)
+    
+    # The usual classes, with one or two single-node fields, each have their
+    # own check that every result is a node and can be put back unspliced
+    node_indexes = [index for index, shape, _ in fields if shape == FIELD_NODE]
+    if len(node_indexes) != len(fields) or len(node_indexes) > 2:
+        return rebuild_fields
+    if len(node_indexes) == 1:
+        first, = node_indexes
+        
+        def rebuild(node: AST, results: list) -> AST:
+            if len(results) != 1 or results[0] is None or type(results[0]) is list:
+                return rebuild_fields(node, results)
+            args = list(get_args(node))
+            args[first] = results[0]
+            return node_class(*args)
+        return rebuild
+    
+    first, second = node_indexes
+    
+    def rebuild(node: AST, results: list) -> AST:
+        if len(results) != 2:
+            return rebuild_fields(node, results)
+        a, b = results
+        if a is None or b is None or type(a) is list or type(b) is list:
+            return rebuild_fields(node, results)
+        args = list(get_args(node))
+        args[first] = a
+        args[second] = b
+        return node_class(*args)
+    return rebuild
+
+REBUILDERS = ClassTable(rebuild_function)
+
+def rebuild(node: AST, results: list) -> AST:
+    """
+    A copy of `node` with its children replaced by their transformed
+    `results`, given in the order child_nodes() lists them.
+    """
+    return REBUILDERS[type(node)](node, results)
@@ -0,0 +1,133 @@
+"""
+Round trips through the binary AST format, and corrupt input.
+"""
+import struct
+
+import pytest
+
+from gb_parser import parse_gb_code
+from gb_samples import make_source, same_tree
+from gb_serialize import HEADER, ASTFormatError, dump_ast, dumps_ast, load_ast, load_ast_file
+
+# Covers every node class and the less common field values
+ROUND_TRIP_SOURCE = '''
+var big = 123456789012345678901234567890
+var ratio = 2.5 / -0.125
+var small = 7
+var label = "café \\"quoted\\""
+def LIMIT = 1024
+def add(a, b)
+    return a + b * (LIMIT - 1)
+end
+def nothing()
+    return true
+end
+if false then
+    var x = 1
+elif label then
+    var x = add(1, 2)
+elif nothing() then
+    var x = 3
+else
+    var x = +4
+end
+loop times 3 then
+    var small = small - 1
+end
+loop small then
+    var small = 0
+end
+ts.windows(title'Title', text'Body')
+tsdll("user32.dll", "MessageBoxA", 0, label, 1.5)
+tsdll("kernel32.dll", "GetTickCount")
+window "Main" 800 600
+    text "Hello"
+    input "name" "default"
+    container
+        button "Go" onGo
+            var clicked = true
+        end
+        button "Plain"
+    end
+end
+'''
+
+def sections(data: bytes) -> dict:
+    # Start of each section of a dumped file, by name
+    _, _, _, string_count, string_bytes, node_count, operand_count, _, _, _ = HEADER.unpack_from(data)
+    pos = HEADER.size
+    starts = {}
+    for name, size in (('offsets', 4 * (string_count + 1)), ('strings', string_bytes),
+                       ('nodes', 12 * node_count), ('operands', 4 * operand_count)):
+        starts[name] = pos
+        pos += size
+    return starts
+
+def patched(data: bytes, pos: int, value: int) -> bytes:
+    # `data` with the i32 at `pos` replaced
+    return data[:pos] + struct.pack('<i', value) + data[pos + 4:]
+
+@pytest.mark.parametrize('source', [ROUND_TRIP_SOURCE, '', make_source(50)], ids=['all-nodes', 'empty', 'generated'])
+def test_round_trip(source):
+    ast = parse_gb_code(source)
+    assert same_tree(ast, load_ast(dumps_ast(ast)))
+
+def test_round_trip_file(tmp_path):
+    ast = parse_gb_code(ROUND_TRIP_SOURCE)
+    path = tmp_path / 'program.gbast'
+    with open(path, 'wb') as f:
+        dump_ast(ast, f)
+    assert same_tree(ast, load_ast_file(str(path)))
+
+def test_loaded_nodes_keep_no_buffer():
+    data = bytearray(dumps_ast(parse_gb_code(ROUND_TRIP_SOURCE)))
+    load_ast(data)
+    data.extend(b'\0')  # Fails while any view of it is still exported
+
+@pytest.mark.parametrize('data, message', [
+    (b'GBAS', 'Truncated AST header'),
+    (b'XXXX' + bytes(HEADER.size), 'Not a GB AST file'),
+    (struct.pack('<4sHH7I', b'GBAS', 99, 0, 0, 0, 0, 0, 0, 0, 0), 'Unsupported AST format version'),
+])
+def test_bad_header(data, message):
+    with pytest.raises(ASTFormatError, match=message):
+        load_ast(data)
+
+def test_truncated_data():
+    data = dumps_ast(parse_gb_code(ROUND_TRIP_SOURCE))
+    with pytest.raises(ASTFormatError, match='Truncated AST data'):
+        load_ast(data[:-1])
+
+# Corruptions of `var x = y`: nodes are Identifier y, then VarDeclaration
+# with operands [name string, value node] following Identifier's [name string]
+@pytest.mark.parametrize('section, index, value', [
+    ('operands', 2, -1),  # Value node index wrapping around
+    ('operands', 2, 1),  # Value node referring to the declaration itself
+    ('operands', 2, 7),  # Value node past the table
+    ('operands', 0, -1),  # String index wrapping around
+    ('operands', 0, 5),  # String index past the table
+    ('nodes', 0, -1),  # Node kind wrapping around
+    ('nodes', 0, 99),  # Unknown node kind
+    ('nodes', 2, -1),  # Operand position wrapping around
+    ('offsets', 1, 1000),  # String running past the string data
+])
+def test_corrupt_indexes(section, index, value):
+    data = dumps_ast(parse_gb_code('var x = y'))
+    with pytest.raises(ASTFormatError, match='Corrupt AST data'):
+        load_ast(patched(data, sections(data)[section] + 4 * index, value))
+
+def test_corrupt_file(tmp_path):
+    # The memory map is closed cleanly, leaving the format error to surface
+    data = dumps_ast(parse_gb_code('var x = y'))
+    path = tmp_path / 'corrupt.gbast'
+    path.write_bytes(patched(data, sections(data)['operands'] + 8, -1))
+    with pytest.raises(ASTFormatError, match='Corrupt AST data'):
+        load_ast_file(str(path))
+
+def test_corrupt_counts():
+    data = dumps_ast(parse_gb_code('var x = f(1)'))
+    # FunctionCall f: [name string, argument count, argument node]
+    start = sections(data)['operands'] + 4
+    for count in (-1, 5):
+        with pytest.raises(ASTFormatError, match='Corrupt AST data'):
+            load_ast(patched(data, start + 4, count))